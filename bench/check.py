@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+
+"""Regression checks for Jiraline.
+
+Runs Jiraline commands against the stand-in Jira server (bench/mock_jira.py) in throw-away home
+directories, and checks their results for problems that benchmarks would not notice (e.g. stale
+indexes); every check starts with a fresh server and home directory:
+
+    python3 bench/check.py
+    python3 bench/check.py watch-links
+
+Problems found by every check are printed as JSON; the exit code is 1 if any were found.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import mock_jira
+import run
+
+
+def key(n):
+    return '{}-{}'.format(mock_jira.PROJECT, n)
+
+
+def jiraline(environment, argv, **kwargs):
+    """Runs Jiraline and returns the completed process (with text output).
+    """
+    env = environment.env()
+    # lines are read while the command runs (e.g. watch), so output must not be buffered
+    env['PYTHONUNBUFFERED'] = '1'
+    return subprocess.run([sys.executable, os.path.join(run.REPOSITORY_DIRECTORY, 'jiraline.py')] + list(argv),
+                          stdin=subprocess.DEVNULL, capture_output=True, text=True, env=env, **kwargs)
+
+
+def stored_attachments(environment):
+    """Returns set of content hashes stored in the attachment store.
+    """
+    objects = os.path.join(environment.cache_dir(), 'attachments', 'objects')
+    return set(name for _, _, names in os.walk(objects) for name in names)
+
+
+def check_cassette_instances(server, environment):
+    """Responses recorded from several instances are replayed to the instance they came from.
+    """
+    problems = []
+    # another dataset, so issues with the same key differ between the instances
+    other = mock_jira.MockJiraServer(('127.0.0.1', 0), mock_jira.Dataset(100, seed=1)).start()
+    try:
+        credentials = {'user': 'bench', 'password': 'bench'}
+        environment.write_config({
+            'default_project': mock_jira.PROJECT,
+            'instances': {
+                'a': {'server': server.url(), 'credentials': credentials},
+                'b': {'server': other.url(), 'credentials': credentials},
+            },
+        })
+        cassette = os.path.join(environment.home, 'cassette')
+        search = ['search', '--all-instances', '-p', mock_jira.PROJECT, '-n', '20']
+        recorded = jiraline(environment, ['--record', cassette] + search)
+        if recorded.returncode != 0:
+            problems.append('{} failed while recording: {}'.format(search, (recorded.stdout + recorded.stderr).strip()))
+        for _ in range(3):
+            environment.clear_cache()
+            replayed = jiraline(environment, ['--replay', cassette] + search)
+            # issues of the instances arrive in any order
+            if sorted(replayed.stdout.splitlines()) != sorted(recorded.stdout.splitlines()):
+                problems.append('{} replayed results different from recorded ones: {!r}'.format(search, replayed.stdout))
+                break
+
+        argv = ['search', '-p', mock_jira.PROJECT, '-n', '5']
+        jiraline(environment, ['--record', cassette, '--instance', 'a'] + argv)
+        replayed = jiraline(environment, ['--replay', cassette, '--instance', 'b'] + argv)
+        if replayed.returncode == 0:
+            problems.append('search recorded on instance a was replayed on instance b: {!r}'.format(replayed.stdout))
+    finally:
+        other.shutdown()
+    return problems
+
+
+def check_cache_attachments(server, environment):
+    """Stored attachments count towards the cache size and budget, are evicted with their issues
+    unless other issues refer to the same content, and are kept for pinned issues.
+    """
+    problems = []
+    def run_ok(argv):
+        result = jiraline(environment, argv)
+        if result.returncode != 0:
+            problems.append('{} failed: {}'.format(argv, (result.stdout + result.stderr).strip()))
+        return result.stdout
+    def download(*numbers):
+        stored = {}
+        for n in numbers:
+            before = stored_attachments(environment)
+            run_ok(['attachments', '--all', '-o', os.path.join(environment.home, 'attachments', key(n)), key(n)])
+            stored[n] = stored_attachments(environment) - before
+        return stored
+    # both issues have a logo with the same content, which is stored with the first one
+    stored = download(5, 10)
+    logo = set(name for name in stored[5] if os.path.getsize(os.path.join(environment.cache_dir(), 'attachments', 'objects', name[:2], name)) == mock_jira.LOGO_SIZE)
+
+    size = [line for line in run_ok(['cache', 'stats']).splitlines() if line.startswith('size:')]
+    if not size or '(attachments: ' not in size[0] or '(attachments: 0 B)' in size[0]:
+        problems.append('cache stats does not count attachments: {}'.format(size))
+
+    run_ok(['pin', key(5)])
+    run_ok(['cache', 'gc', '--max-bytes', '1'])
+    if stored_attachments(environment) != stored[5]:
+        problems.append('after gc attachments {} are stored, expected those of pinned {} ({})'.format(sorted(stored_attachments(environment)), key(5), sorted(stored[5])))
+
+    download(10)
+    run_ok(['cache', 'clear', '--keep-pinned'])
+    if stored_attachments(environment) != stored[5]:
+        problems.append('after clear --keep-pinned attachments {} are stored, expected those of pinned {} ({})'.format(sorted(stored_attachments(environment)), key(5), sorted(stored[5])))
+    if not logo:
+        problems.append('the logo shared by {} and {} was not stored'.format(key(5), key(10)))
+
+    run_ok(['cache', 'clear'])
+    if stored_attachments(environment):
+        problems.append('cache clear left attachments: {}'.format(sorted(stored_attachments(environment))))
+    return problems
+
+
+def check_issue_comments(server, environment):
+    """Raw issues include their comments, and issues are shown with cached comments when comments
+    cannot be fetched.
+    """
+    problems = []
+    expected = [comment['id'] for comment in server.dataset.issue_comments(3)]
+    for argv in (['issue', 'show', '--raw', '--field', 'comment', key(3)], ['issue', 'show', '--pretty', '2', '--field', 'comment', key(3)]):
+        result = jiraline(environment, argv)
+        try:
+            comments = json.loads(result.stdout)['comment']['comments']
+        except (ValueError, KeyError, TypeError):
+            problems.append('{} did not print comments: {!r}'.format(argv, (result.stdout + result.stderr).strip()))
+            continue
+        if [comment['id'] for comment in comments] != expected:
+            problems.append('{} printed comments {}, expected {}'.format(argv, [comment['id'] for comment in comments], expected))
+
+    # the issue is fetched, but its comments are not
+    server.failing.add('comments')
+    result = jiraline(environment, ['issue', 'show', key(3)])
+    if result.returncode != 0 or 'Traceback' in result.stderr:
+        problems.append('issue show failed when comments could not be fetched: {}'.format((result.stdout + result.stderr).strip()))
+    elif 'warning' not in result.stdout:
+        problems.append('issue show did not warn that comments could not be fetched')
+    return problems
+
+
+def check_json_stream(server, environment):
+    """Issues and fields decoded by JSONArrayStream do not depend on where chunks of the body end
+    (e.g. inside a number, a literal, or an escape sequence of a string).
+    """
+    sys.path.insert(0, run.REPOSITORY_DIRECTORY)
+    import jiraline
+
+    documents = [
+        '{"total": 10.5, "issues": [1, -2, 30, 4.25e-3, 1E+5], "startAt": 0}',
+        '{"issues": [1e5, 0.5, -0]}',
+        '{"issues": [true, false, null, [null, true], {"a": false}], "isLast": true}',
+        '{"issues": ["\\"quoted\\"", "caf\\u00e9", "\\ud83d\\ude00", "a\\\\b\\n"], "names": {"k": "\\t"}}',
+        '{"issues": [], "total": 12345}',
+    ]
+    problems = []
+    for document in documents:
+        expected = json.loads(document)
+        splits = [[document[:n], document[n:]] for n in range(1, len(document))] + [list(document)]
+        for chunks in splits:
+            stream = jiraline.JSONArrayStream(chunks, 'issues')
+            try:
+                issues = list(stream)
+            except ValueError as e:
+                problems.append('{!r}: {}'.format(chunks, e))
+                continue
+            if dict(stream.fields, issues=issues) != expected:
+                problems.append('{!r}: decoded as {!r}'.format(chunks, dict(stream.fields, issues=issues)))
+    return problems
+
+
+def check_cassette_streams(server, environment):
+    """Streamed responses (searches and attachments) are recorded to side files and replayed the
+    same; replays (including push) do not need credentials.
+    """
+    problems = []
+    cassette = os.path.join(environment.home, 'cassette')
+    commands = [
+        ['search', '-p', mock_jira.PROJECT, '-n', '50'],
+        ['attachments', '--all', '-o', os.path.join(environment.home, 'attachments'), key(5)],
+        ['push'],
+    ]
+    queued = ['--queue', 'comment', '-m', 'recorded', key(3)]
+    outputs = []
+    for argv in commands:
+        if argv == ['push']:
+            jiraline(environment, queued)
+        recorded = jiraline(environment, ['--record', cassette] + argv)
+        if recorded.returncode != 0:
+            problems.append('{} failed while recording: {}'.format(argv, (recorded.stdout + recorded.stderr).strip()))
+        outputs.append(recorded.stdout)
+    bodies = os.path.join(cassette, 'bodies')
+    if not os.path.isdir(bodies) or len(os.listdir(bodies)) < 2:
+        problems.append('bodies of streamed responses were not written to {}'.format(bodies))
+
+    # without credentials a replay must not ask for them (stdin is closed, so asking would fail)
+    environment.write_config({'server': server.url(), 'default_project': mock_jira.PROJECT})
+    environment.clear_cache()
+    for argv, output in zip(commands, outputs):
+        if argv == ['push']:
+            jiraline(environment, queued)
+        replayed = jiraline(environment, ['--replay', cassette] + argv)
+        if replayed.returncode != 0:
+            problems.append('{} failed while replaying: {}'.format(argv, (replayed.stdout + replayed.stderr).strip()))
+        elif replayed.stdout != output:
+            problems.append('{} printed {!r} while replaying, {!r} while recording'.format(argv, replayed.stdout, output))
+    return problems
+
+
+def check_outbox_instances(server, environment):
+    """Writes queued for an instance are pushed to that instance, whichever instance is selected
+    when pushing.
+    """
+    problems = []
+    other = mock_jira.MockJiraServer(('127.0.0.1', 0), mock_jira.Dataset(100)).start()
+    try:
+        credentials = {'user': 'bench', 'password': 'bench'}
+        environment.write_config({
+            'default_project': mock_jira.PROJECT,
+            'default_instance': 'b',
+            'instances': {
+                'a': {'server': server.url(), 'credentials': credentials},
+                'b': {'server': other.url(), 'credentials': credentials},
+            },
+        })
+        for argv in (['--instance', 'a', '--queue', 'comment', '-m', 'queued for a', key(3)], ['push']):
+            result = jiraline(environment, argv)
+            if result.returncode != 0:
+                problems.append('{} failed: {}'.format(argv, (result.stdout + result.stderr).strip()))
+        if [each['body'] for each in server.dataset.added_comments.get(3, [])] != ['queued for a']:
+            problems.append('comment queued for instance a was not pushed to it')
+        if other.dataset.added_comments.get(3):
+            problems.append('comment queued for instance a was pushed to instance b')
+    finally:
+        other.shutdown()
+    return problems
+
+
+def check_stats_bounds(server, environment):
+    """Key bounds of stats without an issue number are rejected with an error.
+    """
+    problems = []
+    for argv in (['-L', 'FOO'], ['-U', '{}-x'.format(mock_jira.PROJECT)]):
+        result = jiraline(environment, ['stats', '-p', mock_jira.PROJECT] + argv)
+        if result.returncode != 1 or 'invalid issue key' not in result.stdout + result.stderr or 'Traceback' in result.stderr:
+            problems.append('stats {} was not rejected: {}'.format(' '.join(argv), (result.stdout + result.stderr).strip()))
+    return problems
+
+
+def check_tree_depth(server, environment):
+    """A tree refreshed to a limited depth is walked deeper when more levels are requested, and a
+    shallower refresh does not miss changes of deeper issues.
+    """
+    problems = []
+    # BENCH-26 is an epic with stories (e.g. BENCH-31), which have subtasks (e.g. BENCH-32)
+    def tree(*argv):
+        result = jiraline(environment, ['tree'] + list(argv) + [key(26)])
+        if result.returncode != 0:
+            problems.append('tree {} failed: {}'.format(' '.join(argv), (result.stdout + result.stderr).strip()))
+        return result.stdout
+
+    tree('--depth', '1')
+    if key(32) not in tree():
+        problems.append('tree walked to depth 1 before is not walked deeper when the whole tree is requested')
+
+    server.dataset.update(32, {'summary': 'Changed while the tree was cached'})
+    tree('--depth', '1')
+    if 'Changed while the tree was cached' not in tree('--cached'):
+        problems.append('refresh of depth 1 missed a change of an issue deeper in the cached tree')
+    return problems
+
+
+def check_watch_links(server, environment):
+    """Links changed on the server while watch runs reach the links index used by deps.
+    """
+    problems = []
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(run.REPOSITORY_DIRECTORY, 'jiraline.py'), 'watch', '-p', mock_jira.PROJECT, '--interval', '1', '--count', '1'],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        env=dict(environment.env(), PYTHONUNBUFFERED='1'),
+    )
+    # the first line is printed after the first search; the link is added before the next poll
+    first_line = process.stdout.readline()
+    if 'watching' not in first_line:
+        problems.append('unexpected first line of watch: {!r}'.format(first_line))
+    server.dataset.update(5, {'issuelinks': [{
+        'id': '5Blocks',
+        'type': {'name': 'Blocks', 'inward': 'is blocked by', 'outward': 'blocks'},
+        'outwardIssue': {'key': key(7)},
+    }]})
+    output, error_output = process.communicate(timeout=60)
+    if process.returncode != 0:
+        problems.append('watch failed: {}'.format(error_output.strip()))
+    if key(5) not in output:
+        problems.append('watch did not report the change of {}'.format(key(5)))
+
+    deps = jiraline(environment, ['deps', '--cached', '--depth', '1', key(5)])
+    if deps.returncode != 0:
+        problems.append('deps failed: {}'.format((deps.stdout + deps.stderr).strip()))
+    elif key(7) not in deps.stdout:
+        problems.append('deps does not show the link added while watching: {!r}'.format(deps.stdout))
+    return problems
+
+
+CHECKS = {
+    'cache-attachments': check_cache_attachments,
+    'cassette-instances': check_cassette_instances,
+    'cassette-streams': check_cassette_streams,
+    'issue-comments': check_issue_comments,
+    'json-stream': check_json_stream,
+    'outbox-instances': check_outbox_instances,
+    'stats-bounds': check_stats_bounds,
+    'tree-depth': check_tree_depth,
+    'watch-links': check_watch_links,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Regression checks for Jiraline.')
+    parser.add_argument('checks', nargs='*', metavar='check', help='checks to run (default: all); available: {}'.format(', '.join(CHECKS)))
+    parser.add_argument('--keep', action='store_true', help='do not remove temporary home directories')
+    args = parser.parse_args()
+
+    unknown = [each for each in args.checks if each not in CHECKS]
+    if unknown:
+        parser.error('unknown checks: {}'.format(', '.join(unknown)))
+
+    results = {}
+    for name in (args.checks or CHECKS):
+        print('running {}'.format(name), file=sys.stderr)
+        server = mock_jira.MockJiraServer(('127.0.0.1', 0), mock_jira.Dataset(100)).start()
+        environment = run.Environment(server.url(), keep=args.keep)
+        try:
+            results[name] = CHECKS[name](server, environment)
+        finally:
+            server.shutdown()
+            environment.cleanup()
+    print(json.dumps({'problems': results}, indent=2))
+    if any(results.values()):
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
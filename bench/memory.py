@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""Memory benchmark for Jiraline.
+
+Runs commands whose responses grow with a parameter (page size of search results, number of
+projects in issue creation metadata, size of a downloaded attachment in MiB) against the stand-in Jira server, and reports peak RSS of
+Jiraline for every value of the parameter, so that memory use growing with response size shows up:
+
+    python3 bench/memory.py
+    python3 bench/memory.py --sizes 100 1000 10000 search
+"""
+
+import argparse
+import json
+import sys
+
+import mock_jira
+import run
+
+
+# name: (argv, keyword arguments of the dataset, default sizes)
+CASES = {
+    'search': (
+        ['search', '-p', mock_jira.PROJECT, '--table', '-n', '{size}'],
+        lambda size: {'size': size},
+        [100, 1000, 5000],
+    ),
+    'createmeta': (
+        ['open', 'what', '--pretty'],
+        lambda size: {'size': 1, 'projects': size},
+        [10, 50, 250],
+    ),
+    'attachment': (
+        ['attachments', '--get', 'build-5.log', '-o', '{{home}}', '{}-5'.format(mock_jira.PROJECT)],
+        lambda size: {'size': 5, 'log_size': size * 1024 * 1024},
+        [1, 16, 64],
+    ),
+}
+
+
+def measure(argv, dataset, keep=False):
+    """Returns peak RSS (in KiB) of Jiraline running argv against a server with given dataset.
+    """
+    server = mock_jira.MockJiraServer(('127.0.0.1', 0), dataset, max_results=dataset.size).start()
+    environment = run.Environment(server.url(), keep=keep)
+    try:
+        # "{home}" is replaced with the home directory (e.g. to save downloads there)
+        argv = [each.format(home=environment.home) for each in argv]
+        code, _, peak_rss, error_output = run.run_jiraline(environment, argv)
+        if code != 0:
+            raise RuntimeError('{} failed:\n{}'.format(' '.join(argv), error_output))
+        return peak_rss
+    finally:
+        server.shutdown()
+        environment.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory use of Jiraline for growing responses.')
+    parser.add_argument('cases', nargs='*', metavar='case', help='cases to run (default: all); available: {}'.format(', '.join(CASES)))
+    parser.add_argument('--sizes', type=int, nargs='+', help='values of the parameter (default: depends on case)')
+    parser.add_argument('--keep', action='store_true', help='do not remove temporary home directories')
+    args = parser.parse_args()
+
+    unknown = [each for each in args.cases if each not in CASES]
+    if unknown:
+        parser.error('unknown cases: {}'.format(', '.join(unknown)))
+
+    results = {}
+    for name in (args.cases or CASES):
+        argv, dataset_arguments, sizes = CASES[name]
+        results[name] = {}
+        for size in (args.sizes or sizes):
+            print('running {} ({})'.format(name, size), file=sys.stderr)
+            dataset = mock_jira.Dataset(**dataset_arguments(size))
+            results[name][size] = measure([each.format(size=size) for each in argv], dataset, keep=args.keep)
+        peaks = list(results[name].values())
+        results[name]['growth_kb'] = (peaks[-1] - peaks[0])
+    print(json.dumps({'peak_rss_kb': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
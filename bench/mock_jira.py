@@ -0,0 +1,729 @@
+#!/usr/bin/env python3
+
+"""Local stand-in for the Jira REST API.
+
+Serves deterministic, synthetic data for the endpoints Jiraline uses so that commands
+can be run (and timed) without a real Jira instance.
+Every request can be delayed by a configurable latency to simulate a remote server.
+
+Run standalone:
+
+    python3 bench/mock_jira.py --port 8080 --issues 500 --latency 50
+"""
+
+import argparse
+import collections
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+
+PROJECT = 'BENCH'
+
+STATUSES = (
+    ('1', 'Open', 'new', 'To Do'),
+    ('3', 'In Progress', 'indeterminate', 'In Progress'),
+    ('4', 'Reopened', 'new', 'To Do'),
+    ('5', 'Resolved', 'done', 'Done'),
+    ('6', 'Closed', 'done', 'Done'),
+)
+
+PRIORITIES = (
+    ('1', 'Highest'),
+    ('2', 'High'),
+    ('3', 'Medium'),
+    ('4', 'Low'),
+    ('5', 'Lowest'),
+)
+
+TRANSITIONS = (
+    ('11', 'To Do'),
+    ('21', 'In Progress'),
+    ('31', 'Done'),
+    ('41', 'Code Review'),
+)
+
+ISSUE_TYPES = (
+    ('10000', 'Epic'),
+    ('10001', 'Story'),
+    ('10002', 'Task'),
+    ('10003', 'Sub-task'),
+    ('10004', 'Bug'),
+)
+
+# Size of the logo attached (with the same content) to every issue that has attachments.
+LOGO_SIZE = 48 * 1024
+
+WORDS = (
+    'add', 'fix', 'remove', 'cache', 'parser', 'network', 'timeout', 'label', 'issue', 'branch',
+    'report', 'crash', 'slow', 'login', 'export', 'search', 'render', 'colour', 'config', 'release',
+)
+
+
+class Stream:
+    """Binary response body generated in chunks, so that the server does not hold large
+    bodies (e.g. attachments) in memory.
+    """
+    def __init__(self, size, chunks):
+        self.size = size
+        self.chunks = chunks
+
+
+class Dataset:
+    """Deterministic synthetic issues.
+    Issue BENCH-n exists for 1 <= n <= size.
+    Writes (transitions, edits) are kept as overrides of the generated fields and
+    bump the "updated" field of the issue to current time.
+    """
+    def __init__(self, size, comments=5, seed=0, labels=1000, projects=50, log_size=None):
+        self.size = size
+        # size of attached build logs (default: 1-3 MiB, depending on the issue)
+        self.log_size = log_size
+        self.comments = comments
+        self.labels = labels
+        self.projects = projects
+        self._all_labels = None
+        self.seed = seed
+        self.overrides = {}
+        self.added_comments = collections.defaultdict(list)
+        self.added_histories = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        # prefix of attachment URLs, set by the server when it knows its address
+        self.base_url = ''
+
+    def key(self, n):
+        return '{}-{}'.format(PROJECT, n)
+
+    def number(self, key):
+        match = re.fullmatch('{}-(\\d+)'.format(PROJECT), key or '')
+        if match is None:
+            return None
+        n = int(match.group(1))
+        return (n if 1 <= n <= self.size else None)
+
+    def _person(self, rng):
+        n = rng.randrange(25)
+        return {
+            'key': 'user{}'.format(n),
+            'name': 'user{}'.format(n),
+            'displayName': 'User {}'.format(n),
+            'emailAddress': 'user{}@example.com'.format(n),
+        }
+
+    def _text(self, rng, words):
+        return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+    def _timestamp(self, n, offset=0):
+        moment = time.gmtime(1500000000 + n * 3600 + offset)
+        return time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', moment)
+
+    def _item(self, field, before, after):
+        def describe(value):
+            if isinstance(value, dict):
+                return (value.get('id'), value.get('displayName', value.get('name')),)
+            if isinstance(value, list):
+                return (None, ' '.join(str(each) for each in value),)
+            return (None, (None if value is None else str(value)),)
+        (before_id, before_string), (after_id, after_string) = describe(before), describe(after)
+        return {'field': field, 'fieldtype': 'jira', 'from': before_id, 'fromString': before_string, 'to': after_id, 'toString': after_string}
+
+    def update(self, n, fields):
+        previous = self.current_fields(n)
+        items = [self._item(k, previous.get(k), v) for k, v in fields.items() if not k.startswith('_') and previous.get(k) != v]
+        with self._lock:
+            if items:
+                self.added_histories[n].append({
+                    'id': str(n * 1000000 + 800000 + len(self.added_histories[n])),
+                    'author': {'key': 'bench', 'name': 'bench', 'displayName': 'Bench', 'emailAddress': 'bench@example.com'},
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime()),
+                    'items': items,
+                })
+            override = self.overrides.setdefault(n, {})
+            override.update(fields)
+            override['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime())
+            override['_updated'] = time.time()
+
+    def add_comment(self, n, body):
+        with self._lock:
+            moment = time.strftime('%Y-%m-%dT%H:%M:%S.000+0000', time.gmtime())
+            comment = {
+                'id': str(n * 1000000 + 900000 + len(self.added_comments[n])),
+                'body': body,
+                'author': {'key': 'bench', 'name': 'bench', 'displayName': 'Bench', 'emailAddress': 'bench@example.com'},
+                'updateAuthor': {'key': 'bench', 'name': 'bench', 'displayName': 'Bench', 'emailAddress': 'bench@example.com'},
+                'created': moment,
+                'updated': moment,
+            }
+            self.added_comments[n].append(comment)
+        self.update(n, {})
+        return comment
+
+    def issue_comments(self, n):
+        return self.fields(n)['comment']['comments'] + list(self.added_comments.get(n, []))
+
+    def histories(self, n):
+        """Changelog of an issue: a walk through statuses ending in its (generated) status,
+        followed by entries recorded for writes.
+        """
+        rng = random.Random(self.seed * 1000003 + n + 500000)
+        fields = self.fields(n)
+        final = [each for each in STATUSES if each[0] == fields['status']['id']][0]
+        walk = [STATUSES[0]]
+        for _ in range(rng.randrange(1, 8)):
+            walk.append(rng.choice([each for each in STATUSES if each != walk[-1]]))
+        walk = walk[1:] + ([final] if walk[-1] != final else [])
+        histories = []
+        for i, (before, after) in enumerate(zip([STATUSES[0]] + walk, walk)):
+            histories.append({
+                'id': str(n * 1000 + i),
+                'author': self._person(rng),
+                'created': self._timestamp(n, (i + 1) * 3600),
+                'items': [self._item('status', {'id': before[0], 'name': before[1]}, {'id': after[0], 'name': after[1]})],
+            })
+        return histories + list(self.added_histories.get(n, []))
+
+    def parent(self, n):
+        """Issues form a hierarchy: every 25th issue is an epic, every 5th one is a story in
+        the preceding epic, and the rest are subtasks of the preceding story.
+        """
+        if (n - 1) % 25 == 0:
+            return None
+        if (n - 1) % 5 == 0:
+            return n - (n - 1) % 25
+        return n - (n - 1) % 5
+
+    def links(self, n):
+        """Every third issue blocks the issue 6 keys after it (so blockers form chains), and every fourth one relates
+        to the issue 11 keys after it (both sides of a link list it).
+        """
+        links = []
+        for name, inward, outward, every, distance in (('Blocks', 'is blocked by', 'blocks', 3, 6), ('Relates', 'relates to', 'relates to', 4, 11)):
+            link_type = {'name': name, 'inward': inward, 'outward': outward}
+            if n % every == 0 and n + distance <= self.size:
+                links.append({'id': '{}{}'.format(n, name), 'type': link_type, 'outwardIssue': {'key': self.key(n + distance)}})
+            if n - distance >= 1 and (n - distance) % every == 0:
+                links.append({'id': '{}{}'.format(n - distance, name), 'type': link_type, 'inwardIssue': {'key': self.key(n - distance)}})
+        return links
+
+    def all_labels(self):
+        """Labels known to the server (labels of issues and `labels` generated ones), in no particular order.
+        """
+        if self._all_labels is None:
+            rng = random.Random(self.seed)
+            generated = ['{}-{}-{}'.format(rng.choice(WORDS), rng.choice(WORDS), i) for i in range(self.labels)]
+            rng.shuffle(generated)
+            self._all_labels = list(WORDS) + generated
+        return self._all_labels
+
+    def createmeta(self):
+        """Issue creation metadata of `projects` projects (with fields of every issue type expanded).
+        """
+        projects = []
+        for p in range(self.projects):
+            rng = random.Random('{}-createmeta-{}'.format(self.seed, p))
+            issuetypes = []
+            for type_id, issuetype in ISSUE_TYPES:
+                fields = {}
+                for f in range(30):
+                    fields['customfield_{}'.format(10000 + f)] = {
+                        'required': (f % 7 == 0),
+                        'name': self._text(rng, 3).capitalize(),
+                        'schema': {'type': 'option', 'custom': 'com.atlassian.jira.plugin.system.customfieldtypes:select'},
+                        'allowedValues': [{'id': str(v), 'value': self._text(rng, 2)} for v in range(f % 10)],
+                    }
+                issuetypes.append({'id': type_id, 'name': issuetype, 'description': self._text(rng, 40), 'subtask': (issuetype == 'Sub-task'), 'fields': fields})
+            projects.append({
+                'id': str(10000 + p),
+                'key': (PROJECT if p == 0 else '{}{}'.format(PROJECT, p)),
+                'name': 'Benchmark {}'.format(p),
+                'issuetypes': issuetypes,
+            })
+        return {'expand': 'projects', 'projects': projects}
+
+    def updated_since(self, n, moment):
+        return self.overrides.get(n, {}).get('_updated', 0) >= moment
+
+    def fields(self, n):
+        rng = random.Random(self.seed * 1000003 + n)
+        status_id, status_name, category_key, category_name = rng.choice(STATUSES)
+        priority_id, priority_name = rng.choice(PRIORITIES)
+        type_id, type_name = rng.choice(ISSUE_TYPES)
+        comments = [{
+            'id': str(n * 1000 + i),
+            'body': self._text(rng, 30),
+            'author': self._person(rng),
+            'updateAuthor': self._person(rng),
+            'created': self._timestamp(n, i * 60),
+            'updated': self._timestamp(n, i * 60),
+        } for i in range(self.comments)]
+        fields = {
+            'summary': '{} {}'.format(self._text(rng, 6), n).capitalize(),
+            'description': self._text(rng, 80),
+            'status': {
+                'id': status_id,
+                'name': status_name,
+                'statusCategory': {'key': category_key, 'name': category_name},
+            },
+            'priority': {'id': priority_id, 'name': priority_name},
+            'issuetype': {'id': type_id, 'name': type_name},
+            'project': {'id': '10000', 'key': PROJECT, 'name': 'Benchmark'},
+            'assignee': (self._person(rng) if rng.random() > 0.2 else None),
+            'reporter': self._person(rng),
+            'created': self._timestamp(n),
+            'updated': self._timestamp(n, 86400),
+            'labels': rng.sample(WORDS, rng.randrange(4)),
+            'comment': {
+                'comments': comments,
+                'maxResults': len(comments),
+                'total': len(comments),
+                'startAt': 0,
+            },
+        }
+        fields['issuelinks'] = self.links(n)
+        fields['attachment'] = self.attachments(n)
+        if self.parent(n) is not None:
+            fields['parent'] = {'id': str(10000 + self.parent(n)), 'key': self.key(self.parent(n))}
+        return fields
+
+    def attachments(self, n):
+        """Every 5th issue has a build log and a screenshot of its own, and a logo
+        with the same content as logos of other issues.
+        """
+        if n % 5:
+            return []
+        rng = random.Random(self.seed * 1000003 + n + 500000)
+        files = [
+            ('build-{}.log'.format(n), 'text/plain', (self.log_size or (rng.randrange(1, 4) * 1024 * 1024 + rng.randrange(1024)))),
+            ('screenshot-{}.png'.format(n), 'image/png', rng.randrange(50000, 200000)),
+            ('logo.png', 'image/png', LOGO_SIZE),
+        ]
+        return [{
+            'id': str(n * 10 + i),
+            'filename': filename,
+            'author': self._person(rng),
+            'created': self._timestamp(n, 600 + i),
+            'size': size,
+            'mimeType': mime_type,
+            'content': '{}/secure/attachment/{}/{}'.format(self.base_url, n * 10 + i, filename),
+        } for i, (filename, mime_type, size) in enumerate(files)]
+
+    def attachment_content(self, attachment_id):
+        """Returns (filename, content as a Stream) of an attachment, or None if it does not exist.
+        """
+        n, i = divmod(attachment_id, 10)
+        attachments = (self.attachments(n) if 1 <= n <= self.size else [])
+        if i >= len(attachments):
+            return None
+        attachment = attachments[i]
+        rng = random.Random(self.seed if attachment['filename'] == 'logo.png' else (self.seed * 1000003 + attachment_id))
+        def chunks(size, chunk_size=64 * 1024):
+            for start in range(0, size, chunk_size):
+                yield rng.randbytes(min(chunk_size, size - start))
+        return (attachment['filename'], Stream(attachment['size'], chunks(attachment['size'])))
+
+    def current_fields(self, n):
+        fields = self.fields(n)
+        fields.update((k, v) for k, v in self.overrides.get(n, {}).items() if not k.startswith('_'))
+        if n in self.added_comments:
+            comments = self.issue_comments(n)
+            fields['comment'] = dict(fields['comment'], comments=comments, maxResults=len(comments), total=len(comments))
+        return fields
+
+    def issue(self, n, fields=None):
+        all_fields = self.current_fields(n)
+        if fields:
+            wanted = set(each for each in fields if not each.startswith('-'))
+            excluded = set(each[1:] for each in fields if each.startswith('-'))
+            if wanted and not ({'*all', '*navigable'} & wanted):
+                all_fields = {k: v for k, v in all_fields.items() if k in wanted}
+            all_fields = {k: v for k, v in all_fields.items() if k not in excluded}
+        return {
+            'id': str(10000 + n),
+            'key': self.key(n),
+            'self': '/rest/api/2/issue/{}'.format(10000 + n),
+            'fields': all_fields,
+        }
+
+
+class JQL:
+    """Evaluator for the small subset of JQL used by Jiraline.
+
+    Supports AND, OR, NOT, parentheses, and clauses on project, key, status, priority,
+    assignee, parent, and updated (relative dates like "-5m" only).
+    Unsupported clauses match every issue.
+    """
+    CLAUSE = re.compile(r'\s*(?P<field>"[^"]+"|[\w.]+)\s*(?P<op>not in|in|>=|<=|!=|=|>|<)\s*(?P<value>\([^()]*\)|"[^"]*"|\'[^\']*\'|[^\s()]+)', re.IGNORECASE)
+    KEYWORD = re.compile(r'\s*(\(|\)|AND\b|OR\b|NOT\b)', re.IGNORECASE)
+
+    def __init__(self, dataset, text):
+        self.dataset = dataset
+        text = re.split(r'\bORDER\s+BY\b', text or '', flags=re.IGNORECASE)[0]
+        self.tokens = self._tokenize(text)
+        self.position = 0
+        self.predicate = (self._expression() if self.tokens else (lambda n: True))
+
+    def _tokenize(self, text):
+        tokens, position = [], 0
+        while text[position:].strip():
+            match = self.KEYWORD.match(text, position)
+            if match is not None:
+                tokens.append(match.group(1).upper())
+            else:
+                match = self.CLAUSE.match(text, position)
+                if match is None:
+                    raise ValueError('cannot parse JQL at: {}'.format(text[position:]))
+                tokens.append(match.groupdict())
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        return (self.tokens[self.position] if self.position < len(self.tokens) else None)
+
+    def _next(self):
+        self.position += 1
+        return self.tokens[self.position - 1]
+
+    def _expression(self):
+        terms = [self._term()]
+        while self._peek() == 'OR':
+            self._next()
+            terms.append(self._term())
+        return (terms[0] if len(terms) == 1 else (lambda n: any(term(n) for term in terms)))
+
+    def _term(self):
+        factors = [self._factor()]
+        while self._peek() == 'AND':
+            self._next()
+            factors.append(self._factor())
+        return (factors[0] if len(factors) == 1 else (lambda n: all(factor(n) for factor in factors)))
+
+    def _factor(self):
+        token = self._next()
+        if token == 'NOT':
+            factor = self._factor()
+            return (lambda n: not factor(n))
+        if token == '(':
+            expression = self._expression()
+            self._next()
+            return expression
+        return self._clause(token['field'].strip('"').lower(), token['op'].lower(), token['value'])
+
+    def _clause(self, field, op, value):
+        if value.startswith('('):
+            values = [each.strip().strip('"\'') for each in value[1:-1].split(',') if each.strip()]
+        else:
+            values = [value.strip('"\'')]
+        values = [each.lower() for each in values]
+        dataset = self.dataset
+        if field == 'updated' and values[0].startswith('-') and values[0][-1] in 'mhd':
+            seconds = int(values[0][1:-1]) * {'m': 60, 'h': 3600, 'd': 86400}[values[0][-1]]
+            since = time.time() - seconds
+            return (lambda n: dataset.updated_since(n, since))
+        if field == 'project':
+            return (lambda n: (PROJECT.lower() in values) != (op in ('!=', 'not in')))
+        if field == 'key':
+            numbers = [dataset.number(each.upper()) for each in values]
+            if op in ('in', '=', 'not in', '!='):
+                wanted = set(numbers)
+                return (lambda n: (n in wanted) != (op in ('!=', 'not in')))
+            bound = (numbers[0] or 0)
+            return {
+                '>=': (lambda n: n >= bound),
+                '<=': (lambda n: n <= bound),
+                '>': (lambda n: n > bound),
+                '<': (lambda n: n < bound),
+            }[op]
+        getters = {
+            'status': lambda f: [f['status']['id'], f['status']['name'].lower()],
+            'priority': lambda f: [f['priority']['id'], f['priority']['name'].lower()],
+            'assignee': lambda f: ([f['assignee']['name']] if f['assignee'] else ['empty', 'null']),
+            'parent': lambda f: ([f['parent']['key'].lower()] if f.get('parent') else []),
+        }
+        if field in getters:
+            getter = getters[field]
+            return (lambda n: bool(set(getter(dataset.current_fields(n))) & set(values)) != (op in ('!=', 'not in')))
+        return (lambda n: True)
+
+    def matching(self):
+        if not self.tokens:
+            return range(1, self.dataset.size + 1)
+        return [n for n in range(1, self.dataset.size + 1) if self.predicate(n)]
+
+
+def split_fields(params):
+    fields = []
+    for each in params.get('fields', []):
+        fields.extend(f for f in each.split(',') if f)
+    return fields
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately; without TCP_NODELAY reused (keep-alive)
+    # connections would stall on delayed acknowledgements, which real servers do not do
+    disable_nagle_algorithm = True
+
+    # Route table: (method, pattern, handler method name).
+    ROUTES = (
+        ('GET', '/rest/api/2/search', 'search'),
+        ('GET', '/rest/api/2/issue/createmeta', 'createmeta'),
+        ('GET', '/rest/api/2/issue/(?P<key>[^/]+)/transitions', 'transitions'),
+        ('POST', '/rest/api/2/issue/(?P<key>[^/]+)/transitions', 'transition'),
+        ('GET', '/rest/api/2/label', 'labels'),
+        ('GET', '/rest/api/2/issue/(?P<key>[^/]+)/comment', 'comments'),
+        ('GET', '/secure/attachment/(?P<attachment_id>\\d+)/(?P<filename>[^/]+)', 'attachment'),
+        ('GET', '/rest/api/2/issue/(?P<key>[^/]+)/changelog', 'changelog'),
+        ('POST', '/rest/api/2/issue/(?P<key>[^/]+)/comment', 'comment'),
+        ('POST', '/rest/api/2/issue/(?P<key>[^/]+)/worklog', 'created'),
+        ('PUT', '/rest/api/2/issue/(?P<key>[^/]+)/assignee', 'no_content'),
+        ('GET', '/rest/api/2/issue/(?P<key>[^/]+)', 'issue'),
+        ('PUT', '/rest/api/2/issue/(?P<key>[^/]+)', 'edit'),
+        ('POST', '/rest/api/2/issue', 'create'),
+    )
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _dispatch(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = (self.rfile.read(length) if length else b'')
+        for route_method, pattern, name in self.ROUTES:
+            match = (re.fullmatch(pattern, url.path) if route_method == method else None)
+            if match is None:
+                continue
+            self.server.record('{} {}'.format(method, pattern))
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            if name in self.server.failing:
+                return self._respond(503, {'errorMessages': ['{} is unavailable'.format(name)]})
+            status, payload = getattr(self, 'route_' + name)(params=params, body=body, **match.groupdict())
+            return self._respond(status, payload)
+        self.server.record('{} <unknown>'.format(method))
+        return self._respond(404, {'errorMessages': ['no route for {} {}'.format(method, url.path)]})
+
+    def _respond(self, status, payload):
+        if isinstance(payload, Stream):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(payload.size))
+            self.end_headers()
+            for chunk in payload.chunks:
+                self.wfile.write(chunk)
+            return
+        data = (b'' if payload is None else json.dumps(payload).encode('utf-8'))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    # Routes.
+    def _not_found(self, key):
+        return (404, {'errorMessages': ['Issue {} does not exist'.format(key)]})
+
+    def route_attachment(self, attachment_id, filename, params, body):
+        attachment = self.server.dataset.attachment_content(int(attachment_id))
+        if attachment is None or attachment[0] != urllib.parse.unquote(filename):
+            return (404, {'errorMessages': ['Attachment {} does not exist'.format(attachment_id)]})
+        return (200, attachment[1])
+
+    def route_issue(self, key, params, body):
+        n = self.server.dataset.number(key)
+        if n is None:
+            return self._not_found(key)
+        return (200, self.server.dataset.issue(n, split_fields(params)))
+
+    def route_comments(self, key, params, body):
+        n = self.server.dataset.number(key)
+        if n is None:
+            return self._not_found(key)
+        start_at = int(params.get('startAt', ['0'])[0])
+        max_results = min(int(params.get('maxResults', ['50'])[0]), self.server.max_results)
+        comments = self.server.dataset.issue_comments(n)
+        if params.get('orderBy', ['created'])[0].startswith('-'):
+            comments = comments[::-1]
+        return (200, {
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(comments),
+            'comments': comments[start_at:start_at + max_results],
+        })
+
+    def route_changelog(self, key, params, body):
+        n = self.server.dataset.number(key)
+        if n is None:
+            return self._not_found(key)
+        start_at = int(params.get('startAt', ['0'])[0])
+        max_results = min(int(params.get('maxResults', ['100'])[0]), self.server.max_results)
+        histories = self.server.dataset.histories(n)
+        return (200, {
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(histories),
+            'isLast': (start_at + max_results >= len(histories)),
+            'values': histories[start_at:start_at + max_results],
+        })
+
+    def route_labels(self, params, body):
+        start_at = int(params.get('startAt', ['0'])[0])
+        max_results = min(int(params.get('maxResults', ['1000'])[0]), 1000)
+        labels = self.server.dataset.all_labels()
+        return (200, {
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(labels),
+            'isLast': (start_at + max_results >= len(labels)),
+            'values': labels[start_at:start_at + max_results],
+        })
+
+    def route_comment(self, key, params, body):
+        n = self.server.dataset.number(key)
+        if n is None:
+            return self._not_found(key)
+        return (201, self.server.dataset.add_comment(n, json.loads(body or b'{}').get('body', '')))
+
+    def route_search(self, params, body):
+        dataset = self.server.dataset
+        start_at = int(params.get('startAt', ['0'])[0])
+        max_results = int(params.get('maxResults', ['50'])[0])
+        max_results = min(max_results, self.server.max_results)
+        fields = split_fields(params)
+        try:
+            matching = JQL(dataset, params.get('jql', [''])[0]).matching()
+        except ValueError as e:
+            return (400, {'errorMessages': [str(e)]})
+        return (200, {
+            'expand': 'names,schema',
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(matching),
+            'issues': [dataset.issue(n, fields) for n in matching[start_at:start_at + max_results]],
+        })
+
+    def route_transitions(self, key, params, body):
+        if self.server.dataset.number(key) is None:
+            return self._not_found(key)
+        return (200, {
+            'expand': 'transitions',
+            'transitions': [{'id': i, 'name': name, 'to': {'id': i, 'name': name}} for i, name in TRANSITIONS],
+        })
+
+    def route_transition(self, key, params, body):
+        n = self.server.dataset.number(key)
+        if n is None:
+            return self._not_found(key)
+        transition = json.loads(body or b'{}').get('transition', {}).get('id')
+        names = dict(TRANSITIONS)
+        if transition not in names:
+            return (400, {'errorMessages': ['transition {} is not valid'.format(transition)]})
+        self.server.dataset.update(n, {'status': {
+            'id': transition,
+            'name': names[transition],
+            'statusCategory': {'key': 'indeterminate', 'name': 'In Progress'},
+        }})
+        return (204, None)
+
+    def route_edit(self, key, params, body):
+        n = self.server.dataset.number(key)
+        if n is None:
+            return self._not_found(key)
+        payload = json.loads(body or b'{}')
+        fields = dict(payload.get('fields', {}))
+        for each in payload.get('update', {}).get('labels', []):
+            labels = fields.setdefault('labels', list(self.server.dataset.current_fields(n)['labels']))
+            if 'add' in each and each['add'] not in labels:
+                labels.append(each['add'])
+            if 'remove' in each and each['remove'] in labels:
+                labels.remove(each['remove'])
+        self.server.dataset.update(n, fields)
+        return (204, None)
+
+    def route_createmeta(self, params, body):
+        return (200, self.server.dataset.createmeta())
+
+    def route_create(self, params, body):
+        return (201, {'id': '99999', 'key': '{}-99999'.format(PROJECT)})
+
+    def route_created(self, key, params, body):
+        if self.server.dataset.number(key) is None:
+            return self._not_found(key)
+        return (201, {'id': '1'})
+
+    def route_no_content(self, key, params, body):
+        if self.server.dataset.number(key) is None:
+            return self._not_found(key)
+        return (204, None)
+
+
+class MockJiraServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, dataset, latency=0.0, max_results=100):
+        super().__init__(address, Handler)
+        self.dataset = dataset
+        self.dataset.base_url = self.url()
+        self.latency = latency
+        self.max_results = max_results
+        # names of routes (e.g. "comments") answered with 503, to check how failures are handled
+        self.failing = set()
+        self._lock = threading.Lock()
+        self._requests = collections.Counter()
+
+    def record(self, route):
+        with self._lock:
+            self._requests[route] += 1
+
+    def requests(self):
+        """Returns a snapshot of request counts per route.
+        """
+        with self._lock:
+            return dict(self._requests)
+
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in Jira REST server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--issues', type=int, default=500, help='number of synthetic issues')
+    parser.add_argument('--comments', type=int, default=5, help='number of comments per issue')
+    parser.add_argument('--labels', type=int, default=1000, help='number of generated labels known to the server')
+    parser.add_argument('--projects', type=int, default=50, help='number of projects in issue creation metadata')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated data')
+    parser.add_argument('--latency', type=float, default=0.0, help='latency added to every request (milliseconds)')
+    parser.add_argument('--max-results', type=int, default=100, help='server-side cap for search page size')
+    args = parser.parse_args()
+    server = MockJiraServer((args.host, args.port), Dataset(args.issues, comments=args.comments, seed=args.seed, labels=args.labels, projects=args.projects), latency=(args.latency / 1000), max_results=args.max_results)
+    print('serving {} issues on {}'.format(args.issues, server.url()))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+
+"""Benchmark harness for Jiraline.
+
+Starts a local stand-in Jira server (see mock_jira.py), installs Jiraline's data files into a
+throw-away home directory, and runs real Jiraline commands against the server.
+For every scenario it reports wall-clock latency percentiles, number of HTTP requests
+per run, and peak RSS of the Jiraline process.
+Results are printed (or written) as JSON so they can be compared across commits:
+
+    python3 bench/run.py --output before.json
+    git checkout other-commit
+    python3 bench/run.py --compare before.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import mock_jira
+
+
+BENCH_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIRECTORY = os.path.dirname(BENCH_DIRECTORY)
+
+
+class Environment:
+    """Throw-away home directory with Jiraline installed the same way `make install` does it.
+    """
+    def __init__(self, server_url, keep=False):
+        self.home = tempfile.mkdtemp(prefix='jiraline-bench-')
+        self.keep = keep
+        share = os.path.join(self.home, '.local', 'share', 'jiraline')
+        os.makedirs(os.path.join(share, 'messages'))
+        shutil.copy(os.path.join(REPOSITORY_DIRECTORY, 'ui.json'), os.path.join(share, 'ui.json'))
+        messages = os.path.join(REPOSITORY_DIRECTORY, 'share', 'messages')
+        for each in os.listdir(messages):
+            shutil.copy(os.path.join(messages, each), os.path.join(share, 'messages', each))
+        os.makedirs(self.cache_dir())
+        os.makedirs(self.config_dir())
+        self.write_config({
+            'server': server_url,
+            'credentials': {
+                'user': 'bench',
+                'password': 'bench',
+            },
+            'default_project': mock_jira.PROJECT,
+        })
+
+    def cache_dir(self):
+        return os.path.join(self.home, '.cache', 'jiraline')
+
+    def config_dir(self):
+        return os.path.join(self.home, '.config', 'jiraline')
+
+    def log_dir(self):
+        return os.path.join(self.home, '.local', 'log', 'jiraline')
+
+    def write_config(self, config):
+        with open(os.path.join(self.config_dir(), 'config.json'), 'w') as ofstream:
+            ofstream.write(json.dumps(config))
+
+    def clear_cache(self):
+        shutil.rmtree(self.cache_dir())
+        os.makedirs(self.cache_dir())
+
+    def env(self):
+        env = dict(os.environ)
+        env['HOME'] = self.home
+        env['EDITOR'] = 'true'
+        env.pop('JIRALINE_TRACE', None)
+        return env
+
+    def cleanup(self):
+        if not self.keep:
+            shutil.rmtree(self.home, ignore_errors=True)
+
+
+def run_jiraline(environment, argv, head=None):
+    """Runs Jiraline and returns (exit code, wall time in seconds, peak RSS in KiB, stderr text).
+    If head is given only that many lines of output are read before closing the pipe, like `| head` does.
+    """
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPOSITORY_DIRECTORY, 'jiraline.py')] + list(argv),
+            stdin=subprocess.DEVNULL,
+            stdout=(subprocess.DEVNULL if head is None else subprocess.PIPE),
+            stderr=stderr,
+            env=environment.env(),
+        )
+        if head is not None:
+            for _ in range(head):
+                if not process.stdout.readline():
+                    break
+            process.stdout.close()
+        _, status, rusage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        error_output = stderr.read().decode('utf-8', errors='replace')
+    peak_rss = rusage.ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS reports bytes, Linux reports kilobytes
+        peak_rss //= 1024
+    return (process.returncode, elapsed, peak_rss, error_output)
+
+
+def replayed(argv):
+    """Returns scenario running argv with responses recorded by a run made during setup, so only
+    local work (parsing, caching, rendering) is measured.
+    """
+    directory = os.path.join('{home}', 'recorded', '-'.join(argv))
+    return {
+        'argv': ['--replay', directory] + argv,
+        'setup': lambda env: run_jiraline(env, ['--record', directory.format(home=env.home)] + argv),
+    }
+
+
+def ensure_label_registry(environment):
+    if not os.path.isfile(os.path.join(environment.cache_dir(), 'labels', 'registry.json')):
+        run_jiraline(environment, ['issue', 'label', 'sync'])
+
+
+def write_shortlog(environment, size):
+    os.makedirs(environment.log_dir(), exist_ok=True)
+    events = ('show', 'slug', 'comment', 'transition', 'label-add')
+    shortlog = []
+    for i in range(size):
+        event = events[(i // 3) % len(events)]
+        parameters = {
+            'show': {},
+            'slug': {'slug': 'issue/bench-{}/example'.format(i % 40)},
+            'comment': {'comment': 'benchmark comment {}'.format(i)},
+            'transition': {'to': '21'},
+            'label-add': {'labels': ['bench']},
+        }[event]
+        shortlog.append({
+            'event': event,
+            'parameters': parameters,
+            'issue': '{}-{}'.format(mock_jira.PROJECT, (i // 2) % 40 + 1),
+            'timestamp': 1500000000 + i * 60,
+        })
+    with open(os.path.join(environment.log_dir(), 'shortlog.json'), 'w') as ofstream:
+        ofstream.write(json.dumps(shortlog))
+    # the journal is seeded from the shortlog when it does not exist
+    journal = os.path.join(environment.log_dir(), 'events.jsonl')
+    if os.path.exists(journal):
+        os.unlink(journal)
+
+
+def key(n):
+    return '{}-{}'.format(mock_jira.PROJECT, n)
+
+
+# Every scenario is a dictionary with:
+#   - argv:     command line passed to Jiraline ("{home}" is replaced with the home directory)
+#   - setup:    (optional) called once before warm-up runs
+#   - prepare:  (optional) called before every run, not timed
+#   - head:     (optional) number of output lines to read before closing the pipe
+SCENARIOS = {
+    'fetch': {
+        'argv': ['fetch'] + [key(n) for n in range(1, 21)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'fetch-sequential': {
+        'argv': ['fetch', '--jobs', '1'] + [key(n) for n in range(1, 21)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'fetch-fanout': {
+        'argv': ['fetch', '--jobs', '256'] + [key(n) for n in range(1, 501)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'history-project': {
+        'argv': ['history', '--quiet', '-p', mock_jira.PROJECT],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'history-project-incremental': {
+        'argv': ['history', '--quiet', '-p', mock_jira.PROJECT],
+    },
+    'tree': {
+        'argv': ['tree', key(26)],
+    },
+    'tree-cold': {
+        'argv': ['tree', key(26)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'deps': {
+        'argv': ['deps', key(3)],
+    },
+    'deps-cold': {
+        'argv': ['deps', key(3)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'label-sync': {
+        'argv': ['issue', 'label', 'sync'],
+    },
+    'label-complete': {
+        'argv': ['issue', 'label', 'ls', 'crash-lo'],
+        'prepare': lambda env: ensure_label_registry(env),
+    },
+    'show-replay': replayed(['issue', 'show', key(7)]),
+    'search-replay': replayed(['search', '-p', mock_jira.PROJECT, '-n', '50', '--table']),
+    'search': {
+        'argv': ['search', '-p', mock_jira.PROJECT, '-n', '50'],
+    },
+    'search-table': {
+        'argv': ['search', '-p', mock_jira.PROJECT, '-n', '50', '--table'],
+    },
+    'show': {
+        'argv': ['issue', 'show', key(7)],
+    },
+    'show-last': {
+        'argv': ['issue', 'show', '--last', '5', key(7)],
+    },
+    'show-cold': {
+        'argv': ['issue', 'show', key(7)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'show-cached': {
+        'argv': ['issue', key(7)],
+        'setup': lambda env: run_jiraline(env, ['fetch', key(7)]),
+    },
+    'slug': {
+        'argv': ['slug', key(7)],
+        'setup': lambda env: run_jiraline(env, ['fetch', key(7)]),
+    },
+    'slug-uncached': {
+        'argv': ['slug', key(8)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'shortlog-squash': {
+        'argv': ['shortlog', 'squash', '-A'],
+        'prepare': lambda env: write_shortlog(env, 80),
+    },
+    'render-shortlog': {
+        'argv': ['shortlog'],
+        'setup': lambda env: write_shortlog(env, 100000),
+    },
+    'render-shortlog-colour': {
+        'argv': ['shortlog', '--colorise'],
+        'setup': lambda env: write_shortlog(env, 100000),
+    },
+    'render-shortlog-head': {
+        'argv': ['shortlog'],
+        'setup': lambda env: write_shortlog(env, 100000),
+        'head': 10,
+    },
+    'export': {
+        'argv': ['export', '-p', mock_jira.PROJECT, '-o', os.devnull],
+    },
+    'export-sequential': {
+        'argv': ['export', '-p', mock_jira.PROJECT, '--jobs', '1', '-o', os.devnull],
+    },
+    'export-csv': {
+        'argv': ['export', '-p', mock_jira.PROJECT, '-f', 'csv', '-o', os.devnull],
+    },
+    'stats': {
+        'argv': ['stats', '--group-by', 'status,assignee,priority'],
+        'setup': lambda env: run_jiraline(env, ['watch', '-p', mock_jira.PROJECT, '--count', '0']),
+    },
+    'warm': {
+        'argv': ['warm', '--count', '20'],
+        'prepare': lambda env: (write_shortlog(env, 1000), env.clear_cache()),
+    },
+    'shortlog-report': {
+        'argv': ['shortlog', 'report'],
+        'setup': lambda env: write_shortlog(env, 100000),
+    },
+    'shortlog-report-rebuild': {
+        'argv': ['shortlog', 'report', '--rebuild'],
+        'setup': lambda env: write_shortlog(env, 100000),
+    },
+    'transition-list': {
+        'argv': ['issue', 'transition', key(7)],
+    },
+    'transition': {
+        'argv': ['issue', 'transition', '--to', '21', key(7)],
+    },
+    'attachments': {
+        'argv': ['attachments', '--all', '-o', '{home}', key(10)],
+    },
+    'attachments-cold': {
+        'argv': ['attachments', '--all', '-o', '{home}', key(10)],
+        'prepare': lambda env: env.clear_cache(),
+    },
+    'comment-bulk': {
+        'argv': ['comment', '-m', 'Deployed {{issue_name}} in 4.2.1'] + [key(n) for n in range(1, 51)],
+    },
+    'comment-bulk-sequential': {
+        'argv': ['comment', '--jobs', '1', '-m', 'Deployed {{issue_name}} in 4.2.1'] + [key(n) for n in range(1, 51)],
+    },
+}
+
+
+def percentile(values, p):
+    """Linear-interpolation percentile of a sorted sequence.
+    """
+    if not values:
+        return None
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def run_scenario(server, environment, name, scenario, repeat, warmup):
+    if 'setup' in scenario:
+        scenario['setup'](environment)
+    timings, peak_rss, requests_per_run, errors = [], 0, [], []
+    for i in range(warmup + repeat):
+        if 'prepare' in scenario:
+            scenario['prepare'](environment)
+        requests_before = server.requests()
+        argv = [each.format(home=environment.home) for each in scenario['argv']]
+        exit_code, elapsed, rss, error_output = run_jiraline(environment, argv, head=scenario.get('head'))
+        requests_after = server.requests()
+        if exit_code != 0:
+            errors.append({'exit_code': exit_code, 'stderr': error_output[-2000:]})
+            continue
+        if i < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        peak_rss = max(peak_rss, rss)
+        requests_per_run.append({route: (count - requests_before.get(route, 0)) for route, count in requests_after.items() if count != requests_before.get(route, 0)})
+    timings.sort()
+    result = {
+        'argv': scenario['argv'],
+        'runs': len(timings),
+        'latency_ms': {
+            'min': (timings[0] if timings else None),
+            'p50': percentile(timings, 50),
+            'p90': percentile(timings, 90),
+            'p99': percentile(timings, 99),
+            'max': (timings[-1] if timings else None),
+            'mean': (sum(timings) / len(timings) if timings else None),
+        },
+        'requests_per_run': (sum(sum(each.values()) for each in requests_per_run) / len(requests_per_run) if requests_per_run else 0),
+        'requests_by_route': (requests_per_run[-1] if requests_per_run else {}),
+        'peak_rss_kb': peak_rss,
+    }
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(('git', 'rev-parse', 'HEAD'), cwd=REPOSITORY_DIRECTORY, stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print('{:<20} {:>12} {:>12} {:>9} {:>10} {:>10}'.format('scenario', 'base p50', 'p50', 'change', 'base rss', 'rss'), file=sys.stderr)
+    for name, result in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None or not base['latency_ms']['p50'] or not result['latency_ms']['p50']:
+            continue
+        change = (result['latency_ms']['p50'] / base['latency_ms']['p50'] - 1) * 100
+        print('{:<20} {:>12.1f} {:>12.1f} {:>+8.1f}% {:>10} {:>10}'.format(
+            name,
+            base['latency_ms']['p50'],
+            result['latency_ms']['p50'],
+            change,
+            base['peak_rss_kb'],
+            result['peak_rss_kb'],
+        ), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Jiraline benchmarks against a local stand-in Jira server.')
+    parser.add_argument('scenarios', nargs='*', metavar='scenario', help='scenarios to run (default: all); available: {}'.format(', '.join(SCENARIOS)))
+    parser.add_argument('--repeat', '-r', type=int, default=10, help='measured runs per scenario')
+    parser.add_argument('--warmup', '-w', type=int, default=1, help='unmeasured runs per scenario')
+    parser.add_argument('--latency', '-l', type=float, default=0.0, help='latency added to every request (milliseconds)')
+    parser.add_argument('--issues', type=int, default=500, help='number of synthetic issues')
+    parser.add_argument('--comments', type=int, default=5, help='number of comments per issue')
+    parser.add_argument('--labels', type=int, default=1000, help='number of generated labels known to the server')
+    parser.add_argument('--output', '-o', help='write results to this file instead of standard output')
+    parser.add_argument('--compare', '-c', help='compare with results stored in this file')
+    parser.add_argument('--keep', action='store_true', help='do not remove the temporary home directory')
+    args = parser.parse_args()
+
+    unknown = [each for each in args.scenarios if each not in SCENARIOS]
+    if unknown:
+        parser.error('unknown scenarios: {}'.format(', '.join(unknown)))
+
+    dataset = mock_jira.Dataset(args.issues, comments=args.comments, labels=args.labels)
+    server = mock_jira.MockJiraServer(('127.0.0.1', 0), dataset, latency=(args.latency / 1000)).start()
+    environment = Environment(server.url(), keep=args.keep)
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency_ms': args.latency,
+            'issues': args.issues,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+        },
+        'scenarios': {},
+    }
+    failed = False
+    try:
+        for name in (args.scenarios or SCENARIOS):
+            print('running {}'.format(name), file=sys.stderr)
+            result = run_scenario(server, environment, name, SCENARIOS[name], args.repeat, args.warmup)
+            results['scenarios'][name] = result
+            if 'errors' in result:
+                failed = True
+                print('{}: {} failed runs, last error:\n{}'.format(name, len(result['errors']), result['errors'][-1]['stderr']), file=sys.stderr)
+    finally:
+        server.shutdown()
+        environment.cleanup()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as ofstream:
+            ofstream.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as ifstream:
+            compare(results, json.loads(ifstream.read()))
+    exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""Stress test for Jiraline's local storage.
+
+Runs many processes that concurrently write to the same files (cache, shortlog and its
+journal, pins, known labels, last active issue marker, and outbox) in a throw-away home
+directory, and then checks that no write was lost and that every file is still readable:
+
+    python3 bench/stress_storage.py --workers 16 --iterations 50
+
+With --without-locks file locks are disabled (writes are still atomic), which shows the
+lost updates that locking prevents.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+BENCH_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIRECTORY = os.path.dirname(BENCH_DIRECTORY)
+
+# Issue whose cache entry is updated by all workers (every worker sets its own field).
+SHARED_ISSUE = 'STRESS-1'
+
+
+def import_jiraline(without_locks):
+    sys.path.insert(0, REPOSITORY_DIRECTORY)
+    import jiraline
+    if without_locks:
+        jiraline.fcntl = None
+    return jiraline
+
+
+def worker(index, iterations, without_locks, start):
+    jiraline = import_jiraline(without_locks)
+    start.wait()
+    for i in range(iterations):
+        issue_name = 'STRESS-{}-{}'.format(index, i)
+        cached = jiraline.Cache(SHARED_ISSUE, lazy=True)
+        cached.set('fields', 'worker{}'.format(index), value=i)
+        cached.store()
+        jiraline.append_shortlog_event(issue_name, {'event': 'show', 'parameters': {}})
+        with jiraline.modified_pins() as pins:
+            pins[issue_name] = 'worker {}'.format(index)
+        with jiraline.modified_known_labels() as known_labels:
+            known_labels.add('label-{}-{}'.format(index, i))
+        jiraline.store_last_active_issue_marker(issue_name)
+        jiraline.Outbox().append(issue_name, 'comment', 'post', '/rest/api/2/issue/{}/comment'.format(issue_name), json={'body': str(i)})
+
+
+def check(jiraline, workers, iterations):
+    """Returns list of problems found in files written by workers.
+    """
+    problems = []
+    expected_issues = set('STRESS-{}-{}'.format(index, i) for index in range(workers) for i in range(iterations))
+
+    def lost(what, found, expected):
+        if found != expected:
+            problems.append('{}: {} of {} writes lost'.format(what, len(expected - found), len(expected)))
+
+    fields = jiraline.Cache(SHARED_ISSUE).data()
+    lost('cache', set(k for k, v in fields.items() if k.startswith('fields.worker') and v == iterations - 1),
+         set('fields.worker{}'.format(index) for index in range(workers)))
+
+    with open(jiraline.ensure_shortlog_journal()) as ifstream:
+        lost('shortlog journal', set(json.loads(line)['issue'] for line in ifstream), expected_issues)
+    shortlog = jiraline.read_shortlog()
+    if len(shortlog) != min(len(expected_issues), jiraline.settings.get('shortlog_size', default=80)):
+        problems.append('shortlog: {} events'.format(len(shortlog)))
+
+    lost('pins', set(jiraline.load_pins()), expected_issues)
+    lost('labels', set(jiraline.load_known_labels_list()),
+         set('label-{}-{}'.format(index, i) for index in range(workers) for i in range(iterations)))
+    lost('outbox', set(entry['issue'] for entry in jiraline.Outbox().entries()), expected_issues)
+
+    with open(jiraline.get_last_active_issue_marker_path()) as ifstream:
+        marker = ifstream.read()
+    if marker not in expected_issues:
+        problems.append('last active issue marker: {!r}'.format(marker))
+
+    for directory, _, names in os.walk(os.environ['HOME']):
+        for name in names:
+            if '.tmp-' in name:
+                problems.append('temporary file left: {}'.format(os.path.join(directory, name)))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent writers stress test for Jiraline storage.')
+    parser.add_argument('-w', '--workers', type=int, default=16, help='number of concurrent processes')
+    parser.add_argument('-i', '--iterations', type=int, default=50, help='number of writes of every kind made by each process')
+    parser.add_argument('--without-locks', action='store_true', help='disable file locks')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary home directory')
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix='jiraline-stress-')
+    os.environ['HOME'] = home
+    for each in (('.cache', 'jiraline'), ('.config', 'jiraline'), ('.local', 'share', 'jiraline')):
+        os.makedirs(os.path.join(home, *each))
+
+    try:
+        start = multiprocessing.Event()
+        processes = [multiprocessing.Process(target=worker, args=(index, args.iterations, args.without_locks, start)) for index in range(args.workers)]
+        for each in processes:
+            each.start()
+        started = time.monotonic()
+        start.set()
+        for each in processes:
+            each.join()
+        elapsed = time.monotonic() - started
+        failed = [each.exitcode for each in processes if each.exitcode != 0]
+
+        problems = check(import_jiraline(args.without_locks), args.workers, args.iterations)
+        if failed:
+            problems.append('{} worker(s) failed'.format(len(failed)))
+        print(json.dumps({
+            'workers': args.workers,
+            'iterations': args.iterations,
+            'locks': (not args.without_locks),
+            'seconds': round(elapsed, 3),
+            'problems': problems,
+        }, indent=2))
+        return (1 if problems else 0)
+    finally:
+        if args.keep:
+            print('home: {}'.format(home), file=sys.stderr)
+        else:
+            shutil.rmtree(home)
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -1,13 +1,39 @@
 #!/usr/bin/python
 
+import array
+import asyncio
+import atexit
+import base64
+import bisect
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import csv
 import datetime
+import functools
 import getpass
+import hashlib
+import heapq
+import io
+import itertools
 import json
+import math
+import mmap
+import queue
 import re
+import shlex
+import shutil
+import struct
 import subprocess
 import sys
 import os
 import textwrap
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
 
 import clap
 import requests
@@ -18,62 +44,85 @@ try:
 except ImportError:
     colored = None
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 
 # Jiraline version
 __version__ = '0.1.4'
 
 
-filename_ui = os.path.expanduser('~/.local/share/jiraline/ui.json')
+class Tracer:
+    """Collects named timing spans.
 
-model = {}
-with open(filename_ui, 'r') as ifstream: model = json.loads(ifstream.read())
-args = list(clap.formatter.Formatter(sys.argv[1:]).format())
-command = clap.builder.Builder(model).insertHelpCommand().build().get()
-parser = clap.parser.Parser(command).feed(args)
-checker = clap.checker.RedChecker(parser)
+    Spans are recorded only when the tracer is enabled; otherwise `span()` returns
+    a shared no-op context manager so instrumented code pays (almost) nothing.
+    """
+    def __init__(self):
+        self._enabled = False
+        self._origin = time.perf_counter()
+        self._spans = []
 
-try:
-    fail = True
-    checker.check()
-    fail = False
-except clap.errors.UnrecognizedOptionError as e:
-    print('unrecognized option found: {0}'.format(e))
-except clap.errors.UIDesignError as e:
-    print('misdesigned interface: {0}'.format(e))
-except clap.errors.MissingArgumentError as e:
-    print('missing argument for option: {0}'.format(e))
-    fail = True
-except clap.errors.ConflictingOptionsError as e:
-    print('conflicting options found: {0}'.format(e))
-    fail = True
-except clap.errors.RequiredOptionNotFoundError as e:
-    fail = True
-    print('required option not found: {0}'.format(e))
-except clap.errors.InvalidOperandRangeError as e:
-    print('invalid number of operands: {0}'.format(e))
-    fail = True
-except clap.errors.UIDesignError as e:
-    print('UI has design error: {0}'.format(e))
-    fail = True
-except clap.errors.AmbiguousCommandError as e:
-    name, candidates = str(e).split(': ')
-    print("ambiguous shortened command name: '{0}', candidates are: {1}".format(name, candidates))
-    print("note: if this is a false positive use '--' operand separator")
-    fail = True
-except Exception as e:
-    print('error: unhandled exception: {0}: {1}'.format(str(type(e))[8:-2], e))
-    fail = True
-finally:
-    if fail: exit(1)
-    ui = parser.parse().ui().finalise()
-
-if clap.helper.HelpRunner(ui=ui, program=sys.argv[0]).adjust(options=['-h', '--help']).run().displayed(): exit(0)
-if '--version' in ui:
-    print(('jiraline version {}' if '--verbose' in ui else '{}').format(__version__))
-    exit(0)
-
-
-ui = ui.down()
+    def enable(self):
+        self._enabled = True
+        return self
+
+    def enabled(self):
+        return self._enabled
+
+    def span(self, name, **args):
+        if not self._enabled:
+            return _NULL_SPAN
+        return self._record(name, args)
+
+    @contextlib.contextmanager
+    def _record(self, name, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._spans.append((name, start, (time.perf_counter() - start), threading.get_ident(), args,))
+
+    def summary(self):
+        """Returns list of (name, calls, total, max) tuples sorted by total time.
+        """
+        totals = {}
+        for name, _, duration, _, _ in self._spans:
+            calls, total, longest = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (calls + 1, total + duration, max(longest, duration))
+        return sorted([(name,) + row for name, row in totals.items()], key=lambda each: each[2], reverse=True)
+
+    def chrome_trace(self):
+        """Returns spans in Chrome trace event format (load it in chrome://tracing or Perfetto).
+        """
+        pid = os.getpid()
+        return {
+            'traceEvents': [{
+                'name': name,
+                'ph': 'X',
+                'ts': round((start - self._origin) * 1e6, 3),
+                'dur': round(duration * 1e6, 3),
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            } for name, start, duration, tid, args in self._spans],
+            'displayTimeUnit': 'ms',
+        }
+
+    def report(self, stream=None, trace_path=None):
+        if trace_path:
+            with open(trace_path, 'w') as ofstream:
+                ofstream.write(json.dumps(self.chrome_trace()))
+        if stream is not None:
+            stream.write('{:<24} {:>7} {:>11} {:>11} {:>11}\n'.format('span', 'calls', 'total ms', 'mean ms', 'max ms'))
+            for name, calls, total, longest in self.summary():
+                stream.write('{:<24} {:>7} {:>11.3f} {:>11.3f} {:>11.3f}\n'.format(name, calls, total * 1e3, total / calls * 1e3, longest * 1e3))
+
+_NULL_SPAN = contextlib.nullcontext()
+
+TRACE = Tracer()
 
 def obtain(dictionary, *path, error=False, default=None):
     found = False
@@ -95,10 +144,167 @@ def obtain(dictionary, *path, error=False, default=None):
             found = True
     return (value if found else default)
 
+# Paths of locks held by the current thread (mapped to True for exclusive ones).
+_held_locks = threading.local()
+
+@contextlib.contextmanager
+def file_lock(path, exclusive=True, blocking=True):
+    """Holds an advisory lock of a file for the duration of the block; shared locks are for
+    reading, exclusive ones for read-modify-write cycles.
+    With blocking=False BlockingIOError is raised if the lock is held by another process.
+    The lock is taken on a separate "<path>.lock" file because files are replaced (not
+    rewritten) by write_file_atomically(), and a lock on a replaced file excludes nobody.
+    Locks are reentrant within a thread; an exclusive lock also satisfies shared requests.
+    """
+    held = _held_locks.__dict__.setdefault('paths', {})
+    if exclusive and held.get(path) is False:
+        # the other process holding a shared lock could be waiting for an upgrade too
+        raise RuntimeError('cannot upgrade shared lock of {}'.format(path))
+    if fcntl is None or held.get(path) or (path in held and not exclusive):
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open('{}.lock'.format(path), 'a') as lock_file:
+        with TRACE.span('lock.wait', path=path):
+            fcntl.flock(lock_file.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+        held[path] = exclusive
+        try:
+            yield
+        finally:
+            del held[path]
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def get_temporary_path(path):
+    return '{}.tmp-{}-{}'.format(path, os.getpid(), threading.get_ident())
+
+def write_file_atomically(path, text):
+    """Writes a file by writing a temporary file and renaming it, so readers never see a
+    partially written (or truncated) file.
+    """
+    temporary_path = get_temporary_path(path)
+    try:
+        with open(temporary_path, 'w') as ofstream:
+            ofstream.write(text)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+        raise
+
+class SegmentFile:
+    """File storing JSON values as separately compressed segments.
+
+    Layout: magic, number of segments, index of (key length, offset, length, flags) entries
+    followed by keys, and then segment data.
+    The file is memory-mapped so reading a single value touches only the index and
+    bytes of that value.
+    """
+    MAGIC = b'JLS1'
+    HEADER = struct.Struct('<4sI')
+    ENTRY = struct.Struct('<HIIB')
+    FLAG_COMPRESSED = 1
+    COMPRESSION_THRESHOLD = 128
+    # Segment copied from another file without decoding it (see raw() and write()).
+    Raw = collections.namedtuple('Raw', ('data', 'flags',))
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+        self._map = None
+        self._index = None
+
+    def __enter__(self):
+        self._file = open(self._path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, *exc):
+        self._map.close()
+        self._file.close()
+
+    def index(self):
+        if self._index is not None:
+            return self._index
+        magic, count = SegmentFile.HEADER.unpack_from(self._map, 0)
+        if magic != SegmentFile.MAGIC:
+            raise ValueError('not a segment file: {}'.format(self._path))
+        index = {}
+        position = SegmentFile.HEADER.size
+        for _ in range(count):
+            key_length, offset, length, flags = SegmentFile.ENTRY.unpack_from(self._map, position)
+            position += SegmentFile.ENTRY.size
+            index[self._map[position:position+key_length].decode('utf-8')] = (offset, length, flags)
+            position += key_length
+        self._index = index
+        return index
+
+    def keys(self):
+        return list(self.index().keys())
+
+    def get(self, key, default=None):
+        entry = self.index().get(key)
+        if entry is None:
+            return default
+        offset, length, flags = entry
+        value = self._map[offset:offset+length]
+        if flags & SegmentFile.FLAG_COMPRESSED:
+            value = zlib.decompress(value)
+        return json.loads(value)
+
+    def items(self):
+        return [(key, self.get(key)) for key in self.keys()]
+
+    def raw(self, key):
+        offset, length, flags = self.index()[key]
+        return SegmentFile.Raw(self._map[offset:offset+length], flags)
+
+    @staticmethod
+    def write(path, items):
+        segments = []
+        for key, value in items:
+            if isinstance(value, SegmentFile.Raw):
+                segments.append((key.encode('utf-8'), bytes(value.data), value.flags,))
+                continue
+            value = json.dumps(value).encode('utf-8')
+            flags = 0
+            if len(value) >= SegmentFile.COMPRESSION_THRESHOLD:
+                compressed = zlib.compress(value, 6)
+                if len(compressed) < len(value):
+                    value, flags = compressed, SegmentFile.FLAG_COMPRESSED
+            segments.append((key.encode('utf-8'), value, flags,))
+        header = [SegmentFile.HEADER.pack(SegmentFile.MAGIC, len(segments))]
+        offset = SegmentFile.HEADER.size + sum((SegmentFile.ENTRY.size + len(key)) for key, _, _ in segments)
+        for key, value, flags in segments:
+            header.append(SegmentFile.ENTRY.pack(len(key), offset, len(value), flags))
+            header.append(key)
+            offset += len(value)
+        # write to a temporary file and rename it so readers never see a partially written file
+        # (this also updates modification time of the directory, see CacheProjection.refresh())
+        temporary_path = get_temporary_path(path)
+        try:
+            with open(temporary_path, 'wb') as ofstream:
+                ofstream.write(b''.join(header))
+                for _, value, _ in segments:
+                    ofstream.write(value)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+
 class Cache:
-    def __init__(self, issue_key, lazy=False):
+    """Locally cached issue data.
+    Every issue is stored in its own segment file; each top-level field is a separate
+    segment so that single fields can be read without loading the whole issue.
+    """
+    # Cache directories issues were stored in during this run; cache budget is enforced on exit.
+    _budget_checks_registered = set()
+
+    def __init__(self, issue_key, lazy=False, settings=None):
         self._issue_key = issue_key
+        self._settings = settings
         self._data = {}
+        self._loaded = False
         if not lazy:
             self.load()
 
@@ -109,11 +315,42 @@ class Cache:
         return self._data[k]
 
     @staticmethod
-    def dir():
-        return os.path.join(os.path.expanduser('~'), '.cache', 'jiraline')
+    def dir(settings=None):
+        """Returns the cache directory of the instance selected in settings (default: settings
+        loaded by main()).
+        """
+        # every named instance has its own namespace, as issue keys of instances may overlap
+        base = os.path.join(os.path.expanduser('~'), '.cache', 'jiraline')
+        instance = settings_or_default(settings).instance()
+        return (base if instance is None else os.path.join(base, 'instances', instance))
 
     def path(self):
-        return os.path.join(os.path.expanduser('~'), '.cache', 'jiraline', '{}.json'.format(self._issue_key))
+        return os.path.join(Cache.dir(self._settings), '{}.jlc'.format(self._issue_key))
+
+    def legacy_path(self):
+        """Path of the cache file in the plain JSON format used by earlier versions.
+        """
+        return os.path.join(Cache.dir(self._settings), '{}.json'.format(self._issue_key))
+
+    @staticmethod
+    def entries(settings=None):
+        """Yields (issue key, path, stat result) for every cached issue.
+        Last access time of an entry is its st_atime (it is updated explicitly when issues are read).
+        """
+        if not os.path.isdir(Cache.dir(settings)):
+            return
+        for entry in os.scandir(Cache.dir(settings)):
+            issue_key, extension = os.path.splitext(entry.name)
+            if extension not in ('.jlc', '.json',) or not entry.is_file():
+                continue
+            yield (issue_key, entry.path, entry.stat())
+
+    def _touch(self, path):
+        # record access time explicitly; file systems mounted with noatime would not do it
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
 
     def data(self):
         return self._data
@@ -131,36 +368,254 @@ class Cache:
         }
 
     def is_cached(self):
-        return os.path.isfile(self.path())
+        return os.path.isfile(self.path()) or os.path.isfile(self.legacy_path())
+
+    def _read(self):
+        if os.path.isfile(self.path()):
+            self._touch(self.path())
+            with SegmentFile(self.path()) as segments:
+                return dict(segments.items())
+        if os.path.isfile(self.legacy_path()):
+            self._touch(self.legacy_path())
+            with open(self.legacy_path()) as ifstream:
+                data = json.loads(ifstream.read())
+            # legacy files duplicate the whole "fields" object next to the "fields.*" keys
+            data.pop('fields', None)
+            return data
+        return None
 
     def load(self):
-        cached_path = self.path()
-        if not os.path.isfile(cached_path):
-            return self
-        with open(cached_path) as ifstream:
-            self._data = json.loads(ifstream.read())
+        with TRACE.span('cache.load', issue=self._issue_key):
+            data = self._read()
+        if data is not None:
+            self._data = data
+        self._loaded = True
         return self
 
+    @staticmethod
+    def lock_path(settings=None):
+        """Path locked by writers that merge their data with data already in the cache.
+        """
+        return os.path.join(Cache.dir(settings), 'cache')
+
     def store(self):
-        cached_path = self.path()
-        if not os.path.isdir(Cache.dir()):
-            os.makedirs(Cache.dir(), exist_ok=True)
-        with open(cached_path, 'w') as ofstream:
-            ofstream.write(json.dumps(self._data))
+        if not os.path.isdir(Cache.dir(self._settings)):
+            os.makedirs(Cache.dir(self._settings), exist_ok=True)
+        with TRACE.span('cache.store', issue=self._issue_key), file_lock(Cache.lock_path(self._settings)):
+            if not self._loaded:
+                # do not drop fields that were not loaded
+                self._data = dict((self._read() or {}), **self._data)
+                self._loaded = True
+            SegmentFile.write(self.path(), sorted(self._data.items()))
+            if os.path.isfile(self.legacy_path()):
+                os.unlink(self.legacy_path())
+        if Cache.dir(self._settings) not in Cache._budget_checks_registered:
+            Cache._budget_checks_registered.add(Cache.dir(self._settings))
+            atexit.register(enforce_cache_budget, self._settings)
         return self
 
     def get(self, *path, default=None):
         return self._data.get('.'.join(path), default)
 
+    def peek(self, *path, default=None):
+        """Reads a single field, without loading the whole issue if it was not loaded yet.
+        """
+        key = '.'.join(path)
+        if self._loaded or key in self._data:
+            return self._data.get(key, default)
+        if not os.path.isfile(self.path()):
+            return self.load().get(*path, default=default)
+        self._touch(self.path())
+        with TRACE.span('cache.peek', issue=self._issue_key), SegmentFile(self.path()) as segments:
+            return segments.get(key, default)
+
+    def select(self, keys):
+        """Reads several fields (given as dotted keys) at once, without loading the whole issue.
+        Does not count as an access to the issue for cache eviction (it is used for bulk reads).
+        """
+        if self._loaded or not os.path.isfile(self.path()):
+            data = (self._data if self._loaded else (self._read() or {}))
+            return dict((key, data.get(key)) for key in keys)
+        with TRACE.span('cache.peek', issue=self._issue_key), SegmentFile(self.path()) as segments:
+            return dict((key, segments.get(key)) for key in keys)
+
     def set(self, *path, value):
         self._data['.'.join(path)] = value
         return self
 
+class IssueEntryCache:
+    """Locally cached list of entries (e.g. comments) of an issue.
+
+    Every entry is stored in its own segment (keyed by entry id) so that displaying the last
+    few entries of a long list reads only their segments.
+    The "index" segment lists (id, created, updated) of cached entries ordered by creation, and
+    the number of entries the issue had when they were last fetched.
+    """
+    DIRECTORY = None
+
+    def __init__(self, issue_key):
+        self._issue_key = issue_key
+        self._index = None
+
+    @classmethod
+    def dir(cls, settings=None):
+        return os.path.join(Cache.dir(settings), cls.DIRECTORY)
+
+    @classmethod
+    def entries(cls, settings=None):
+        """Yields (issue key, path, stat result) for every issue with cached entries.
+        """
+        if not os.path.isdir(cls.dir(settings)):
+            return
+        for entry in os.scandir(cls.dir(settings)):
+            issue_key, extension = os.path.splitext(entry.name)
+            if extension == '.jlc' and entry.is_file():
+                yield (issue_key, entry.path, entry.stat())
+
+    def path(self):
+        return os.path.join(self.dir(), '{}.jlc'.format(self._issue_key))
+
+    def is_cached(self):
+        return os.path.isfile(self.path())
+
+    def index(self):
+        if self._index is None:
+            self._index = {'entries': [], 'total': 0}
+            if self.is_cached():
+                with SegmentFile(self.path()) as segments:
+                    self._index = segments.get('index', self._index)
+        return self._index
+
+    def __len__(self):
+        return len(self.index()['entries'])
+
+    def updated(self):
+        """Returns dictionary mapping ids of cached entries to their modification times.
+        """
+        return dict((entry_id, updated) for entry_id, _, updated in self.index()['entries'])
+
+    def read(self, last=None):
+        entries = self.index()['entries']
+        if last is not None:
+            entries = (entries[-last:] if last > 0 else [])
+        if not entries:
+            return []
+        with TRACE.span('cache.{}'.format(self.DIRECTORY), issue=self._issue_key), SegmentFile(self.path()) as segments:
+            return [segments.get('entry.{}'.format(entry_id)) for entry_id, _, _ in entries]
+
+    def merge(self, fetched, total, listed=None, **extra):
+        """Stores fetched entries.
+        If `listed` (ids of all entries of the issue) is given, cached entries not in it
+        are removed as they were deleted.
+        Extra keyword arguments are stored in the index.
+        """
+        with file_lock(Cache.lock_path()):
+            # reread the index, entries could have been stored by another process
+            self._index = None
+            return self._merge(fetched, total, listed, extra)
+
+    def _merge(self, fetched, total, listed, extra):
+        entries = dict((entry[0], entry) for entry in self.index()['entries'])
+        if listed is not None:
+            listed = set(listed)
+            entries = dict((entry_id, entry) for entry_id, entry in entries.items() if entry_id in listed)
+        fresh = dict((entry['id'], entry) for entry in fetched)
+        for entry_id, entry in fresh.items():
+            entries[entry_id] = [entry_id, entry.get('created', ''), entry.get('updated', entry.get('created', ''))]
+        ordered = sorted(entries.values(), key=lambda entry: (entry[1], (int(entry[0]) if entry[0].isdigit() else 0)))
+        index = dict(self.index(), entries=ordered, total=total, **extra)
+        items = [('index', index)]
+        if self.is_cached():
+            # unchanged entries are copied without decoding them
+            with SegmentFile(self.path()) as segments:
+                items.extend(('entry.{}'.format(entry_id), segments.raw('entry.{}'.format(entry_id)))
+                             for entry_id, _, _ in ordered if entry_id not in fresh)
+        items.extend(('entry.{}'.format(entry_id), entry) for entry_id, entry in fresh.items())
+        os.makedirs(self.dir(), exist_ok=True)
+        with TRACE.span('cache.store', issue=self._issue_key):
+            SegmentFile.write(self.path(), items)
+        self._index = index
+        return self
+
+class CommentCache(IssueEntryCache):
+    """Locally cached comments of an issue.
+    """
+    DIRECTORY = 'comments'
+
+class HistoryCache(IssueEntryCache):
+    """Locally cached change history (changelog) of an issue.
+    History entries are never edited, and new ones are only appended, so the number of cached
+    entries is the offset from which new entries are fetched.
+    The index also keeps the "updated" field of the issue at the time of fetching.
+    """
+    DIRECTORY = 'history'
+
+ISSUE_ENTRY_CACHES = (CommentCache, HistoryCache,)
+
+class AdjacencyIndex:
+    """Persistent graph of issues: maps issue keys to lists of related issues.
+    Stored next to the issue cache as a segment file with a segment per node, so reading
+    or updating a few nodes does not decode the others.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._segments = None
+        self._nodes = {}
+
+    def path(self):
+        return os.path.join(Cache.dir(), 'index', '{}.jlc'.format(self._name))
+
+    def __enter__(self):
+        if os.path.isfile(self.path()):
+            self._segments = SegmentFile(self.path()).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self._segments is not None:
+            self._segments.__exit__(*exc)
+            self._segments = None
+
+    def get(self, key, default=None):
+        if key not in self._nodes:
+            self._nodes[key] = (self._segments.get(key) if self._segments is not None else None)
+        value = self._nodes[key]
+        return (default if value is None else value)
+
+    def reload(self):
+        """Forgets nodes read so far and reopens the index (e.g. after it was updated by another process).
+        """
+        self.__exit__(None, None, None)
+        self._nodes = {}
+        return self.__enter__()
+
+    def update(self, changes):
+        """Stores changed nodes (a dictionary; None value removes a node).
+        """
+        if not changes:
+            return self
+        os.makedirs(os.path.dirname(self.path()), exist_ok=True)
+        with TRACE.span('index.store', index=self._name), file_lock(Cache.lock_path()):
+            items = []
+            if os.path.isfile(self.path()):
+                # reread the index, nodes could have been stored by another process
+                with SegmentFile(self.path()) as segments:
+                    items = [(key, segments.raw(key)) for key in segments.keys() if key not in changes]
+            items.extend((key, value) for key, value in changes.items() if value is not None)
+            SegmentFile.write(self.path(), sorted(items, key=lambda each: each[0]))
+        self._nodes.update(changes)
+        return self
+
 class Settings:
-    def __init__(self):
-        self._settings = {}
+    def __init__(self, data=None, instance=None, ask=None):
+        self._settings = (data or {})
         self._username = None
         self._password = None
+        self._instance = instance
+        # settings as loaded, before an instance was selected
+        self._loaded = None
+        # called with "username" or "password" for credentials missing from settings (the command
+        # line asks the user); without it missing credentials raise MissingCredentials
+        self.ask = ask
 
     # Operator overloads suitable for settings objects.
     def __getitem__(self, key):
@@ -179,14 +634,12 @@ class Settings:
         if not os.path.isfile(Settings.get_settings_path()):
             return self
         try:
-            with open(Settings.get_settings_path()) as ifstream:
+            with TRACE.span('settings.load'), open(Settings.get_settings_path()) as ifstream:
                 self._settings = json.loads(ifstream.read())
         except json.decoder.JSONDecodeError as e:
-            print('error: invalid settings format: {}'.format(e))
-            exit(1)
+            raise SettingsError('invalid settings format: {}'.format(e))
         except Exception as e:
-            print('error: failed loading settings: {}'.format(e))
-            exit(1)
+            raise SettingsError('failed loading settings: {}'.format(e))
         return self
 
     # Low-level access API.
@@ -202,16 +655,55 @@ class Settings:
     def get(self, key, default=None):
         return self._settings.get(key, default)
 
+    # Instances API.
+    # Several Jira instances can be configured under the "instances" key, e.g.
+    # {"instances": {"work": {"domain": ...}, "oss": {"server": ..., "credentials": ...}}}; keys of
+    # an instance override top-level keys when it is selected.
+    def instances(self):
+        return sorted((self._loaded if self._loaded is not None else self._settings).get('instances', {}))
+
+    def instance(self):
+        """Returns name of the selected instance, or None if no instance is selected.
+        """
+        return self._instance
+
+    def for_instance(self, name):
+        """Returns settings of an instance; for None the top-level settings (as loaded, before an
+        instance was selected) are returned.
+        """
+        loaded = (self._loaded if self._loaded is not None else self._settings)
+        if name is None:
+            return Settings(dict(loaded), ask=self.ask)
+        instances = loaded.get('instances', {})
+        if name not in instances:
+            raise KeyError(name)
+        data = dict(loaded)
+        data.update(instances[name])
+        return Settings(data, instance=name, ask=self.ask)
+
+    def select_instance(self, name):
+        """Makes settings of an instance the current ones.
+        """
+        selected = self.for_instance(name)
+        if self._loaded is None:
+            self._loaded = self._settings
+        self._settings = selected._settings
+        self._instance = name
+        self._username = None
+        self._password = None
+        return self
+
     # High-level access API.
+    def _ask(self, what):
+        if self.ask is None:
+            raise MissingCredentials(what)
+        return self.ask(what)
+
     def username(self):
         if self._username is not None: return self._username
         username = str(self._settings.get('credentials', {}).get('user', '')).strip()
         if not username:
-            try:
-                username = input('username: ')
-            except (EOFError, KeyboardInterrupt) as e:
-                print()
-                exit(1)
+            username = self._ask('username')
         self._username = username
         return username
 
@@ -219,11 +711,7 @@ class Settings:
         if self._password is not None: return self._password
         password = str(self._settings.get('credentials', {}).get('password', '')).strip()
         if not password:
-            try:
-                password = getpass.getpass('password: ')
-            except (EOFError, KeyboardInterrupt) as e:
-                print()
-                exit(1)
+            password = self._ask('password')
         self._password = password
         return password
 
@@ -232,37 +720,699 @@ class Settings:
         """
         return (self.username(), self.password(),)
 
-settings = Settings().load()
+# Loaded by main(); programs using Jiraline as a library may load it or create their own settings.
+settings = Settings()
+
+def settings_or_default(given):
+    return (settings if given is None else given)
+
+class JSONArrayStream:
+    """Incremental decoder of a JSON object read from a stream of text chunks.
+    Iterating over the stream yields items of the array stored under `key` one at a time, as
+    they are decoded, so memory use does not depend on the length of the array.
+    Other members of the object are collected in `fields` (members following the array are
+    there once the iteration ends); `position` is the number of members preceding the array.
+    """
+    CHUNK_SIZE = 64 * 1024
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+    def __init__(self, chunks, key):
+        self.key = key
+        self.fields = {}
+        self.position = None
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._offset = 0
+        self._eof = False
+
+    @classmethod
+    def from_response(cls, r, key):
+        """Creates a stream decoding body of a response (requested with stream=True); the response
+        is closed once its body is read.
+        """
+        def chunks():
+            decoder = codecs.getincrementaldecoder(r.encoding or 'utf-8')()
+            try:
+                for chunk in r.iter_content(chunk_size=cls.CHUNK_SIZE):
+                    yield decoder.decode(chunk)
+                yield decoder.decode(b'', final=True)
+            finally:
+                r.close()
+        return cls(chunks(), key)
+
+    def _read(self, size=1):
+        """Appends at least `size` characters (if available) to the buffer, dropping the consumed ones.
+        Returns false at the end of the stream.
+        """
+        chunks = [self._buffer[self._offset:]]
+        self._offset, read = 0, 0
+        for chunk in self._chunks:
+            chunks.append(chunk)
+            read += len(chunk)
+            if read >= size:
+                break
+        else:
+            self._eof = True
+        self._buffer = ''.join(chunks)
+        return (read > 0)
+
+    def _peek(self):
+        while True:
+            self._offset = JSONArrayStream.WHITESPACE.match(self._buffer, self._offset).end()
+            if self._offset < len(self._buffer):
+                return self._buffer[self._offset]
+            if not self._read():
+                return ''
+
+    def _expect(self, characters):
+        character = self._peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError('Expecting one of {!r}'.format(characters), self._buffer, self._offset)
+        self._offset += 1
+        return character
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._offset)
+                # a value decoded up to the end of the buffer, or followed only by characters that
+                # continue a number (e.g. "10." or "1e"), may continue in the next chunk
+                if not JSONArrayStream.NUMBER_TAIL.fullmatch(self._buffer, end) or self._eof:
+                    self._offset = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # read at least as much as is buffered, so a long value is decoded only a few times
+            self._read(max(JSONArrayStream.CHUNK_SIZE, len(self._buffer) - self._offset))
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._offset += 1
+        else:
+            yield from self._members()
+        if self._peek():
+            raise json.JSONDecodeError('Extra data', self._buffer, self._offset)
+
+    def _members(self):
+        while True:
+            if self._peek() != '"':
+                raise json.JSONDecodeError('Expecting property name enclosed in double quotes', self._buffer, self._offset)
+            key = self._value()
+            self._expect(':')
+            if key == self.key and self._peek() == '[':
+                self.position = len(self.fields)
+                self._expect('[')
+                if self._peek() == ']':
+                    self._offset += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self.fields[key] = self._value()
+            if self._expect(',}') == '}':
+                break
+
+def print_json_stream(stream, indent=2):
+    """Prints JSON object decoded by a JSONArrayStream as json.dumps(..., indent=indent) would, but
+    an item of the array at a time.
+    """
+    pad = ' ' * indent
+    printed = {'members': 0, 'fields': 0}
+    def member(key, text):
+        sys.stdout.write('{}{}{}: {}'.format((',\n' if printed['members'] else '{\n'), pad, json.dumps(key), text.replace('\n', '\n' + pad)))
+        printed['members'] += 1
+    def print_fields(count=None):
+        keys = list(stream.fields)[printed['fields']:count]
+        for key in keys:
+            member(key, json.dumps(stream.fields[key], indent=indent))
+        printed['fields'] += len(keys)
+
+    items = 0
+    for item in stream:
+        if not items:
+            print_fields()
+            member(stream.key, '[')
+        sys.stdout.write((',\n' if items else '\n') + pad * 2 + json.dumps(item, indent=indent).replace('\n', '\n' + pad * 2))
+        items += 1
+    if items:
+        sys.stdout.write('\n' + pad + ']')
+    elif stream.position is not None:
+        print_fields(stream.position)
+        member(stream.key, '[]')
+    print_fields()
+    sys.stdout.write('\n}\n' if printed['members'] else '{}\n')
+
+class Cassette:
+    """Recorded HTTP responses (see --record and --replay options).
+    Responses are kept in a segment file (requests.jlc in the given directory) keyed by request
+    method, URL (including the server, so instances do not share responses), normalized parameters, and digest of the request body; credentials are not
+    stored. Bodies of streamed responses (e.g. searches and attachments) are kept in side files
+    (in bodies/) referenced from the segment file. All responses to a request made several times are kept and replayed in order (the
+    last one is repeated).
+    """
+    # Longer keys are shortened to a prefix and a digest of the whole key.
+    MAX_KEY_LENGTH = 2048
+
+    def __init__(self, directory, replay=False):
+        self._path = os.path.join(directory, 'requests.jlc')
+        self._replay = replay
+        self._recorded = {}
+        self._replayed = collections.Counter()
+        self._segments = None
+        self._lock = threading.Lock()
+
+    def replaying(self):
+        return self._replay
+
+    @staticmethod
+    def key(method, url, kwargs):
+        """Returns key of a request (made with requests keyword arguments `kwargs`).
+        """
+        query = []
+        for name, value in sorted((kwargs.get('params') or {}).items()):
+            for each in (value if isinstance(value, (list, tuple)) else [value]):
+                query.append((name, str(each)))
+        key = '{} {}'.format(method.upper(), url)
+        if query:
+            key += '?' + urllib.parse.urlencode(query)
+        body = (json.dumps(kwargs['json'], sort_keys=True) if kwargs.get('json') is not None else kwargs.get('data'))
+        if body:
+            key += ' ' + hashlib.sha1(body if isinstance(body, bytes) else str(body).encode('utf-8')).hexdigest()
+        if len(key) > Cassette.MAX_KEY_LENGTH:
+            key = '{}...{}'.format(key[:Cassette.MAX_KEY_LENGTH // 2], hashlib.sha1(key.encode('utf-8')).hexdigest())
+        return key
+
+    def record(self, method, url, kwargs, r):
+        entry = {'status': r.status_code, 'content_type': r.headers.get('Content-Type')}
+        if kwargs.get('stream'):
+            self._record_stream(Cassette.key(method, url, kwargs), entry, r)
+            return
+        try:
+            entry['body'] = r.content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_base64'] = base64.b64encode(r.content).decode('ascii')
+        self._add(Cassette.key(method, url, kwargs), entry)
+
+    def _add(self, key, entry):
+        with self._lock:
+            self._recorded.setdefault(key, []).append(entry)
+
+    def _record_stream(self, key, entry, r):
+        """Writes body of a streamed response to a side file (in bodies/) chunk by chunk, as the
+        caller reads it, so it is never held in memory. The response is recorded once its body has
+        been read to the end; a partially read body is dropped.
+        """
+        name = 'bodies/{}'.format(uuid.uuid4().hex)
+        path = os.path.join(os.path.dirname(self._path), name)
+        iter_content = r.iter_content
+        def chunks(chunk_size):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            complete = False
+            try:
+                with open(path, 'wb') as ofstream:
+                    for chunk in iter_content(chunk_size):
+                        ofstream.write(chunk)
+                        yield chunk
+                complete = True
+            finally:
+                if complete:
+                    self._add(key, dict(entry, body_file=name))
+                else:
+                    os.unlink(path)
+        def recording_iter_content(chunk_size=1, decode_unicode=False):
+            if decode_unicode:
+                return requests.utils.stream_decode_response_unicode(chunks(chunk_size), r)
+            return chunks(chunk_size)
+        r.iter_content = recording_iter_content
+
+    def store(self):
+        """Stores recorded responses, keeping other requests recorded in the directory before.
+        """
+        if not self._recorded:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with file_lock(self._path):
+            items, replaced = [], []
+            if os.path.isfile(self._path):
+                with SegmentFile(self._path) as segments:
+                    for key in segments.keys():
+                        if key in self._recorded:
+                            replaced.extend(segments.get(key))
+                        else:
+                            items.append((key, segments.raw(key)))
+            items.extend(self._recorded.items())
+            SegmentFile.write(self._path, sorted(items, key=lambda each: each[0]))
+            # bodies of responses recorded again are not referenced anymore
+            for entry in replaced:
+                if entry.get('body_file'):
+                    try:
+                        os.unlink(os.path.join(os.path.dirname(self._path), entry['body_file']))
+                    except FileNotFoundError:
+                        pass
+
+    def replay(self, method, url, kwargs):
+        """Returns recorded response to a request.
+        Raises requests.exceptions.ConnectionError if the request was not recorded, so commands
+        behave as they would without network.
+        """
+        key = Cassette.key(method, url, kwargs)
+        with self._lock:
+            if self._segments is None:
+                self._segments = SegmentFile(self._path).__enter__()
+            entries = self._segments.get(key)
+            if not entries:
+                raise requests.exceptions.ConnectionError('request was not recorded: {}'.format(key))
+            entry = entries[min(self._replayed[key], len(entries) - 1)]
+            self._replayed[key] += 1
+        r = requests.models.Response()
+        r.status_code = entry['status']
+        if entry.get('content_type'):
+            r.headers['Content-Type'] = entry['content_type']
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        if 'body_file' in entry:
+            # streamed responses are read from their side file as they were during recording
+            try:
+                r.raw = open(os.path.join(os.path.dirname(self._path), entry['body_file']), 'rb')
+            except FileNotFoundError:
+                raise requests.exceptions.ConnectionError('body of recorded response is missing: {}'.format(entry['body_file']))
+        else:
+            r._content = (entry['body'].encode('utf-8') if 'body' in entry else base64.b64decode(entry['body_base64']))
+            r._content_consumed = True
+        r.url = url
+        return r
+
+# Set by main() when --record or --replay option is used.
+CASSETTE = None
 
 class Connection:
     """Class representing connection to Jira cloud instance.
     Used to simplify queries.
+    Requests are sent through a single session so that connections to the server are reused.
     """
-    def __init__(self, settings):
+    def __init__(self, settings, pool_size=32):
         self._settings = settings
+        self._session = None
+        self._pool_size = pool_size
 
     # Private helper methods.
     def _server(self):
+        # The "server" key overrides the Jira cloud domain, e.g. for self-hosted instances
+        # or a local stand-in server used for benchmarks.
+        server = self._settings.get('server')
+        if server:
+            return server.rstrip('/')
         return 'https://{}.atlassian.net'.format(self._settings.get('domain'))
 
     def _auth(self):
         return self._settings.credentials()
 
+    def _session_for_requests(self):
+        if self._session is None:
+            self._session = requests.Session()
+            # enough pooled connections for concurrent requests (see commandPush and AsyncJiraClient)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self._pool_size)
+            self._session.mount('https://', adapter)
+            self._session.mount('http://', adapter)
+        return self._session
+
     # Public helper methods.
     def url(self, url):
+        # absolute URLs are given by the server itself (e.g. "content" of attachments)
+        if url.startswith(('http://', 'https://')):
+            return url
         return '{server}{url}'.format(server=self._server(), url=url)
 
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
     # Public request methods.
+    def request(self, method, url, **kwargs):
+        with TRACE.span('http.{}'.format(method), url=url):
+            # responses are recorded with the server they came from, so instances do not share them
+            if CASSETTE is not None and CASSETTE.replaying():
+                return CASSETTE.replay(method, self.url(url), kwargs)
+            r = self._session_for_requests().request(method.upper(), self.url(url), auth=self._auth(), **kwargs)
+            if CASSETTE is not None:
+                CASSETTE.record(method, self.url(url), kwargs, r)
+            return r
+
     def get(self, url, **kwargs):
-        return requests.get(self.url(url), auth=self._auth(), **kwargs)
+        return self.request('get', url, **kwargs)
 
     def put(self, url, **kwargs):
-        return requests.put(self.url(url), auth=self._auth(), **kwargs)
+        return self.request('put', url, **kwargs)
 
     def post(self, url, **kwargs):
-        return requests.post(self.url(url), auth=self._auth(), **kwargs)
+        return self.request('post', url, **kwargs)
+
+class JiraClient(Connection):
+    """Jira REST API client for programs using Jiraline as a library.
 
-connection = Connection(settings)
+    Methods of the client never print, prompt, nor exit: failed requests raise
+    JIRALineException subclasses instead.
+    Credentials should be present in settings, e.g.:
+
+        client = JiraClient(Settings({
+            'server': 'https://jira.example.com',
+            'credentials': {'user': 'jdoe', 'password': 'secret'},
+        }))
+        issue = client.issue('JL-42', fields=['summary', 'status'])
+    """
+    def _auth(self):
+        credentials = self._settings.get('credentials', {})
+        if 'user' not in credentials or 'password' not in credentials:
+            return self._settings.credentials()
+        return (credentials['user'], credentials['password'],)
+
+    def _json(self, r):
+        with TRACE.span('json.decode'):
+            # decoding bytes skips making a copy of the body as text
+            return json.loads(r.content)
+
+    def _check(self, r, issue_key):
+        if r.status_code == 404:
+            raise IssueNotFoundException(issue_key, 'the requested issue is not found or the user does not have permission to view it.')
+        if r.status_code not in (200, 201, 204,):
+            raise IssueException(issue_key, r.status_code, r.text)
+        return r
+
+    def issue(self, issue_key, fields=None):
+        """Returns issue as returned by Jira (a dictionary with "key" and "fields" keys, among others).
+        """
+        params = ({'fields': ','.join(fields)} if fields else {})
+        return self._json(self._check(self.get('/rest/api/2/issue/{}'.format(issue_key), params=params), issue_key))
+
+    def search_page(self, jql, fields, start_at, page_size):
+        """Returns single page of search results (with "issues" and "total" keys).
+        Raises SearchException(status code, text) when the request fails.
+        """
+        r = self.get('/rest/api/2/search', params={
+            'jql': jql,
+            'startAt': start_at,
+            'maxResults': page_size,
+            'fields': fields,
+            'fieldsByKeys': False,
+        })
+        if r.status_code != 200:
+            raise SearchException(r.status_code, r.text)
+        return self._json(r)
+
+    def search_page_stream(self, jql, fields, start_at, page_size):
+        """Like search_page() but returns a JSONArrayStream yielding issues of the page as they are
+        received and decoded ("total" and other members of the response are in its `fields`).
+        """
+        r = self.get('/rest/api/2/search', params={
+            'jql': jql,
+            'startAt': start_at,
+            'maxResults': page_size,
+            'fields': fields,
+            'fieldsByKeys': False,
+        }, stream=True)
+        if r.status_code != 200:
+            raise SearchException(r.status_code, r.text)
+        return JSONArrayStream.from_response(r, 'issues')
+
+    def search(self, jql, fields, page_size=100):
+        """Yields issues matching JQL query, fetching them page by page.
+        Issues are decoded one at a time, so memory use does not depend on page size.
+        Raises SearchException(status code, text) when a request fails.
+        """
+        start_at = 0
+        while True:
+            page = self.search_page_stream(jql, fields, start_at, page_size)
+            issues = 0
+            for issue in page:
+                issues += 1
+                yield issue
+            start_at += issues
+            if (not issues) or start_at >= page.fields.get('total', 0):
+                break
+
+    def comments_page(self, issue_key, start_at=0, page_size=50, newest_first=False):
+        """Returns single page of comments of an issue (with "comments" and "total" keys).
+        """
+        r = self.get('/rest/api/2/issue/{}/comment'.format(issue_key), params={
+            'startAt': start_at,
+            'maxResults': page_size,
+            'orderBy': ('-created' if newest_first else 'created'),
+        })
+        return self._json(self._check(r, issue_key))
+
+    def changelog_page(self, issue_key, start_at=0, page_size=100):
+        """Returns single page of change history of an issue (with "values", "total", and "isLast"
+        keys), oldest entries first.
+        """
+        r = self.get('/rest/api/2/issue/{}/changelog'.format(issue_key), params={
+            'startAt': start_at,
+            'maxResults': page_size,
+        })
+        return self._json(self._check(r, issue_key))
+
+    def attachment_chunks(self, url, chunk_size=64 * 1024):
+        """Yields content of an attachment (requested from its "content" URL) in chunks, so that
+        the whole file is never held in memory.
+        Raises AttachmentException(status code, text) when the request fails.
+        """
+        r = self.get(url, stream=True)
+        try:
+            if r.status_code != 200:
+                raise AttachmentException(r.status_code, r.text)
+            yield from r.iter_content(chunk_size)
+        finally:
+            r.close()
+
+    def labels_page(self, start_at=0, page_size=1000):
+        """Returns single page of labels known to the server (with "values", "total", and "isLast" keys).
+        Raises LabelsException(status code, text) when the request fails.
+        """
+        r = self.get('/rest/api/2/label', params={
+            'startAt': start_at,
+            'maxResults': page_size,
+        })
+        if r.status_code != 200:
+            raise LabelsException(r.status_code, r.text)
+        return self._json(r)
+
+    def transitions(self, issue_key):
+        r = self._check(self.get('/rest/api/2/issue/{}/transitions'.format(issue_key)), issue_key)
+        return self._json(r).get('transitions', [])
+
+    def transition(self, issue_key, transition_id):
+        self._check(self.post('/rest/api/2/issue/{}/transitions'.format(issue_key), json={'transition': {'id': str(transition_id)}}), issue_key)
+
+    def comment(self, issue_key, body):
+        return self._json(self._check(self.post('/rest/api/2/issue/{}/comment'.format(issue_key), json={'body': body}), issue_key))
+
+    def update(self, issue_key, fields=None, update=None):
+        """Edits issue; `fields` sets values of fields, `update` is a list of operations for every
+        field (e.g. {"labels": [{"add": "foo"}]}).
+        """
+        payload = {}
+        if fields:
+            payload['fields'] = fields
+        if update:
+            payload['update'] = update
+        self._check(self.put('/rest/api/2/issue/{}'.format(issue_key), json=payload), issue_key)
+
+class AsyncJiraClient:
+    """asyncio interface of JiraClient for fanning out many requests at once.
+
+    Requests are sent by a JiraClient from a pool of worker threads (the requests library
+    has no asyncio interface), and a semaphore bounds the number of requests in flight.
+    Cancelling a task cancels its request if it was not sent yet; results of requests that
+    were already sent are discarded.
+
+        async with AsyncJiraClient(settings, limit=64) as client:
+            issues = await asyncio.gather(*(client.issue(key) for key in keys))
+    """
+    def __init__(self, settings, limit=64):
+        self.limit = limit
+        self._client = JiraClient(settings, pool_size=limit)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=limit, thread_name_prefix='jiraline')
+        self._semaphore = None
+        # ask for missing credentials now, not from worker threads
+        if CASSETTE is None or not CASSETTE.replaying():
+            self._client._auth()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._client.close()
+
+    async def _call(self, function, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    # Public request methods.
+    async def get(self, url, **kwargs):
+        return await self._call(self._client.get, url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self._call(self._client.put, url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self._call(self._client.post, url, **kwargs)
+
+    # API methods (see JiraClient).
+    async def issue(self, issue_key, fields=None):
+        return await self._call(self._client.issue, issue_key, fields=fields)
+
+    async def comments_page(self, issue_key, start_at=0, page_size=50, newest_first=False):
+        return await self._call(self._client.comments_page, issue_key, start_at=start_at, page_size=page_size, newest_first=newest_first)
+
+    async def changelog_page(self, issue_key, start_at=0, page_size=100):
+        return await self._call(self._client.changelog_page, issue_key, start_at=start_at, page_size=page_size)
+
+    async def labels_page(self, start_at=0, page_size=1000):
+        return await self._call(self._client.labels_page, start_at=start_at, page_size=page_size)
+
+    async def transitions(self, issue_key):
+        return await self._call(self._client.transitions, issue_key)
+
+    async def transition(self, issue_key, transition_id):
+        return await self._call(self._client.transition, issue_key, transition_id)
+
+    async def comment(self, issue_key, body):
+        return await self._call(self._client.comment, issue_key, body)
+
+    async def update(self, issue_key, fields=None, update=None):
+        return await self._call(self._client.update, issue_key, fields=fields, update=update)
+
+    async def search(self, jql, fields, page_size=100, prefetch=None):
+        """Yields issues matching JQL query.
+        After the first page the following pages are requested concurrently, but at most
+        `prefetch` pages (default: the concurrency limit) ahead of the consumer so that
+        memory use stays bounded.
+        """
+        response = await self._call(self._client.search_page, jql, fields, 0, page_size)
+        issues = response.get('issues', [])
+        for issue in issues:
+            yield issue
+        if not issues:
+            return
+        # the server may return fewer issues per page than requested
+        starts = iter(range(len(issues), response.get('total', 0), len(issues)))
+        page = lambda start_at: asyncio.ensure_future(self._call(self._client.search_page, jql, fields, start_at, len(issues)))
+        pending = collections.deque(page(start_at) for start_at in itertools.islice(starts, (prefetch or self.limit)))
+        try:
+            while pending:
+                response = await pending.popleft()
+                pending.extend(page(start_at) for start_at in itertools.islice(starts, 1))
+                for issue in response.get('issues', []):
+                    yield issue
+        finally:
+            for task in pending:
+                task.cancel()
+
+connection = JiraClient(settings)
+
+class Outbox:
+    """Durable, append-only queue of writes waiting to be sent to Jira.
+
+    Every entry is a JSON object on its own line describing a single request
+    (issue, action, HTTP method, URL, and request parameters), and the instance it was made for;
+    the outbox is shared by all instances and every entry is sent to its own.
+    """
+    def __init__(self, settings=None):
+        self._settings = settings_or_default(settings)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def path():
+        return os.path.expanduser(os.path.join('~', '.local', 'share', 'jiraline', 'outbox.jsonl'))
+
+    @staticmethod
+    def rejected_path():
+        return os.path.expanduser(os.path.join('~', '.local', 'share', 'jiraline', 'outbox.rejected.jsonl'))
+
+    def entries(self):
+        entries = []
+        if os.path.isfile(Outbox.path()):
+            with file_lock(Outbox.path(), exclusive=False), open(Outbox.path()) as ifstream:
+                entries = [json.loads(line) for line in ifstream if line.strip()]
+        return entries
+
+    def append(self, issue_name, action, method, url, **kwargs):
+        entry = {
+            'id': uuid.uuid4().hex,
+            'issue': issue_name,
+            'instance': self._settings.instance(),
+            'action': action,
+            'method': method,
+            'url': url,
+            'request': kwargs,
+            'timestamp': timestamp(),
+        }
+        os.makedirs(os.path.dirname(Outbox.path()), exist_ok=True)
+        with file_lock(Outbox.path()), open(Outbox.path(), 'a') as ofstream:
+            ofstream.write(json.dumps(entry) + '\n')
+            ofstream.flush()
+            os.fsync(ofstream.fileno())
+        return entry
+
+    def remove(self, ids):
+        """Removes entries with given IDs from the outbox.
+        The outbox is reread so entries appended in the meantime are kept.
+        """
+        ids = set(ids)
+        with file_lock(Outbox.path()):
+            remaining = [each for each in self.entries() if each['id'] not in ids]
+            write_file_atomically(Outbox.path(), ''.join((json.dumps(each) + '\n') for each in remaining))
+        return remaining
+
+    def reject(self, entry, status_code, text):
+        entry = dict(entry, rejected={
+            'status': status_code,
+            'text': text,
+            'timestamp': timestamp(),
+        })
+        with file_lock(Outbox.rejected_path()), open(Outbox.rejected_path(), 'a') as ofstream:
+            ofstream.write(json.dumps(entry) + '\n')
+
+    def client(self, instance):
+        """Returns client sending entries made for an instance (None for entries made without an
+        instance selected, or queued before instances were recorded).
+        Raises KeyError if the instance is not configured.
+        """
+        with self._lock:
+            if instance not in self._clients:
+                self._clients[instance] = JiraClient(self._settings.for_instance(instance))
+            return self._clients[instance]
+
+    def replay(self, entry, retries=3, backoff=0.5):
+        """Sends a single entry to its instance, retrying on network errors and server-side failures.
+        Returns the final response, or None if the server could not be reached.
+        """
+        client = self.client(entry.get('instance'))
+        r = None
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(backoff * (2 ** (attempt - 1)))
+            try:
+                r = getattr(client, entry['method'])(entry['url'], **entry['request'])
+            except requests.exceptions.RequestException:
+                r = None
+                continue
+            if r.status_code < 500 and r.status_code != 429:
+                break
+        return r
 
 
 class JIRALineException(Exception):
@@ -274,6 +1424,21 @@ class IssueException(JIRALineException):
 class IssueNotFoundException(IssueException):
     pass
 
+class SettingsError(JIRALineException):
+    pass
+
+class MissingCredentials(JIRALineException):
+    pass
+
+class SearchException(JIRALineException):
+    pass
+
+class LabelsException(JIRALineException):
+    pass
+
+class AttachmentException(JIRALineException):
+    pass
+
 
 COLOR_LABEL = 'white'
 COLOR_ISSUE_KEY = 'yellow'
@@ -281,23 +1446,27 @@ COLOR_ASSIGNEE = 'light_blue'
 COLOR_PRIORITY = 'green'
 COLOR_STATUS = 'light_green'
 COLOR_SHOW_SECTION = 'white'
+COLOR_INSTANCE = 'light_magenta'
 
 COLOR_NOTE = 'light_cyan'
 COLOR_ERROR = 'red'
 COLOR_WARNING = 'red_1'
 
-FORCE_COLOURS = False
+# When set, writes are appended to the local outbox instead of being sent to Jira.
+# Queued writes are sent by the "push" command.
+QUEUE_WRITES = False
 
 
 ################################################################################
 # Helper functions.
 #
 def get_last_active_issue_marker_path():
-    return os.path.expanduser(os.path.join('~', '.cache', 'jiraline', 'last_active_issue_marker'))
+    return os.path.join(Cache.dir(), 'last_active_issue_marker')
 
 def store_last_active_issue_marker(issue_name):
-    with open(get_last_active_issue_marker_path(), 'w') as ofstream:
-        ofstream.write(issue_name)
+    # the cache directory of an instance is created by the first command run on it
+    os.makedirs(os.path.dirname(get_last_active_issue_marker_path()), exist_ok=True)
+    write_file_atomically(get_last_active_issue_marker_path(), issue_name)
 
 def load_last_active_issue_marker():
     pth = get_last_active_issue_marker_path()
@@ -314,13 +1483,372 @@ def load_known_labels_list():
     labels = []
     pth = get_known_labels_path()
     if os.path.isfile(pth):
-        with open(pth) as ifstream:
+        with file_lock(pth, exclusive=False), open(pth) as ifstream:
             labels = json.loads(ifstream.read())
     return labels
 
 def store_known_labels_list(labels):
-    with open(get_known_labels_path(), 'w') as ofstream:
-        ofstream.write(json.dumps(labels))
+    with file_lock(get_known_labels_path()):
+        write_file_atomically(get_known_labels_path(), json.dumps(labels))
+
+@contextlib.contextmanager
+def modified_known_labels():
+    """Yields set of known labels to be modified, and stores it afterwards; other processes
+    cannot modify the list in the meantime.
+    """
+    with file_lock(get_known_labels_path()):
+        known_labels = set(load_known_labels_list())
+        yield known_labels
+        store_known_labels_list(sorted(known_labels))
+
+# Labels synced from the server are refreshed (when an unknown label is used) after a day by
+# default; see "labels.max_age" setting.
+LABELS_MAX_AGE = 24 * 3600
+
+def get_label_registry_path():
+    # kept in a subdirectory, files in the cache directory itself are taken for cached issues
+    return os.path.join(Cache.dir(), 'labels', 'registry.json')
+
+class LabelRegistry:
+    """Labels known locally (created with "issue label new") and on the server (stored by
+    "issue label sync").
+    Membership (label validation) is checked in a set; sorted lists are kept for prefix
+    completion, which uses binary search.
+    """
+    def __init__(self):
+        self._local = sorted(load_known_labels_list())
+        self._server = []
+        self._synced = None
+        pth = get_label_registry_path()
+        if os.path.isfile(pth):
+            with file_lock(pth, exclusive=False), open(pth) as ifstream:
+                registry = json.loads(ifstream.read())
+            self._server = registry.get('labels', [])
+            self._synced = registry.get('synced')
+        self._known = set(self._local).union(self._server)
+
+    @staticmethod
+    def _find(labels, prefix):
+        return bisect.bisect_left(labels, prefix)
+
+    def __contains__(self, label):
+        return (label in self._known)
+
+    def __len__(self):
+        return len(self._server) + len(self._local)
+
+    def complete(self, prefix=''):
+        """Yields known labels starting with prefix, sorted.
+        """
+        def starting_with(labels):
+            for i in range(self._find(labels, prefix), len(labels)):
+                if not labels[i].startswith(prefix):
+                    break
+                yield labels[i]
+        previous = None
+        for label in heapq.merge(starting_with(self._local), starting_with(self._server)):
+            if label != previous:
+                yield label
+            previous = label
+
+    def synced(self):
+        """Returns time of the last sync with the server, or None if labels were never synced.
+        """
+        return self._synced
+
+    def is_stale(self):
+        max_age = settings.get('labels', {}).get('max_age', LABELS_MAX_AGE)
+        return (self._synced is not None and time.time() - self._synced > max_age)
+
+async def fetch_server_labels(jobs):
+    """Returns all labels known to the server.
+    Once the first page tells the number of labels the remaining pages are requested concurrently.
+    """
+    async with AsyncJiraClient(settings, limit=jobs) as client:
+        page = await client.labels_page(0)
+        labels = list(page.get('values', []))
+        page_size = len(labels)
+        if page.get('isLast', True) or not page_size:
+            return labels
+        if 'total' in page:
+            pages = await asyncio.gather(*(client.labels_page(start_at, page_size) for start_at in range(page_size, page['total'], page_size)))
+            for each in pages:
+                labels.extend(each.get('values', []))
+            return labels
+        while not page.get('isLast', True) and page.get('values'):
+            page = await client.labels_page(len(labels), page_size)
+            labels.extend(page.get('values', []))
+        return labels
+
+def sync_label_registry(jobs=8):
+    """Stores labels known to the server in the label registry and returns their number.
+    """
+    labels = sorted(set(asyncio.run(fetch_server_labels(jobs))))
+    pth = get_label_registry_path()
+    os.makedirs(os.path.dirname(pth), exist_ok=True)
+    with file_lock(pth):
+        write_file_atomically(pth, json.dumps({'synced': time.time(), 'labels': labels}))
+    return len(labels)
+
+class AttachmentStore:
+    """Content-addressed store of downloaded attachments.
+    Content is stored once per SHA-256 hash (objects/<first two digits>/<hash>), so the same file
+    attached to many issues takes space once. The index maps attachment ids to hash and size of
+    their content, so attachments that were downloaded before are not downloaded again.
+    The index also records the issue of every attachment: stored content counts towards the cache
+    budget, and is removed when no issue that is kept in the cache refers to it.
+    """
+    def __init__(self, settings=None):
+        self._settings = settings
+        self._index = {}
+        if os.path.isfile(self.index_path(settings)):
+            with file_lock(self.index_path(settings), exclusive=False):
+                self._index = self._load_index()
+        self._added = {}
+
+    @staticmethod
+    def dir(settings=None):
+        return os.path.join(Cache.dir(settings), 'attachments')
+
+    @classmethod
+    def index_path(cls, settings=None):
+        return os.path.join(cls.dir(settings), 'index.json')
+
+    def object_path(self, digest):
+        return os.path.join(self.dir(self._settings), 'objects', digest[:2], digest)
+
+    def _load_index(self):
+        if not os.path.isfile(self.index_path(self._settings)):
+            return {}
+        with open(self.index_path(self._settings)) as ifstream:
+            return json.loads(ifstream.read())
+
+    def issues(self):
+        """Returns dictionary mapping issue keys to lists of (SHA-256 hash, size) tuples of their
+        stored attachments; attachments stored before issues were recorded are under None.
+        """
+        issues = collections.defaultdict(list)
+        for entry in self._index.values():
+            issues[entry.get('issue')].append((entry['sha256'], entry['size'],))
+        return issues
+
+    def remove(self, issue_keys):
+        """Removes attachments of given issues from the index, and their content unless attachments
+        of other issues have the same content.
+        Returns number of bytes removed.
+        """
+        issue_keys = set(issue_keys)
+        removed_bytes = 0
+        if not os.path.isfile(self.index_path(self._settings)):
+            return removed_bytes
+        with file_lock(self.index_path(self._settings)):
+            # reread the index, attachments could have been stored by another process
+            index = self._load_index()
+            kept = dict((attachment_id, entry) for attachment_id, entry in index.items() if entry.get('issue') not in issue_keys)
+            referenced = set(entry['sha256'] for entry in kept.values())
+            for entry in index.values():
+                if entry['sha256'] in referenced:
+                    continue
+                referenced.add(entry['sha256'])
+                try:
+                    os.unlink(self.object_path(entry['sha256']))
+                    removed_bytes += entry['size']
+                except FileNotFoundError:
+                    pass
+            if len(kept) != len(index):
+                write_file_atomically(self.index_path(self._settings), json.dumps(kept))
+        self._index = kept
+        return removed_bytes
+
+    def lookup(self, attachment):
+        """Returns path of stored content of an attachment, or None if it was not downloaded
+        (or the stored content does not have the size the server reports).
+        """
+        entry = self._index.get(str(attachment['id']))
+        if entry is None or entry['size'] != attachment.get('size'):
+            return None
+        path = self.object_path(entry['sha256'])
+        try:
+            return (path if os.stat(path).st_size == entry['size'] else None)
+        except FileNotFoundError:
+            return None
+
+    def download(self, client, issue_name, attachment):
+        """Streams content of an attachment of an issue into the store and returns its path.
+        Safe to call from many threads at once; call save() afterwards to update the index.
+        """
+        os.makedirs(os.path.join(self.dir(self._settings), 'objects'), exist_ok=True)
+        temporary_path = get_temporary_path(os.path.join(self.dir(self._settings), 'objects', str(attachment['id'])))
+        digest, size = hashlib.sha256(), 0
+        try:
+            with open(temporary_path, 'wb') as ofstream:
+                for chunk in client.attachment_chunks(attachment['content']):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    ofstream.write(chunk)
+            if attachment.get('size') is not None and size != attachment['size']:
+                raise AttachmentException(None, 'got {} bytes, expected {}'.format(size, attachment['size']))
+            path = self.object_path(digest.hexdigest())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # content already stored for another attachment is not stored again
+            if os.path.isfile(path) and os.stat(path).st_size == size:
+                os.unlink(temporary_path)
+            else:
+                os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+        self._added[str(attachment['id'])] = {'sha256': digest.hexdigest(), 'size': size, 'issue': issue_name}
+        return path
+
+    def save(self):
+        if not self._added:
+            return
+        os.makedirs(self.dir(self._settings), exist_ok=True)
+        with file_lock(self.index_path(self._settings)):
+            index = self._load_index()
+            index.update(self._added)
+            write_file_atomically(self.index_path(self._settings), json.dumps(index))
+        self._index.update(self._added)
+        self._added = {}
+
+def file_sha256(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as ifstream:
+        for chunk in iter(lambda: ifstream.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def copy_if_changed(source, destination):
+    """Copies a stored attachment unless the destination already has the same content.
+    Returns True if the file was copied.
+    """
+    # stored attachments are named after hashes of their content
+    if os.path.isfile(destination) and os.stat(destination).st_size == os.stat(source).st_size and file_sha256(destination) == os.path.basename(source):
+        return False
+    temporary_path = get_temporary_path(destination)
+    try:
+        shutil.copyfile(source, temporary_path)
+        os.replace(temporary_path, destination)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+        raise
+    return True
+
+def get_pins_path():
+    return os.path.expanduser(os.path.join('~', '.config', 'jiraline', 'pinned.json'))
+
+def load_pins():
+    pins = {}
+    pth = get_pins_path()
+    if os.path.isfile(pth):
+        with file_lock(pth, exclusive=False), open(pth) as ifstream:
+            pins = json.loads(ifstream.read())
+    return pins
+
+def store_pins(pins):
+    os.makedirs(os.path.dirname(get_pins_path()), exist_ok=True)
+    with file_lock(get_pins_path()):
+        write_file_atomically(get_pins_path(), json.dumps(pins))
+
+@contextlib.contextmanager
+def modified_pins():
+    """Yields pins to be modified, and stores them afterwards; other processes cannot modify
+    pins in the meantime.
+    """
+    with file_lock(get_pins_path()):
+        pins = load_pins()
+        yield pins
+        store_pins(pins)
+
+def parse_size(size):
+    """Parses sizes like 4096, "512K", "100M", or "1G" to number of bytes.
+    """
+    if size is None or isinstance(size, int):
+        return size
+    size = str(size).strip().upper()
+    multipliers = {'K': 1024, 'M': 1024**2, 'G': 1024**3}
+    if size and size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+def format_size(size):
+    for unit in ('B', 'KiB', 'MiB',):
+        if size < 1024:
+            return ('{} {}' if unit == 'B' else '{:.1f} {}').format(size, unit)
+        size /= 1024
+    return '{:.1f} GiB'.format(size)
+
+def get_cache_budget(settings=None):
+    """Returns (max bytes, max entries) tuple; None means no limit.
+    """
+    budget = settings_or_default(settings).get('cache', {})
+    return (parse_size(budget.get('max_bytes')), budget.get('max_entries'),)
+
+def collect_cache_garbage(max_bytes=None, max_entries=None, dry_run=False, settings=None):
+    """Evicts least recently used issues until the cache fits in the budget.
+    Pinned issues are never evicted (but they count towards the budget).
+    Stored attachments count towards the budget too, and are evicted with the last issue they are
+    attached to.
+    Returns list of (issue key, size) tuples of evicted entries.
+    """
+    if max_bytes is None and max_entries is None:
+        return []
+    pins = load_pins()
+    entries = list(Cache.entries(settings))
+    # cached comments and histories are evicted together with their issues
+    attached = collections.defaultdict(list)
+    for entry_cache in ISSUE_ENTRY_CACHES:
+        for issue_key, path, st in entry_cache.entries(settings):
+            attached[issue_key].append((path, st.st_size,))
+    # content of attachments is stored once, even if it is attached to many issues
+    store = AttachmentStore(settings)
+    attachments = store.issues()
+    attachment_sizes, attached_to = {}, collections.defaultdict(set)
+    for issue_key, stored in attachments.items():
+        for digest, size in stored:
+            attachment_sizes[digest] = size
+            attached_to[digest].add(issue_key)
+    total_bytes = sum(st.st_size for _, _, st in entries) + sum(size for each in attached.values() for _, size in each) + sum(attachment_sizes.values())
+    total_entries = len(entries)
+    evicted = []
+    for issue_key, path, st in sorted(entries, key=lambda each: each[2].st_atime):
+        if (max_bytes is None or total_bytes <= max_bytes) and (max_entries is None or total_entries <= max_entries):
+            break
+        if issue_key in pins:
+            continue
+        size = st.st_size + sum(each_size for _, each_size in attached.get(issue_key, []))
+        for digest in set(each_digest for each_digest, _ in attachments.get(issue_key, [])):
+            attached_to[digest].discard(issue_key)
+            if not attached_to[digest]:
+                size += attachment_sizes[digest]
+        if not dry_run:
+            for each in [path] + [each_path for each_path, _ in attached.get(issue_key, [])]:
+                try:
+                    os.unlink(each)
+                except FileNotFoundError:
+                    pass
+        total_bytes -= size
+        total_entries -= 1
+        evicted.append((issue_key, size,))
+    if evicted and not dry_run:
+        store.remove(issue_key for issue_key, _ in evicted)
+    return evicted
+
+def enforce_cache_budget(settings=None):
+    with TRACE.span('cache.gc'):
+        collect_cache_garbage(*get_cache_budget(settings), settings=settings)
+
+def submit_write(issue_name, action, method, url, **kwargs):
+    """Sends a write request, or queues it in the outbox when writes are queued.
+    Returns None if the request was queued.
+    """
+    if QUEUE_WRITES:
+        Outbox().append(issue_name, action, method, url, **kwargs)
+        return None
+    return getattr(connection, method)(url, **kwargs)
 
 def stringifyAssignee(assignee):
     return '{} <{}>'.format(
@@ -365,9 +1893,9 @@ def transition_to(issue_name, to_id):
             "id": to_id,
         }
     }
-    r = requests.post('https://{}.atlassian.net/rest/api/2/issue/{}/transitions'.format(settings.get('domain'), issue_name),
-                      json=transition,
-                      auth=settings.credentials())
+    r = submit_write(issue_name, 'transition', 'post', '/rest/api/2/issue/{}/transitions'.format(issue_name), json=transition)
+    if r is None:
+        return
     if r.status_code == 404:
         print("error: the issue does not exist or the user does not have permission to view it")
         exit(1)
@@ -397,7 +1925,9 @@ def add_label(issue_name, label):
         }
     }
 
-    r = connection.put('/rest/api/2/issue/{}'.format(issue_name), json=payload)
+    r = submit_write(issue_name, 'label', 'put', '/rest/api/2/issue/{}'.format(issue_name), json=payload)
+    if r is None:
+        return
     if r.status_code == 404:
         print("error: the issue does not exist or the user does not have permission to view it")
         exit(1)
@@ -420,7 +1950,9 @@ def set_priority(issue_name, id):
         }
     }
 
-    r = connection.put('/rest/api/2/issue/{}'.format(issue_name), json=payload)
+    r = submit_write(issue_name, 'priority', 'put', '/rest/api/2/issue/{}'.format(issue_name), json=payload)
+    if r is None:
+        return
     if r.status_code == 404:
         print("error: the issue does not exist or the user does not have permission to view it")
         exit(1)
@@ -479,19 +2011,98 @@ def set_customfield_executor(issue_name, message):
         print("error: 500 Internal server error")
         exit(1)
 
+class Renderer:
+    """Buffered writer for commands producing many lines of output.
+
+    Colour mode is decided once (on first use) instead of on every coloured token, and
+    lines are written to the output stream in large chunks.
+    Lines written with `line()` must be flushed before anything is printed directly.
+    """
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._colours = None
+        self._forced = False
+        self._codes = {}
+        self._dates = {}
+        self._buffer = []
+        self._buffered = 0
+
+    def colours(self):
+        if self._colours is None:
+            colour_settings = settings.get('ui', {}).get('colours') or 'default'
+            self._colours = bool(colored and (colour_settings != 'never') and (self._stream.isatty() or self._forced or (colour_settings == 'always')))
+        return self._colours
+
+    def force_colours(self):
+        self._forced = True
+        self._colours = None
+        return self
+
+    def colorise(self, color, string):
+        if not (self._colours if self._colours is not None else self.colours()):
+            return string
+        code = self._codes.get(color)
+        if code is None:
+            code = self._codes[color] = colored.fg(color)
+        reset = self._codes.get(None)
+        if reset is None:
+            reset = self._codes[None] = colored.attr('reset')
+        return (code + str(string) + reset)
+
+    def utc_datetime(self, seconds):
+        """Formats UTC timestamp as "YYYY-MM-DD HH:MM:SS"; faster than strftime() for many rows.
+        """
+        day, seconds = divmod(int(seconds), 86400)
+        date = self._dates.get(day)
+        if date is None:
+            date = self._dates[day] = time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+        return '{} {:02d}:{:02d}:{:02d}'.format(date, seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+    def line(self, text=''):
+        text = str(text)
+        self._buffer.append(text)
+        self._buffered += len(text) + 1
+        if self._buffered >= Renderer.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        buffer, self._buffer, self._buffered = self._buffer, [], 0
+        self._stream.write('\n'.join(buffer) + '\n')
+        self._stream.flush()
+
+renderer = Renderer(sys.stdout)
+
 def colorise(color, string):
-    colour_settings = settings.get('ui', {}).get('colours') or 'default'
-    if colored and (colour_settings != 'never') and (sys.stdout.isatty() or FORCE_COLOURS or (colour_settings == 'always')):
-        string = (colored.fg(color) + str(string) + colored.attr('reset'))
-    return string
+    return renderer.colorise(color, string)
 
 def colorise_repr(color, string):
     return "'{}'".format(colorise(color, repr(string)[1:-1]))
 
+def ask_for_credential(what):
+    """Asks the user for a credential missing from settings (see Settings.ask).
+    """
+    try:
+        return (getpass.getpass if what == 'password' else input)('{}: '.format(what))
+    except (EOFError, KeyboardInterrupt):
+        print()
+        exit(1)
+
 def error_and_exit(message, exit_code = 1):
     print('{}: {}'.format(colorise(COLOR_ERROR, 'error'), message))
     exit(exit_code)
 
+def get_jobs(ui, default):
+    """Returns value of the --jobs option (number of requests made at once).
+    """
+    jobs = (ui.get('--jobs') if '--jobs' in ui else default)
+    if jobs < 1:
+        error_and_exit('--jobs must be at least 1')
+    return jobs
+
 def sluggify(issue_message):
     return '-'.join(re.compile('[^ a-zA-Z0-9_]').sub(' ', unidecode.unidecode(issue_message).lower()).split())
 
@@ -509,13 +2120,9 @@ def displayBasicInformation(data):
 
     fields = lambda *path, default=None: (data.get('fields', *path, default=default) or default)
 
-    domain = settings.get('domain')
-    if domain is not None:
+    if settings.get('domain') is not None or settings.get('server') is not None:
         # https://posbit.atlassian.net/browse/IP-3686
-        print('URL:      https://{domain}.atlassian.net/browse/{issue_key}'.format(
-            domain = domain,
-            issue_key = data.get('key'),
-        ))
+        print('URL:      {}'.format(connection.url('/browse/{}'.format(data.get('key')))))
 
     reporter = fields('reporter')
     if reporter:
@@ -577,7 +2184,28 @@ def displayComments(comments):
             print()
             print(get_nice_wall_of_text(c.get('body', '')))
 
+def display_history(history, fields=None):
+    """Displays history entries (oldest first), only changes of `fields` if given.
+    """
+    for entry in history:
+        items = [item for item in entry.get('items', []) if not fields or item.get('field') in fields]
+        if not items:
+            continue
+        renderer.line('{} {}'.format(
+            colorise(COLOR_SHOW_SECTION, entry.get('created', '').replace('T', ' ').replace('+', ' +')),
+            stringify_reporter(entry.get('author') or {}),
+        ))
+        for item in items:
+            renderer.line('    {}: {} -> {}'.format(
+                item.get('field'),
+                (item.get('fromString') or '(none)'),
+                colorise(COLOR_STATUS, (item.get('toString') or '(none)')),
+            ))
+
 def print_abbrev_issue_summary(issue, ui):
+    renderer.line(format_abbrev_issue_summary(issue, ui))
+
+def format_abbrev_issue_summary(issue, ui):
     key = issue.get('key', '<undefined>')
     fields = issue.get('fields', {})
     summary = fields.get('summary', '')
@@ -605,51 +2233,246 @@ def print_abbrev_issue_summary(issue, ui):
         formatted_line += ' ({})'
         formats.append(assignee_string)
         formatted_line = formatted_line.format(*formats)
-    print(formatted_line)
+    return formatted_line
 
 def fetch_summary(issue_name):
-    r = connection.get('/rest/api/2/issue/{}'.format(issue_name), params={
-        'fields': 'summary',
-    })
-    if r.status_code == 200:
-        response = json.loads(r.text)
-        return response.get('fields', {}).get('summary', None)
-    elif r.status_code == 404:
-        print("error: the requested issue is not found or the user does not have permission to view it.")
+    try:
+        response = connection.issue(issue_name, fields=['summary'])
+    except IssueNotFoundException as e:
+        print('error: {}'.format(e.args[1]))
         exit(1)
-    else:
-        print('error: HTTP {}'.format(r.status_code))
+    except IssueException as e:
+        print('error: HTTP {}'.format(e.args[1]))
         exit(1)
+    return response.get('fields', {}).get('summary', None)
+
+# Fields requested when an issue is displayed; its comments are then fetched separately (see
+# fetch_comments()) so the page of comments embedded in the issue is skipped.
+ISSUE_FIELDS = ['*all', '-comment']
+
+def get_issue_links(fields):
+    """Returns links of an issue as a list of [link type, direction ("inward" or "outward"),
+    description of the link, key of the linked issue] lists, or None if fields of the issue
+    do not include "issuelinks".
+    """
+    if 'issuelinks' not in fields:
+        return None
+    links = []
+    for link in (fields['issuelinks'] or []):
+        link_type = link.get('type', {})
+        for direction in ('outward', 'inward',):
+            other = link.get('{}Issue'.format(direction))
+            if other is not None:
+                links.append([link_type.get('name', ''), direction, link_type.get(direction, ''), other['key']])
+    return links
+
+def update_links_index(issues):
+    """Updates index of issue links from `issues` (a list of (issue name, fields) pairs).
+    Only nodes whose links changed are written.
+    """
+    with AdjacencyIndex('links') as index:
+        changes = {}
+        for issue_name, fields in issues:
+            links = get_issue_links(fields)
+            if links is not None and index.get(issue_name) != links:
+                changes[issue_name] = links
+        index.update(changes)
+
+def store_issue(issue_name, response, index_links=True):
+    """Stores issue (as returned by Jira) in cache.
+    Links of the issue are stored in the links index unless `index_links` is false (the caller
+    then updates the index itself, e.g. once for a batch of issues).
+    """
+    cached = Cache(issue_name)
+    cached.set('key', value=issue_name)
+    embedded_comments = response.get('fields', {}).get('comment')
+    if embedded_comments is not None:
+        comments = CommentCache(issue_name)
+        known = comments.updated()
+        fresh = [comment for comment in embedded_comments.get('comments', []) if known.get(comment['id']) != comment.get('updated')]
+        if fresh or not comments.is_cached():
+            comments.merge(fresh, embedded_comments.get('total', 0))
+    # comments are kept in the comment cache
+    cached.data().pop('fields.comment', None)
+    for k, v in response.get('fields', {}).items():
+        if k == 'comment':
+            continue
+        cached.set('fields', k, value=v)
+    for k, v in response.items():
+        if k == 'fields':
+            continue
+        cached[k] = v
+    if index_links:
+        update_links_index([(issue_name, response.get('fields', {}))])
+    return cached.store()
 
 def fetch_issue(issue_name, fatal=True):
-    request_content = {}
-    r = connection.get('/rest/api/2/issue/{}'.format(issue_name), params=request_content)
-    if r.status_code == 200:
-        response = json.loads(r.text)
-        cached = Cache(issue_name)
-        cached.set('key', value=issue_name)
-        for k, v in response.get('fields', {}).items():
-            cached.set('fields', k, value=v)
-        for k, v in response.items():
-            cached[k] = v
-        cached.store()
-    elif r.status_code == 404:
-        msg = 'the requested issue is not found or the user does not have permission to view it.'
-        if fatal:
-            print('error: {}'.format(msg))
-            exit(1)
-        else:
-            raise IssueNotFoundException(issue_name, msg)
-    else:
-        if fatal:
-            print('error: HTTP {}'.format(r.status_code))
-            exit(1)
-        else:
-            raise IssueException(issue_name, r.status_code)
-    return cached
+    try:
+        response = connection.issue(issue_name, fields=ISSUE_FIELDS)
+    except IssueNotFoundException as e:
+        if not fatal:
+            raise
+        print('error: {}'.format(e.args[1]))
+        exit(1)
+    except IssueException as e:
+        if not fatal:
+            raise
+        print('error: HTTP {}'.format(e.args[1]))
+        exit(1)
+    return store_issue(issue_name, response)
+
+def fetch_issues(issue_names, jobs, report):
+    """Fetches issues concurrently (at most `jobs` at once) and stores them in cache.
+    Calls report(issue name, exception or None) as every fetch completes.
+    """
+    async def fetch_one(client, issue_name):
+        try:
+            return (issue_name, (await client.issue(issue_name)), None,)
+        except IssueException as e:
+            return (issue_name, None, e,)
+
+    fetched = []
+    async def fetch_all():
+        async with AsyncJiraClient(settings, limit=jobs) as client:
+            for completed in asyncio.as_completed([fetch_one(client, issue_name) for issue_name in issue_names]):
+                issue_name, response, error = await completed
+                if response is not None:
+                    store_issue(issue_name, response, index_links=False)
+                    fetched.append((issue_name, response.get('fields', {}),))
+                report(issue_name, error)
+
+    asyncio.run(fetch_all())
+    update_links_index(fetched)
+
+def post_comments(comments, jobs, report):
+    """Posts comments concurrently (at most `jobs` at once); `comments` is a list of
+    (issue name, comment body) pairs.
+    Calls report(issue name, exception or None) as every post completes.
+    """
+    async def post_one(client, issue_name, body):
+        try:
+            await client.comment(issue_name, body)
+            return (issue_name, None,)
+        except (JIRALineException, requests.exceptions.RequestException) as e:
+            return (issue_name, e,)
+
+    async def post_all():
+        async with AsyncJiraClient(settings, limit=jobs) as client:
+            for completed in asyncio.as_completed([post_one(client, issue_name, body) for issue_name, body in comments]):
+                report(*(await completed))
+
+    asyncio.run(post_all())
+
+def fetch_histories(issues, jobs, report, page_size=100):
+    """Fetches new history entries of issues concurrently (at most `jobs` issues at once) and
+    stores them in cache.
+    `issues` is a list of (issue name, "updated" field of the issue or None); histories of
+    issues whose "updated" field did not change since they were last fetched are not requested.
+    Calls report(issue name, number of new entries, exception or None) as every fetch completes.
+    """
+    async def fetch_one(client, issue_name, issue_updated):
+        history = HistoryCache(issue_name)
+        if issue_updated is not None and history.index().get('issue_updated') == issue_updated:
+            return (issue_name, 0, None,)
+        fetched, listed, start_at = [], None, len(history)
+        try:
+            while True:
+                page = await client.changelog_page(issue_name, start_at, page_size)
+                total = page.get('total', 0)
+                if total < len(history) and listed is None:
+                    # entries were removed (e.g. the issue was moved), list the whole history again
+                    fetched, listed, start_at = [], [], 0
+                    continue
+                fetched.extend(page.get('values', []))
+                if listed is not None:
+                    listed.extend(entry['id'] for entry in page.get('values', []))
+                start_at += len(page.get('values', []))
+                if not page.get('values') or page.get('isLast', start_at >= total):
+                    break
+        except IssueException as e:
+            return (issue_name, 0, e,)
+        if fetched or listed is not None or issue_updated is not None or not history.is_cached():
+            history.merge(fetched, total, listed=listed, **({} if issue_updated is None else {'issue_updated': issue_updated}))
+        return (issue_name, len(fetched), None,)
+
+    async def fetch_all():
+        async with AsyncJiraClient(settings, limit=jobs) as client:
+            for completed in asyncio.as_completed([fetch_one(client, issue_name, issue_updated) for issue_name, issue_updated in issues]):
+                report(*(await completed))
+
+    asyncio.run(fetch_all())
+
+async def fetch_comment_pages(issue_name, offsets, page_size, jobs):
+    async with AsyncJiraClient(settings, limit=jobs) as client:
+        return await asyncio.gather(*(client.comments_page(issue_name, offset, page_size, newest_first=True) for offset in offsets))
+
+def fetch_comments(issue_name, last=None, page_size=100, jobs=8):
+    """Updates cached comments of an issue and returns its CommentCache.
+    Comments are requested newest first, and requesting stops at the first page with an already
+    cached (and unchanged) comment; with `last` only the newest `last` comments are requested.
+    When the whole thread is needed, pages after the first one are fetched `jobs` at a time.
+    """
+    comments = CommentCache(issue_name)
+    known = comments.updated()
+
+    def list_comments(stop_at_known):
+        fetched, listed, start_at, total = [], [], 0, 0
+        pages = []
+        while True:
+            size = (page_size if last is None else min(page_size, last - start_at))
+            if size <= 0:
+                break
+            page = connection.comments_page(issue_name, start_at, size, newest_first=True)
+            pages.append(page)
+            total = page.get('total', 0)
+            start_at += len(page.get('comments', []))
+            fresh = [comment for comment in page.get('comments', []) if known.get(comment['id']) != comment.get('updated')]
+            if not page.get('comments') or start_at >= total or (stop_at_known and len(fresh) < len(page['comments'])):
+                break
+            if not stop_at_known and last is None:
+                # page size may be capped by the server
+                size = len(page['comments'])
+                offsets = range(start_at, total, size)
+                pages.extend(asyncio.run(fetch_comment_pages(issue_name, offsets, size, jobs)))
+                start_at = max(start_at, offsets[-1] + len(pages[-1].get('comments', [])))
+                break
+        for page in pages:
+            listed.extend(comment['id'] for comment in page.get('comments', []))
+            fetched.extend(comment for comment in page.get('comments', []) if known.get(comment['id']) != comment.get('updated'))
+        return (fetched, listed, total, (start_at >= total),)
+
+    with TRACE.span('comments.fetch', issue=issue_name):
+        # older comments are known to be cached only if the whole thread was cached before
+        # (and not just its last few comments)
+        whole_thread_cached = (bool(known) and len(known) >= comments.index()['total'])
+        fetched, listed, total, complete = list_comments(stop_at_known=(whole_thread_cached or last is not None))
+        if last is None and not complete and len(set(known) | set(listed)) > total:
+            # some cached comments were deleted, list the whole thread to find them
+            fetched, listed, total, complete = list_comments(stop_at_known=False)
+        if fetched or complete or total != comments.index()['total']:
+            comments.merge(fetched, total, listed=(listed if (complete and last is None) else None))
+    return comments
+
+def cached_comments(issue_name, cached, last=None):
+    """Returns cached comments of an issue (oldest first), at most `last` newest ones.
+    """
+    if CommentCache(issue_name).is_cached():
+        return CommentCache(issue_name).read(last=last)
+    # issues cached by earlier versions have comments embedded
+    comments = cached.get('fields', 'comment', default={}).get('comments', [])
+    return (comments[-last:] if (last is not None and last > 0) else ([] if last is not None else comments))
 
-def dump_issue(cached, ui):
+def dump_issue(issue_name, cached, ui):
     data = cached.response().get('fields', {})
+    if 'comment' not in data:
+        # comments are kept in the comment cache; put them back where Jira returns them
+        comments = cached_comments(issue_name, cached)
+        data['comment'] = {
+            'comments': comments,
+            'maxResults': len(comments),
+            'total': max(len(comments), CommentCache(issue_name).index()['total']),
+            'startAt': 0,
+        }
     if '--field' in ui:
         filtered_data = {}
         for k in ui.get('-f'):
@@ -661,24 +2484,26 @@ def dump_issue(cached, ui):
 def show_issue(issue_name, ui, cached=None):
     if cached is None:
         cached = Cache(issue_name)
-    if '--field' not in ui:
-        displayBasicInformation(cached)
-        displayComments(cached.get('fields', 'comment', default={}).get('comments', []))
-    elif '--pretty' in ui:
-        print(dump_issue(cached, ui))
-    elif '--raw' in ui:
-        print(dump_issue(cached, ui))
-    else:
-        for i, key in enumerate(map(lambda _: _[0], ui.get('-f'))):
-            if key == 'comment': continue
-            value = cached.get('fields', key)
-            if key == 'assignee':
-                value = stringifyAssignee(value)
-            if value is None:
-                print('{} (undefined)'.format(key))
-            else:
-                print('{} = {}'.format(key, str(value).strip()))
-        displayComments(cached.response().get('fields', {}).get('comment', {}).get('comments', []))
+    last = (ui.get('--last') if '--last' in ui else None)
+    with TRACE.span('display.issue', issue=issue_name):
+        if '--field' not in ui:
+            displayBasicInformation(cached)
+            displayComments(cached_comments(issue_name, cached, last=last))
+        elif '--pretty' in ui:
+            print(dump_issue(issue_name, cached, ui))
+        elif '--raw' in ui:
+            print(dump_issue(issue_name, cached, ui))
+        else:
+            for i, key in enumerate(map(lambda _: _[0], ui.get('-f'))):
+                if key == 'comment': continue
+                value = cached.get('fields', key)
+                if key == 'assignee':
+                    value = stringifyAssignee(value)
+                if value is None:
+                    print('{} (undefined)'.format(key))
+                else:
+                    print('{} = {}'.format(key, str(value).strip()))
+            displayComments(cached_comments(issue_name, cached, last=last))
 
 def expand_issue_name(issue_name, project=None):
     if issue_name == '-':
@@ -687,6 +2512,17 @@ def expand_issue_name(issue_name, project=None):
         issue_name = '{}-{}'.format((project if project is not None else settings.get('default_project')), issue_name)
     return issue_name
 
+def read_issue_keys(path):
+    """Reads issue keys from a file (or standard input if path is "-"), one per line.
+    Blank lines and lines beginning with '#' are ignored.
+    """
+    ifstream = (sys.stdin if path == '-' else open(path))
+    try:
+        return [expand_issue_name(line.strip()) for line in ifstream if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if ifstream is not sys.stdin:
+            ifstream.close()
+
 def get_message_from_editor(template='', fmt={}, join_lines='\n'):
     editor = os.getenv('EDITOR', 'vi')
     message_path = os.path.expanduser(os.path.join('~', '.local', 'share', 'jiraline', 'tmp_message'))
@@ -719,7 +2555,7 @@ def read_shortlog():
     shortlog = []
     shortlog_path = os.path.join(pth, 'shortlog.json')
     if os.path.isfile(shortlog_path):
-        with open(shortlog_path) as ifstream:
+        with TRACE.span('shortlog.read'), file_lock(shortlog_path, exclusive=False), open(shortlog_path) as ifstream:
             shortlog = json.loads(ifstream.read())
     return shortlog
 
@@ -727,21 +2563,60 @@ def write_shortlog(shortlog):
     pth = get_shortlog_path()
     if not os.path.isdir(pth):
         os.makedirs(pth)
-    with open(os.path.join(pth, 'shortlog.json'), 'w') as ofstream:
-        ofstream.write(json.dumps(shortlog[-settings.get('shortlog_size', default=80):]))
+    with TRACE.span('shortlog.write'), file_lock(get_shortlog_lock_path()):
+        write_file_atomically(os.path.join(pth, 'shortlog.json'), json.dumps(shortlog[-settings.get('shortlog_size', default=80):]))
+
+def get_shortlog_lock_path():
+    """Path locked for updates of the shortlog and its journal.
+    """
+    return os.path.join(get_shortlog_path(), 'shortlog.json')
+
+def get_shortlog_journal_path():
+    """Journal is an append-only log of all shortlog events (one JSON object per line).
+    Unlike the shortlog it is never truncated nor squashed.
+    """
+    return os.path.join(get_shortlog_path(), 'events.jsonl')
+
+def ensure_shortlog_journal(shortlog=None):
+    """Creates the journal if it does not exist, seeding it with events from the shortlog.
+    """
+    journal_path = get_shortlog_journal_path()
+    if os.path.isfile(journal_path):
+        return journal_path
+    with file_lock(get_shortlog_lock_path()):
+        if os.path.isfile(journal_path):
+            return journal_path
+        if shortlog is None:
+            shortlog = read_shortlog()
+        write_file_atomically(journal_path, ''.join((json.dumps(event) + '\n') for event in sorted(shortlog, key=lambda e: e.get('timestamp', 0))))
+    return journal_path
 
 def append_shortlog_event(issue_name, log_content):
-    issue_log_name = '{}.{}.json'.format(timestamp(), issue_name)
+    append_shortlog_events([(issue_name, log_content,)])
+
+def append_shortlog_events(events):
+    """Appends (issue name, log content) events to the shortlog and the journal.
+    The shortlog is read and written once for all events, not once per event.
+    """
     pth = get_shortlog_path()
     if not os.path.isdir(pth):
         os.makedirs(pth)
-    shortlog = read_shortlog()
-    log_content['issue'] = issue_name
-    log_content['timestamp'] = timestamp()
-    if shortlog and (shortlog[-1].get('event') == log_content.get('event') and shortlog[-1].get('issue') == log_content.get('issue')):
-        return
-    shortlog.append(log_content)
-    write_shortlog(shortlog)
+    with file_lock(get_shortlog_lock_path()):
+        shortlog = read_shortlog()
+        appended = []
+        for issue_name, log_content in events:
+            log_content['issue'] = issue_name
+            log_content['timestamp'] = timestamp()
+            if shortlog and (shortlog[-1].get('event') == log_content.get('event') and shortlog[-1].get('issue') == log_content.get('issue')):
+                continue
+            shortlog.append(log_content)
+            appended.append(log_content)
+        if not appended:
+            return
+        ensure_shortlog_journal(shortlog[:-len(appended)])
+        with open(get_shortlog_journal_path(), 'a') as ofstream:
+            ofstream.write(''.join((json.dumps(log_content) + '\n') for log_content in appended))
+        write_shortlog(shortlog)
 
 def add_shortlog_event_transition(issue_name, to):
     append_shortlog_event(issue_name, log_content = {
@@ -779,13 +2654,16 @@ def add_shortlog_event_label(issue_name, labels):
         },
     })
 
-def add_shortlog_event_comment(issue_name, comment):
-    append_shortlog_event(issue_name, log_content = {
+def shortlog_event_comment(comment):
+    return {
         'event': 'comment',
         'parameters': {
             'comment': comment,
         },
-    })
+    }
+
+def add_shortlog_event_comment(issue_name, comment):
+    append_shortlog_event(issue_name, log_content=shortlog_event_comment(comment))
 
 def add_shortlog_event_open_issue(issue_name, issue_summary):
     append_shortlog_event(issue_name, log_content = {
@@ -801,8 +2679,41 @@ def add_shortlog_event_open_issue(issue_name, issue_summary):
 ################################################################################
 # Commands.
 #
+# Placeholders substituted in comment messages; other braces (e.g. {code} in Jira markup) are left alone.
+COMMENT_PLACEHOLDERS = re.compile(r'\{(issue_name|issue_summary)\}')
+
+def format_comment(message, issue_name, summary=None):
+    """Substitutes {issue_name} and {issue_summary} in a comment message.
+    The summary is taken from the cache unless given.
+    """
+    if not COMMENT_PLACEHOLDERS.search(message):
+        return message
+    if summary is None:
+        summary = Cache(issue_name, lazy=True).peek('fields.summary', default='')
+    return COMMENT_PLACEHOLDERS.sub(lambda m: (issue_name if m.group(1) == 'issue_name' else summary), message)
+
+def get_git_show_output(ref):
+    p = subprocess.Popen(('git', 'show', ref), stdout=subprocess.PIPE)
+    output, error = p.communicate()
+    output = output.decode('utf-8').strip()
+    git_exit_code = p.wait()
+    if git_exit_code != 0:
+        print('error: Git error')
+        exit(git_exit_code)
+    return output
+
 def commandComment(ui):
-    issue_name = expand_issue_name(ui.operands()[0])
+    issue_names = [expand_issue_name(each) for each in ui.operands()]
+    if '--keys-from' in ui:
+        issue_names.extend(read_issue_keys(ui.get('--keys-from')))
+    # the same issue given twice is commented once
+    issue_names = list(collections.OrderedDict.fromkeys(issue_names))
+    if not issue_names:
+        error_and_exit('no issues to comment')
+    if len(issue_names) > 1:
+        comment_issues(ui, issue_names)
+        return
+    issue_name = issue_names[0]
     store_last_active_issue_marker(issue_name)
     message = ""
     if '-m' in ui:
@@ -813,14 +2724,7 @@ def commandComment(ui):
         description_not_available = '<description not available>'
         initial_comment_text = ''
         if '--ref' in ui:
-            p = subprocess.Popen(('git', 'show', ui.get('--ref')), stdout=subprocess.PIPE)
-            output, error = p.communicate()
-            output = output.decode('utf-8').strip()
-            git_exit_code = p.wait()
-            if git_exit_code != 0:
-                print('error: Git error')
-                exit(git_exit_code)
-            initial_comment_text = output
+            initial_comment_text = get_git_show_output(ui.get('--ref'))
         fmt = {
             'issue_name': issue_name,
             'issue_summary': summary_not_available,
@@ -830,24 +2734,80 @@ def commandComment(ui):
         if cached.is_cached():
             fmt['issue_summary'] = get_nice_wall_of_text(cached.get('fields.summary', default=summary_not_available).strip(), indent='#   ')
             fmt['issue_description'] = get_nice_wall_of_text((cached.get('fields.description', default=description_not_available) or description_not_available).strip(), indent='#   ')
-        if '--reply' in ui and cached.is_cached():
-            comments = cached.get('fields', 'comment', default={}).get('comments', [])
+        if '--reply' in ui:
+            # only the last comment is needed, not the whole thread
+            try:
+                comments = fetch_comments(issue_name, last=1).read(last=1)
+            except (JIRALineException, requests.exceptions.RequestException):
+                comments = cached_comments(issue_name, cached, last=1)
             if comments:
                 fmt['text'] = '> {}'.format(comments[-1].get('body', ''))
         message = get_message_from_editor('issue_comment_message', fmt)
     if not message.strip():
         print('error: aborting due to empty message')
         exit(1)
+    message = format_comment(message, issue_name)
     comment = {
         'body': message,
     }
     add_shortlog_event_comment(issue_name, message)
-    r = requests.post('https://{}.atlassian.net/rest/api/2/issue/{}/comment'.format(settings.get('domain'), issue_name),
-                      json=comment,
-                      auth=settings.credentials())
-    if r.status_code == 400:
+    r = submit_write(issue_name, 'comment', 'post', '/rest/api/2/issue/{}/comment'.format(issue_name), json=comment)
+    if r is not None and r.status_code == 400:
         print('The input is invalid (e.g. missing required fields, invalid values, and so forth).')
 
+def comment_issues(ui, issue_names):
+    """Posts one message to many issues: the message is composed once (with -m, or in a single editor
+    session) and posted concurrently, with placeholders substituted for every issue.
+    """
+    if '--reply' in ui:
+        error_and_exit('--reply can be used only when commenting a single issue')
+    jobs = get_jobs(ui, 8)
+    message = (ui.get('-m') if '-m' in ui else '')
+    if not message.strip():
+        summaries = []
+        for issue_name in issue_names:
+            cached = Cache(issue_name, lazy=True)
+            summaries.append('{}: {}'.format(issue_name, (cached.peek('fields.summary', default='') if cached.is_cached() else '<summary not available>')))
+        fmt = {
+            'issue_name': ', '.join(issue_names),
+            'issue_summary': '\n'.join(('#   ' + each) for each in summaries),
+            'issue_description': '#   {issue_name} and {issue_summary} are replaced with key and summary of every issue',
+            'text': (get_git_show_output(ui.get('--ref')) if '--ref' in ui else ''),
+        }
+        message = get_message_from_editor('issue_comment_message', fmt)
+    if not message.strip():
+        print('error: aborting due to empty message')
+        exit(1)
+
+    failed = []
+    def report(issue_name, error):
+        if error is None:
+            return
+        reason = (error.args[1] if isinstance(error, IssueNotFoundException) else
+                  'HTTP {}'.format(error.args[1]) if isinstance(error, IssueException) else error)
+        failed.append(issue_name)
+        print('{}: {}: {}'.format(colorise(COLOR_ERROR, 'error'), colorise(COLOR_ISSUE_KEY, issue_name), reason))
+
+    # summaries of issues that are not cached are fetched (all at once) only if the message needs them
+    if '{issue_summary}' in message:
+        missing = [issue_name for issue_name in issue_names if not Cache(issue_name, lazy=True).is_cached()]
+        if missing:
+            fetch_issues(missing, jobs=jobs, report=report)
+    comments = [(issue_name, format_comment(message, issue_name)) for issue_name in issue_names if issue_name not in failed]
+
+    if QUEUE_WRITES:
+        for issue_name, body in comments:
+            submit_write(issue_name, 'comment', 'post', '/rest/api/2/issue/{}/comment'.format(issue_name), json={'body': body})
+        posted = comments
+    else:
+        post_comments(comments, jobs=jobs, report=report)
+        posted = [(issue_name, body) for issue_name, body in comments if issue_name not in failed]
+    append_shortlog_events([(issue_name, shortlog_event_comment(body)) for issue_name, body in posted])
+
+    print('{}: {} {} issue(s), {} failed'.format(colorise(COLOR_NOTE, 'note'), ('queued comments for' if QUEUE_WRITES else 'commented'), len(posted), len(failed)))
+    if failed:
+        exit(1)
+
 
 def commandAssign(ui):
     issue_name = expand_issue_name(ui.operands()[0])
@@ -887,15 +2847,7 @@ def commandAssign(ui):
 
 
 def get_list_of_transitions_for(issue_name):
-    r = connection.get('/rest/api/2/issue/{}/transitions'.format(issue_name))
-    transitions = []
-    if r.status_code == 200:
-        transitions = json.loads(r.text).get('transitions', [])
-    elif r.status_code == 404:
-        raise IssueNotFoundException(issue_name)
-    else:
-        raise IssueException(issue_name, r.status_code)
-    return transitions
+    return connection.transitions(issue_name)
 
 def commandIssue(ui):
     ui = ui.down()
@@ -944,14 +2896,32 @@ def commandIssue(ui):
     elif str(ui) == 'show' or str(ui) == 'issue':
         issue_name, cached = get_issue_name_cache_pair(ui)
         add_shortlog_event_show(issue_name)
-        show_issue(issue_name, ui, fetch_issue(issue_name))
+        # comments are requested alongside the issue (--raw output includes them too)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            comments = executor.submit(fetch_comments, issue_name, last=(None if '--raw' in ui or '--last' not in ui else ui.get('--last')))
+            cached = fetch_issue(issue_name)
+            try:
+                comments.result()
+            except (JIRALineException, requests.exceptions.RequestException) as e:
+                # the issue was fetched, so cached comments are shown instead
+                reason = ('HTTP {}'.format(e.args[1]) if isinstance(e, IssueException) else e)
+                print('{}: failed to fetch comments of {}: {}'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ISSUE_KEY, issue_name), reason))
+        show_issue(issue_name, ui, cached)
     elif str(ui) == 'label':
         ui = ui.down()
         if str(ui) == 'label':
             issue_name, *labels = ui.operands()
             issue_name = expand_issue_name(issue_name)
-            known_labels = load_known_labels_list()
             if '--force' not in ui:
+                known_labels = LabelRegistry()
+                unknown = [label for label in labels if label not in known_labels]
+                if unknown and known_labels.is_stale():
+                    # the label may have been created on the server since the last sync
+                    try:
+                        sync_label_registry()
+                        known_labels = LabelRegistry()
+                    except (JIRALineException, requests.exceptions.RequestException) as e:
+                        print('{}: failed to sync labels: {}'.format(colorise(COLOR_WARNING, 'warning'), e))
                 for label in labels:
                     if label not in known_labels:
                         print('{}: unknown label: {}'.format(colorise(COLOR_ERROR, 'error'), colorise_repr(COLOR_LABEL, label)))
@@ -964,20 +2934,27 @@ def commandIssue(ui):
                 add_label(issue_name, label)
         elif str(ui) == 'new':
             labels = ui.operands()
-            known_labels = set(load_known_labels_list())
-            for label in labels:
-                known_labels.add(label)
-            store_known_labels_list(list(known_labels))
+            with modified_known_labels() as known_labels:
+                for label in labels:
+                    known_labels.add(label)
         elif str(ui) == 'rm':
             labels = ui.operands()
-            known_labels = set(load_known_labels_list())
-            for label in labels:
-                known_labels.remove(label)
-            store_known_labels_list(list(known_labels))
+            with modified_known_labels() as known_labels:
+                for label in labels:
+                    known_labels.remove(label)
         elif str(ui) == 'ls':
-            known_labels = load_known_labels_list()
-            for label in sorted(known_labels):
+            prefix = (ui.operands()[0] if ui.operands() else '')
+            for label in LabelRegistry().complete(prefix):
                 print(label)
+        elif str(ui) == 'sync':
+            try:
+                count = sync_label_registry(jobs=get_jobs(ui, 8))
+            except LabelsException as e:
+                print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), e.args[0]))
+                print(e.args[1])
+                exit(1)
+            if '--verbose' in ui:
+                print('{}: synced {} label(s)'.format(colorise(COLOR_NOTE, 'note'), count))
     elif str(ui) == 'priority':
         issue_name, id = ui.operands()
         store_last_active_issue_marker(issue_name)
@@ -992,21 +2969,9 @@ def commandIssue(ui):
         set_customfield_executor(issue_name, message)
 
 
-def commandSearch(ui):
-    request_content = {
-        'jql': '',
-        'startAt': 0,
-        'maxResults': 15,
-        'fields': [
-            'summary',
-            'status',
-            'assignee',
-            'reporter',
-            'priority',
-            'created',
-        ],
-        'fieldsByKeys': False,
-    }
+def build_search_conditions(ui):
+    """Builds list of JQL conditions from search options (--project, --status, etc.).
+    """
     conditions = []
     first = lambda seq: seq[0]
     if "-p" in ui:
@@ -1025,18 +2990,101 @@ def commandSearch(ui):
         conditions.append('status in ({})'.format(', '.join(map(first, ui.get('-s')))))
     if "-j" in ui:
         conditions.append('{}'.format(ui.get("-j")))
+    return conditions
+
+def iter_search_concurrently(jql, fields, jobs, page_size=100):
+    """Yields issues matching JQL query, like JiraClient.search(), but fetches up to `jobs`
+    pages at once (see AsyncJiraClient.search()).
+    """
+    loop = asyncio.new_event_loop()
+    client = AsyncJiraClient(settings, limit=jobs)
+    issues = client.search(jql, fields, page_size=page_size)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(issues.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(issues.aclose())
+        client.close()
+        loop.close()
+
+def iter_search_instances(jql, fields, max_results, report):
+    """Runs a search on every configured instance at once (each instance has its own client, and
+    so its own connection pool) and yields (instance name, issue) pairs as issues arrive.
+    Calls report(instance name, exception) for every failed search.
+    """
+    clients = [(name, JiraClient(settings.for_instance(name))) for name in settings.instances()]
+    if CASSETTE is None or not CASSETTE.replaying():
+        for _, client in clients:
+            # ask for missing credentials now, not from worker threads
+            client._auth()
+    results = queue.Queue()
+    def search(name, client):
+        try:
+            for issue in client.search_page_stream(jql, fields, 0, max_results):
+                results.put((name, issue, None,))
+            results.put((name, None, None,))
+        except (JIRALineException, requests.exceptions.RequestException) as e:
+            results.put((name, None, e,))
+        finally:
+            client.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(clients), thread_name_prefix='jiraline') as executor:
+        for name, client in clients:
+            executor.submit(search, name, client)
+        remaining = len(clients)
+        while remaining:
+            name, issue, error = results.get()
+            if issue is not None:
+                yield (name, issue,)
+                continue
+            remaining -= 1
+            if error is not None:
+                report(name, error)
+
+def commandSearch(ui):
+    request_content = {
+        'jql': '',
+        'startAt': 0,
+        'maxResults': 15,
+        'fields': [
+            'summary',
+            'status',
+            'assignee',
+            'reporter',
+            'priority',
+            'created',
+        ],
+        'fieldsByKeys': False,
+    }
+    conditions = build_search_conditions(ui)
     if "-n" in ui:
         request_content["maxResults"] = ui.get("-n")
 
     request_content['jql'] = ' AND '.join(conditions)
     if '--debug' in ui:
         print(request_content['jql'])
-    r = connection.get('/rest/api/2/search', params=request_content)
-    if r.status_code == 200:
-        response = json.loads(r.text)
+    failed = []
+    if '--all-instances' in ui:
+        if not settings.instances():
+            error_and_exit('no instances are configured')
+        issues = iter_search_instances(request_content['jql'], request_content['fields'], request_content['maxResults'],
+                                       report=(lambda instance, error: failed.append((instance, error,))))
+    else:
+        try:
+            # issues are displayed as they are decoded, without holding the whole page in memory
+            stream = connection.search_page_stream(request_content['jql'], request_content['fields'], request_content['startAt'], request_content['maxResults'])
+        except SearchException as e:
+            print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), e.args[0]))
+            print(e.args[1])
+            return
+        issues = ((None, issue) for issue in stream)
+    with TRACE.span('display.search'):
         if '--table' not in ui:
             terms = [_.lower() for _ in ui.operands()]
-            for i in response.get('issues', []):
+            for instance, i in issues:
                 skip = bool(terms)
                 if terms:
                     summary = i.get('fields', {}).get('summary', '').lower()
@@ -1046,11 +3094,15 @@ def commandSearch(ui):
                             break
                 if skip:
                     continue
-                print_abbrev_issue_summary(i, ui)
+                if instance is None:
+                    print_abbrev_issue_summary(i, ui)
+                else:
+                    renderer.line('{} {}'.format(colorise(COLOR_INSTANCE, instance), format_abbrev_issue_summary(i, ui)))
         else:
-            print('{:<7} | {:<50} | {:<20} | {:<19} | {:<20}'.format('Key','Summary','Assignee','Created','Status'))
-            print('-' * 130)
-            for i in response['issues']:
+            instance_column = ('{:<12.12} | ' if '--all-instances' in ui else '')
+            renderer.line((instance_column + '{:<7} | {:<50} | {:<20} | {:<19} | {:<20}').format(*(['Instance'] if instance_column else []), 'Key','Summary','Assignee','Created','Status'))
+            renderer.line('-' * (130 + len(instance_column.format(''))))
+            for instance, i in issues:
                 key = i['key']
                 fields = i.get('fields', {})
                 summary = fields.get('summary', '')
@@ -1060,17 +3112,795 @@ def commandSearch(ui):
                 assignee_display_name = assignee.get('displayName', '')
                 created = fields.get('created', '')
                 status_name = fields.get('status', {}).get('name', '')
-                message_line = '{:<.7} | {:<50.50} | {:<20.20} | {:<19.19} | {:<20.20}'.format(
+                message_line = (instance_column + '{:<.7} | {:<50.50} | {:<20.20} | {:<19.19} | {:<20.20}').format(
+                    *([instance] if instance_column else []),
                     key,
                     summary,
                     assignee_display_name,
                     created,
                     status_name,
                 )
-                print(message_line)
+                renderer.line(message_line)
+        renderer.flush()
+    for instance, error in failed:
+        print('{}: search on instance {} failed: {}'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_INSTANCE, instance),
+                                                           ('HTTP {}'.format(error.args[0]) if isinstance(error, SearchException) else error)))
+
+
+WATCHED_FIELDS = ['summary', 'status', 'assignee', 'priority', 'updated']
+# links are requested too (but not reported as changes) to keep the links index used by deps up to date
+WATCH_SEARCH_FIELDS = WATCHED_FIELDS + ['issuelinks']
+
+def watch_poll(jql, snapshot, window):
+    """Polls for issues changed in the last `window` minutes, updates snapshot, and
+    returns (added, changed, removed) lists of (issue, changed field names) tuples.
+    Snapshot maps issue keys to issues (with WATCHED_FIELDS fields).
+    """
+    added, changed, removed = [], [], []
+    recent = 'updated >= -{}m'.format(window)
+    for issue in connection.search(('{} AND {}'.format(recent, '({})'.format(jql)) if jql else recent), WATCH_SEARCH_FIELDS):
+        previous = snapshot.get(issue['key'])
+        if previous is None:
+            added.append((issue, [],))
+        elif previous.get('fields', {}).get('updated') != issue.get('fields', {}).get('updated'):
+            changed.append((issue, [k for k in WATCHED_FIELDS if k != 'updated' and previous['fields'].get(k) != issue['fields'].get(k)],))
+        snapshot[issue['key']] = issue
+    if jql:
+        # issues that were updated but do not match the query anymore
+        for issue in connection.search('{} AND NOT ({})'.format(recent, jql), ['updated']):
+            if issue['key'] in snapshot:
+                removed.append((snapshot.pop(issue['key']), [],))
+    return (added, changed, removed)
+
+def store_issue_fields(issues):
+    """Stores fields of issues (returned by a search) in cache, keeping other cached fields.
+    """
+    # read twice (for the cache and for the links index), so generators are welcome too
+    issues = list(issues)
+    for issue in issues:
+        cached = Cache(issue['key'], lazy=True)
+        cached.set('key', value=issue['key'])
+        for k, v in issue.get('fields', {}).items():
+            cached.set('fields', k, value=v)
+        cached.store()
+    update_links_index([(issue['key'], issue.get('fields', {})) for issue in issues])
+
+def commandWatch(ui):
+    ui = ui.down()
+    jql = ' AND '.join(build_search_conditions(ui))
+    interval = (ui.get('--interval') if '--interval' in ui else 60)
+    polls = (ui.get('--count') if '--count' in ui else None)
+    if '--debug' in ui:
+        print(jql)
+
+    snapshot = {}
+    try:
+        for issue in connection.search(jql, WATCH_SEARCH_FIELDS):
+            snapshot[issue['key']] = issue
+    except SearchException as e:
+        print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), e.args[0]))
+        print(e.args[1])
+        exit(1)
+    store_issue_fields(snapshot.values())
+    print('{}: watching {} issue(s)'.format(colorise(COLOR_NOTE, 'note'), len(snapshot)))
+    if '--verbose' in ui:
+        for issue in snapshot.values():
+            print_abbrev_issue_summary(issue, ui)
+        renderer.flush()
+
+    last_poll = time.time()
+    poll = 0
+    try:
+        while polls is None or poll < polls:
+            poll += 1
+            time.sleep(interval)
+            # relative dates are not affected by time zone of the user, and one minute
+            # of margin covers the minute granularity of JQL dates
+            window = math.ceil((time.time() - last_poll) / 60) + 1
+            poll_started = time.time()
+            try:
+                added, changed, removed = watch_poll(jql, snapshot, window)
+            except SearchException as e:
+                print('{}: poll failed: HTTP {}'.format(colorise(COLOR_WARNING, 'warning'), e.args[0]))
+                continue
+            except requests.exceptions.RequestException as e:
+                print('{}: poll failed: {}'.format(colorise(COLOR_WARNING, 'warning'), e))
+                continue
+            last_poll = poll_started
+            store_issue_fields(issue for issue, _ in (added + changed))
+            for marker, colour, issues in (('+', 'green', added,), ('~', 'yellow', changed,), ('-', 'red', removed,),):
+                for issue, fields in issues:
+                    renderer.line('{} {}{}'.format(
+                        colorise(colour, marker),
+                        format_abbrev_issue_summary(issue, ui),
+                        (' ({})'.format(', '.join(fields)) if fields else ''),
+                    ))
+            renderer.flush()
+    except KeyboardInterrupt:
+        print()
+
+
+def commandHistory(ui):
+    ui = ui.down()
+    jobs = get_jobs(ui, 8)
+    fields = ([field for field, in ui.get('-f')] if '--field' in ui else None)
+    if ui.operands():
+        issues = [(expand_issue_name(ui.operands()[0]), None,)]
     else:
-        print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), r.status_code))
-        print(r.text)
+        jql = ' AND '.join(build_search_conditions(ui))
+        if not jql:
+            error_and_exit('give an issue or search criteria (e.g. --project)')
+        if '--debug' in ui:
+            print(jql)
+        try:
+            # only keys and modification times are needed to decide which histories changed
+            issues = [(issue['key'], issue.get('fields', {}).get('updated'),) for issue in iter_search_concurrently(jql, ['updated'], jobs)]
+        except SearchException as e:
+            print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), e.args[0]))
+            print(e.args[1])
+            exit(1)
+
+    if '--cached' not in ui:
+        updated, new_entries = 0, 0
+        def report(issue_name, count, error):
+            nonlocal updated, new_entries
+            if isinstance(error, IssueNotFoundException) and len(issues) == 1:
+                error_and_exit(error.args[1])
+            elif error is not None:
+                print('{}: failed to fetch history of {}'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ISSUE_KEY, issue_name)))
+            elif count:
+                updated += 1
+                new_entries += count
+        fetch_histories(issues, jobs, report)
+        if '--verbose' in ui:
+            print('{}: fetched {} new entries of {} of {} issue(s)'.format(colorise(COLOR_NOTE, 'note'), new_entries, updated, len(issues)))
+    if '--quiet' in ui:
+        return
+
+    for issue_name, _ in sorted(issues, key=lambda each: issue_key_sort_key(each[0])):
+        history = HistoryCache(issue_name)
+        if len(issues) > 1:
+            renderer.line(colorise(COLOR_ISSUE_KEY, issue_name))
+        display_history(history.read(), fields)
+    renderer.flush()
+
+
+TREE_FIELDS = ['summary', 'status', 'issuetype', 'assignee', 'parent', 'updated']
+
+def chunked(items, size=50):
+    return [items[i:i+size] for i in range(0, len(items), size)]
+
+async def search_all(client, queries, fields):
+    """Returns issues matching any of JQL queries; all queries (and their pages) are requested concurrently.
+    """
+    async def search(jql):
+        return [issue async for issue in client.search(jql, fields)]
+    return list(itertools.chain.from_iterable(await asyncio.gather(*(search(jql) for jql in queries))))
+
+def get_issue_tree_levels(index, root, depth=None):
+    """Returns dictionary mapping keys of issues in cached tree of `root` (breadth first) to their
+    distance from the root.
+    """
+    levels, level, distance = {root: 0}, [root], 0
+    while level and (depth is None or depth > distance):
+        distance += 1
+        next_level = []
+        for key in level:
+            for child in index.get(key, []):
+                if child not in levels:
+                    levels[child] = distance
+                    next_level.append(child)
+        level = next_level
+    return levels
+
+def get_issue_tree_nodes(index, root, depth=None):
+    """Returns keys of issues in cached tree of `root`, breadth first.
+    """
+    return list(get_issue_tree_levels(index, root, depth))
+
+def deeper_tree_depth(a, b):
+    # None means no depth limit
+    return (None if a is None or b is None else max(a, b))
+
+async def walk_issue_tree(client, roots, depth=None):
+    """Fetches subtrees of `roots` breadth first, a level at a time (searches for children of all
+    issues on a level are requested concurrently).
+    Returns (dictionary of children of visited issues, list of fetched issues).
+    """
+    children, fetched, seen = {}, [], set(roots)
+    level = list(roots)
+    while level and (depth is None or depth > 0):
+        issues = await search_all(client, ['parent in ({})'.format(', '.join(chunk)) for chunk in chunked(level)], TREE_FIELDS)
+        children.update((key, []) for key in level)
+        level = []
+        for issue in issues:
+            parent = (issue.get('fields', {}).get('parent') or {}).get('key')
+            if parent in children and issue['key'] not in seen:
+                seen.add(issue['key'])
+                children[parent].append(issue['key'])
+                level.append(issue['key'])
+        fetched.extend(issues)
+        depth = (None if depth is None else depth - 1)
+    return (children, fetched)
+
+async def refresh_issue_tree(index, root, depth, jobs, rebuild=False):
+    """Updates cached tree of `root`.
+    Once the tree is cached, only issues in it (or with parents in it) updated since the
+    previous refresh are requested; only subtrees of issues that joined the tree are walked.
+    The refresh stamp records the depth the tree was walked to: the whole cached tree is always
+    refreshed (so a shallower refresh does not skip changes of deeper issues), and when a deeper
+    tree is requested the issues whose children are not known yet are walked.
+    """
+    refreshed_key = '{}@refreshed'.format(root)
+    started = time.time()
+    async with AsyncJiraClient(settings, limit=jobs) as client:
+        if rebuild or index.get(refreshed_key) is None:
+            roots, (changes, fetched) = await asyncio.gather(
+                search_all(client, ['key = {}'.format(root)], TREE_FIELDS),
+                walk_issue_tree(client, [root], depth),
+            )
+            fetched.extend(roots)
+        else:
+            refreshed = index.get(refreshed_key)
+            # trees refreshed before the depth was recorded are walked to the requested depth
+            depth = deeper_tree_depth(refreshed.get('depth', depth), depth)
+            levels = get_issue_tree_levels(index, root)
+            nodes = list(levels)
+            # issues whose children are not known (beyond depth limit) cannot gain children
+            expanded = set(node for node in nodes if index.get(node) is not None)
+            parents = dict((child, node) for node in expanded for child in index.get(node))
+            def remaining_depth(level):
+                return (None if depth is None else depth - level)
+            window = math.ceil((started - refreshed['refreshed']) / 60) + 1
+            fetched = await search_all(client, [
+                '(parent in ({0}) OR key in ({0})) AND updated >= -{1}m'.format(', '.join(chunk), window)
+                for chunk in chunked(nodes)
+            ], TREE_FIELDS)
+            changes, joined = {}, []
+            for issue in fetched:
+                parent = (issue.get('fields', {}).get('parent') or {}).get('key')
+                previous_parent = parents.get(issue['key'])
+                if issue['key'] == root or parent == previous_parent:
+                    continue
+                if previous_parent is not None:
+                    changes.setdefault(previous_parent, list(index.get(previous_parent))).remove(issue['key'])
+                if parent in expanded:
+                    changes.setdefault(parent, list(index.get(parent))).append(issue['key'])
+                    if issue['key'] not in parents:
+                        joined.append((issue['key'], levels[parent] + 1))
+            # subtrees of issues that joined the tree, and of issues on the frontier of a tree
+            # walked to a shallower depth before
+            frontier = [(node, level) for node, level in levels.items() if node not in expanded]
+            walks = collections.defaultdict(list)
+            for node, level in (joined + frontier):
+                if remaining_depth(level) is None or remaining_depth(level) > 0:
+                    walks[remaining_depth(level)].append(node)
+            for subtree_changes, subtree_issues in await asyncio.gather(*(walk_issue_tree(client, walk_roots, walk_depth) for walk_depth, walk_roots in walks.items())):
+                changes.update(subtree_changes)
+                fetched.extend(subtree_issues)
+    store_issue_fields(fetched)
+    changes[refreshed_key] = {'refreshed': started, 'depth': depth}
+    index.update(changes)
+    return fetched
+
+def describe_cached_issue(issue_name):
+    """Returns a line describing an issue (key, summary, type, and status) from cache.
+    """
+    fields = Cache(issue_name, lazy=True).select(['fields.summary', 'fields.status', 'fields.issuetype'])
+    return '{} {} [{}{}]'.format(
+        colorise(COLOR_ISSUE_KEY, issue_name),
+        (fields['fields.summary'] or ''),
+        ('{}: '.format(fields['fields.issuetype']['name']) if fields['fields.issuetype'] else ''),
+        colorise(COLOR_STATUS, (fields['fields.status'] or {}).get('name', '?')),
+    )
+
+def display_issue_tree(index, root, depth=None):
+    seen = {root}
+    def display_children(issue_name, prefix, depth):
+        if depth is not None and depth <= 0:
+            return
+        children = sorted((child for child in index.get(issue_name, []) if child not in seen), key=issue_key_sort_key)
+        seen.update(children)
+        for i, child in enumerate(children):
+            last = (i == len(children) - 1)
+            renderer.line('{}{}{}'.format(prefix, ('`-- ' if last else '|-- '), describe_cached_issue(child)))
+            display_children(child, (prefix + ('    ' if last else '|   ')), (None if depth is None else depth - 1))
+
+    renderer.line(describe_cached_issue(root))
+    display_children(root, '', depth)
+    renderer.flush()
+
+def commandTree(ui):
+    ui = ui.down()
+    root = expand_issue_name(ui.operands()[0])
+    depth = (ui.get('--depth') if '--depth' in ui else None)
+    with AdjacencyIndex('tree') as index:
+        if '--cached' not in ui:
+            try:
+                asyncio.run(refresh_issue_tree(index, root, depth, jobs=get_jobs(ui, 8), rebuild=('--rebuild' in ui)))
+            except SearchException as e:
+                print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), e.args[0]))
+                print(e.args[1])
+                exit(1)
+        elif index.get('{}@refreshed'.format(root)) is None:
+            error_and_exit('tree of {} is not cached'.format(root))
+        display_issue_tree(index, root, depth)
+
+
+def walk_issue_links(index, root, depth=None, follow=None, fetch=None):
+    """Walks links of issues in the links index breadth first, starting from `root`.
+    Links for which follow(link) returns false are skipped.
+    Issues missing from the index are read from the issue cache or, if not cached either,
+    passed (a level at a time) to fetch(list of issue names), which should store them.
+    Returns a dictionary mapping reached issues to (issue they were reached from, link) pairs.
+    """
+    reached, level = {root: None}, [root]
+    while level:
+        missing = [issue_name for issue_name in level if index.get(issue_name) is None]
+        backfilled = []
+        for issue_name in missing:
+            links = Cache(issue_name, lazy=True).select(['fields.issuelinks'])['fields.issuelinks']
+            if links is not None:
+                backfilled.append((issue_name, {'issuelinks': links},))
+        missing = sorted(set(missing) - set(issue_name for issue_name, _ in backfilled))
+        if backfilled:
+            update_links_index(backfilled)
+        if missing and fetch is not None:
+            fetch(missing)
+        if backfilled or (missing and fetch is not None):
+            index.reload()
+        if depth is not None and depth <= 0:
+            break
+        next_level = []
+        for issue_name in level:
+            for link in index.get(issue_name, []):
+                if link[3] not in reached and (follow is None or follow(link)):
+                    reached[link[3]] = (issue_name, link,)
+                    next_level.append(link[3])
+        level = next_level
+        depth = (None if depth is None else depth - 1)
+    return reached
+
+def is_blocker_link(link):
+    link_type, direction, _, _ = link
+    return (link_type.lower() == 'blocks' and direction == 'inward')
+
+def commandDeps(ui):
+    ui = ui.down()
+    root = expand_issue_name(ui.operands()[0])
+    depth = (ui.get('--depth') if '--depth' in ui else None)
+    jobs = get_jobs(ui, 8)
+
+    failed = []
+    def report(issue_name, error):
+        if error is not None:
+            failed.append(issue_name)
+    def fetch(issue_names):
+        fetch_issues(issue_names, jobs=jobs, report=report)
+
+    with AdjacencyIndex('links') as index:
+        reached = walk_issue_links(index, root, depth,
+            follow=(is_blocker_link if '--blocked-only' in ui else None),
+            fetch=(None if '--cached' in ui else fetch),
+        )
+        if index.get(root) is None:
+            error_and_exit('links of {} are not {}'.format(root, ('cached' if '--cached' in ui else 'available')))
+
+    children = {}
+    for issue_name, via in reached.items():
+        if via is not None:
+            children.setdefault(via[0], []).append((issue_name, via[1]))
+    def display_children(issue_name, prefix):
+        linked = sorted(children.get(issue_name, []), key=lambda each: issue_key_sort_key(each[0]))
+        for i, (child, link) in enumerate(linked):
+            last = (i == len(linked) - 1)
+            renderer.line('{}{}{} {}'.format(prefix, ('`-- ' if last else '|-- '), link[2], describe_cached_issue(child)))
+            display_children(child, (prefix + ('    ' if last else '|   ')))
+
+    renderer.line(describe_cached_issue(root))
+    display_children(root, '')
+    renderer.flush()
+    for issue_name in failed:
+        print('{}: failed to fetch issue {}'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ISSUE_KEY, issue_name)))
+
+def get_attachment_filename(attachment, duplicated=False):
+    """Returns name of the file an attachment is saved to.
+    Names are reduced to their last component so that attachments are never saved outside of the
+    output directory, and attachments sharing a name are prefixed with their ids.
+    """
+    filename = os.path.basename(str(attachment.get('filename', '')).replace('\\', '/'))
+    if filename in ('', '.', '..'):
+        return str(attachment['id'])
+    return ('{}-{}'.format(attachment['id'], filename) if duplicated else filename)
+
+def commandAttachments(ui):
+    ui = ui.down()
+    issue_name = expand_issue_name(ui.operands()[0])
+    jobs = get_jobs(ui, 4)
+    try:
+        response = connection.issue(issue_name, fields=['attachment'])
+    except IssueNotFoundException as e:
+        error_and_exit(e.args[1])
+    except IssueException as e:
+        error_and_exit('HTTP {}'.format(e.args[1]))
+    store_issue_fields([response])
+    attachments = (response.get('fields', {}).get('attachment') or [])
+    store = AttachmentStore()
+
+    if '--get' not in ui and '--all' not in ui:
+        for attachment in attachments:
+            author = (attachment.get('author') or {})
+            renderer.line('{:>8} {:>10} {} {} ({}, {}, {})'.format(
+                attachment['id'],
+                format_size(attachment.get('size', 0)),
+                ('*' if store.lookup(attachment) else ' '),
+                colorise(COLOR_LABEL, attachment.get('filename', '')),
+                attachment.get('mimeType', ''),
+                author.get('displayName', ''),
+                attachment.get('created', '')[:19].replace('T', ' '),
+            ))
+        renderer.flush()
+        return
+
+    selected = attachments
+    if '--get' in ui:
+        name = ui.get('--get')
+        selected = [each for each in attachments if each.get('filename') == name or str(each['id']) == name]
+        if not selected:
+            error_and_exit('no attachment named {} in {}'.format(name, issue_name))
+    output_dir = (ui.get('--output') if '--output' in ui else '.')
+    os.makedirs(output_dir, exist_ok=True)
+    names = collections.Counter(get_attachment_filename(each) for each in selected)
+
+    client = JiraClient(settings, pool_size=jobs)
+    if CASSETTE is None or not CASSETTE.replaying():
+        # ask for missing credentials now, not from worker threads
+        client._auth()
+    def get(attachment):
+        path = store.lookup(attachment)
+        downloaded = (path is None)
+        if downloaded:
+            path = store.download(client, issue_name, attachment)
+        destination = os.path.join(output_dir, get_attachment_filename(attachment, duplicated=(names[get_attachment_filename(attachment)] > 1)))
+        copy_if_changed(path, destination)
+        return (destination, downloaded)
+
+    downloaded_count, downloaded_bytes, stored_count, failed = 0, 0, 0, False
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='jiraline') as executor:
+            futures = dict((executor.submit(get, attachment), attachment) for attachment in selected)
+            for future in concurrent.futures.as_completed(futures):
+                attachment = futures[future]
+                try:
+                    destination, downloaded = future.result()
+                except (JIRALineException, requests.exceptions.RequestException, OSError) as e:
+                    failed = True
+                    reason = ('HTTP {}'.format(e.args[0]) if isinstance(e, AttachmentException) and e.args[0] is not None else
+                              e.args[1] if isinstance(e, AttachmentException) else e)
+                    print('{}: failed to download {}: {}'.format(colorise(COLOR_ERROR, 'error'), attachment.get('filename'), reason))
+                    continue
+                if downloaded:
+                    downloaded_count += 1
+                    downloaded_bytes += attachment.get('size', 0)
+                else:
+                    stored_count += 1
+                if '--verbose' in ui:
+                    print('{} {}'.format(('downloaded' if downloaded else 'stored'), destination))
+    finally:
+        store.save()
+        client.close()
+    print('{}: downloaded {} attachment(s) ({}), {} already stored'.format(colorise(COLOR_NOTE, 'note'), downloaded_count, format_size(downloaded_bytes), stored_count))
+    if failed:
+        exit(1)
+
+EXPORTED_FIELDS = ['summary', 'status', 'assignee', 'priority', 'created', 'updated']
+
+def flatten_field_value(value):
+    """Converts value of an issue field to a single string (used for CSV output).
+    """
+    if value is None:
+        return ''
+    if isinstance(value, dict):
+        for k in ('displayName', 'name', 'value', 'key',):
+            if k in value:
+                return str(value[k])
+        return json.dumps(value, sort_keys=True)
+    if isinstance(value, list):
+        return ', '.join(flatten_field_value(each) for each in value)
+    return str(value)
+
+def issue_key_sort_key(issue_key):
+    project, _, number = issue_key.rpartition('-')
+    return ((project, int(number),) if number.isdigit() else (issue_key, 0,))
+
+def iter_cached_issues(fields, project=None):
+    """Yields issues stored in cache (in the format of search results), ordered by key.
+    """
+    issue_keys = [issue_key for issue_key, _, _ in Cache.entries()
+                  if project is None or issue_key.startswith('{}-'.format(project))]
+    keys = ['fields.{}'.format(field) for field in fields]
+    for issue_key in sorted(set(issue_keys), key=issue_key_sort_key):
+        selected = Cache(issue_key, lazy=True).select(keys)
+        yield {
+            'key': issue_key,
+            'fields': dict((field, selected[key]) for field, key in zip(fields, keys)),
+        }
+
+def commandExport(ui):
+    ui = ui.down()
+    fields = ([field for field, in ui.get('-F')] if '--field' in ui else EXPORTED_FIELDS)
+    output_format = (ui.get('--format') if '--format' in ui else 'ndjson')
+    if output_format not in ('ndjson', 'csv',):
+        error_and_exit('unknown export format: {}'.format(output_format))
+
+    if '--cached' in ui:
+        unsupported = [option for option in ('--assignee', '--reporter', '--key-upper', '--key-lower', '--priority', '--status', '--jql',) if option in ui]
+        if unsupported:
+            error_and_exit('cannot filter cached issues with: {}'.format(', '.join(unsupported)))
+        issues = iter_cached_issues(fields, project=(ui.get('-p') if '-p' in ui else None))
+    else:
+        jql = ' AND '.join(build_search_conditions(ui))
+        if '--debug' in ui:
+            print(jql, file=sys.stderr)
+        jobs = get_jobs(ui, 4)
+        issues = (iter_search_concurrently(jql, fields, jobs) if jobs > 1 else connection.search(jql, fields))
+
+    ofstream = None
+    output = renderer
+    if '--output' in ui:
+        ofstream = open(ui.get('-o'), 'w', encoding='utf-8')
+        output = Renderer(ofstream)
+
+    if output_format == 'csv':
+        row_buffer = io.StringIO()
+        writer = csv.writer(row_buffer, lineterminator='')
+        def format_row(values):
+            row_buffer.seek(0)
+            row_buffer.truncate()
+            writer.writerow(values)
+            return row_buffer.getvalue()
+        def format_record(issue):
+            issue_fields = issue.get('fields', {})
+            return format_row([issue['key']] + [flatten_field_value(issue_fields.get(field)) for field in fields])
+        output.line(format_row(['key'] + fields))
+    else:
+        def format_record(issue):
+            record = {'key': issue['key']}
+            issue_fields = issue.get('fields', {})
+            for field in fields:
+                record[field] = issue_fields.get(field)
+            return json.dumps(record)
+
+    exported = 0
+    try:
+        for issue in issues:
+            output.line(format_record(issue))
+            exported += 1
+    except SearchException as e:
+        output.flush()
+        print('{}: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), e.args[0]), file=sys.stderr)
+        print(e.args[1], file=sys.stderr)
+        exit(1)
+    finally:
+        output.flush()
+        if ofstream is not None:
+            ofstream.close()
+    if '--verbose' in ui:
+        print('{}: exported {} issue(s)'.format(colorise(COLOR_NOTE, 'note'), exported), file=sys.stderr)
+
+
+class CacheProjection:
+    """Columnar projection of cached issues used for local statistics.
+
+    Every column stores distinct values once (interned) and an array of value codes
+    with one code per issue, so filtering and grouping work on small integers.
+    The projection is kept in the cache directory and refreshed incrementally: only issues
+    whose cache files changed since the last run are read again.
+    """
+    # column name -> (cached field, function extracting (value, id) from field value)
+    COLUMNS = collections.OrderedDict((
+        ('project', ('project', lambda v: ((v or {}).get('key', ''), (v or {}).get('id')),),),
+        ('type', ('issuetype', lambda v: ((v or {}).get('name', ''), (v or {}).get('id')),),),
+        ('status', ('status', lambda v: ((v or {}).get('name', ''), (v or {}).get('id')),),),
+        ('priority', ('priority', lambda v: ((v or {}).get('name', ''), (v or {}).get('id')),),),
+        ('assignee', ('assignee', lambda v: ((v or {}).get('name', ''), None),),),
+        ('reporter', ('reporter', lambda v: ((v or {}).get('name', ''), None),),),
+    ))
+    VERSION = 1
+    # modification times closer than this to the time of refresh are not trusted
+    # as they could be updated again without changing (coarse timestamps)
+    RACY_WINDOW = 2
+
+    def __init__(self):
+        self.directory_mtime = None
+        self.keys = []
+        self.mtimes = []
+        self.numbers = array.array('l')
+        self.values = dict((column, [],) for column in CacheProjection.COLUMNS)
+        self.ids = dict((column, [],) for column in CacheProjection.COLUMNS)
+        self.codes = dict((column, array.array('l'),) for column in CacheProjection.COLUMNS)
+        self._interned = dict((column, {},) for column in CacheProjection.COLUMNS)
+
+    @staticmethod
+    def path():
+        return os.path.join(Cache.dir(), 'index', 'projection.jlc')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _intern(self, column, value, value_id):
+        interned = self._interned[column]
+        code = interned.get(value)
+        if code is None:
+            code = interned[value] = len(self.values[column])
+            self.values[column].append(value)
+            self.ids[column].append(value_id)
+        return code
+
+    def _append(self, issue_key, mtime, fields):
+        self.keys.append(issue_key)
+        self.mtimes.append(mtime)
+        number = issue_key.rpartition('-')[2]
+        self.numbers.append(int(number) if number.isdigit() else 0)
+        for column, (field, extract) in CacheProjection.COLUMNS.items():
+            value, value_id = extract(fields.get('fields.{}'.format(field)))
+            if column == 'project' and not value:
+                value = issue_key.rpartition('-')[0]
+            self.codes[column].append(self._intern(column, value, value_id))
+
+    def load(self):
+        if not os.path.isfile(CacheProjection.path()):
+            return self
+        with TRACE.span('stats.load'), SegmentFile(CacheProjection.path()) as segments:
+            if segments.get('version') != CacheProjection.VERSION:
+                return self
+            self.directory_mtime = segments.get('directory_mtime')
+            self.keys = segments.get('keys')
+            self.mtimes = segments.get('mtimes')
+            self.numbers = array.array('l', segments.get('numbers'))
+            for column in CacheProjection.COLUMNS:
+                self.values[column] = segments.get('{}.values'.format(column))
+                self.ids[column] = segments.get('{}.ids'.format(column))
+                self.codes[column] = array.array('l', segments.get('{}.codes'.format(column)))
+                self._interned[column] = dict((value, code) for code, value in enumerate(self.values[column]))
+        return self
+
+    def store(self):
+        os.makedirs(os.path.dirname(CacheProjection.path()), exist_ok=True)
+        items = [('version', CacheProjection.VERSION), ('directory_mtime', self.directory_mtime), ('keys', self.keys), ('mtimes', self.mtimes), ('numbers', self.numbers.tolist())]
+        for column in CacheProjection.COLUMNS:
+            items.append(('{}.values'.format(column), self.values[column]))
+            items.append(('{}.ids'.format(column), self.ids[column]))
+            items.append(('{}.codes'.format(column), self.codes[column].tolist()))
+        with TRACE.span('stats.store'):
+            SegmentFile.write(CacheProjection.path(), items)
+        return self
+
+    def refresh(self):
+        """Brings projection up to date with the cache; returns number of issues read again.
+        """
+        with TRACE.span('stats.refresh'):
+            # cache files are replaced (not rewritten in place) when stored so every change
+            # updates modification time of the cache directory
+            try:
+                directory_mtime = os.stat(Cache.dir()).st_mtime_ns
+            except FileNotFoundError:
+                directory_mtime = None
+            if directory_mtime is not None and directory_mtime == self.directory_mtime:
+                return 0
+            if directory_mtime is not None and (time.time_ns() - directory_mtime) < CacheProjection.RACY_WINDOW * 10**9:
+                directory_mtime = None
+            current = {}
+            for issue_key, path, st in Cache.entries():
+                if issue_key not in current or path.endswith('.jlc'):
+                    current[issue_key] = st.st_mtime_ns
+            kept = [i for i, issue_key in enumerate(self.keys) if current.get(issue_key) == self.mtimes[i]]
+            if len(kept) == len(self.keys) == len(current):
+                if directory_mtime != self.directory_mtime:
+                    self.directory_mtime = directory_mtime
+                    self.store()
+                return 0
+            keys, mtimes, numbers, values, ids, codes = self.keys, self.mtimes, self.numbers, self.values, self.ids, self.codes
+            # rebuild columns from scratch so values of removed issues are dropped
+            self.__init__()
+            self.directory_mtime = directory_mtime
+            for i in kept:
+                self.keys.append(keys[i])
+                self.mtimes.append(mtimes[i])
+                self.numbers.append(numbers[i])
+                for column in CacheProjection.COLUMNS:
+                    code = codes[column][i]
+                    self.codes[column].append(self._intern(column, values[column][code], ids[column][code]))
+            fields = ['fields.{}'.format(field) for field, _ in CacheProjection.COLUMNS.values()]
+            kept_keys = set(self.keys)
+            changed = [issue_key for issue_key in current if issue_key not in kept_keys]
+            for issue_key in changed:
+                self._append(issue_key, current[issue_key], Cache(issue_key, lazy=True).select(fields))
+        self.store()
+        return len(changed)
+
+    def matching(self, column, wanted):
+        """Returns codes of values of column matching (case-insensitively) any of wanted names or ids.
+        """
+        wanted = set(str(each).lower() for each in wanted)
+        return set(code for code, (value, value_id) in enumerate(zip(self.values[column], self.ids[column]))
+                   if value.lower() in wanted or (value_id is not None and str(value_id).lower() in wanted))
+
+    def select(self, filters=(), lower=None, upper=None):
+        """Returns list of selectors (one boolean per issue) for issues matching all filters, or
+        None if there are no filters.
+        Filters are (column, wanted values) pairs; lower and upper are bounds for issue keys.
+        """
+        selectors = None
+        conditions = []
+        for column, wanted in filters:
+            codes = self.matching(column, wanted)
+            conditions.append([code in codes for code in self.codes[column]])
+        for bound, compare in ((lower, (lambda a, b: a >= b),), (upper, (lambda a, b: a <= b),),):
+            if bound is None:
+                continue
+            project, _, number = bound.rpartition('-')
+            codes = self.matching('project', [project])
+            conditions.append([(code in codes and compare(n, int(number))) for code, n in zip(self.codes['project'], self.numbers)])
+        for condition in conditions:
+            selectors = (condition if selectors is None else [a and b for a, b in zip(selectors, condition)])
+        return selectors
+
+    def group(self, columns, selectors=None):
+        """Counts issues by values of columns; returns list of (values, count) pairs, largest groups first.
+        """
+        with TRACE.span('stats.group', columns=','.join(columns)):
+            rows = zip(*(self.codes[column] for column in columns))
+            if selectors is not None:
+                rows = itertools.compress(rows, selectors)
+            counts = collections.Counter(rows)
+        return [(tuple(self.values[column][code] for column, code in zip(columns, codes)), count) for codes, count in
+                sorted(counts.items(), key=lambda each: (-each[1], each[0]))]
+
+def commandStats(ui):
+    ui = ui.down()
+    group_by = [column.strip() for column in (ui.get('-g') if '--group-by' in ui else 'status').split(',') if column.strip()]
+    unknown = [column for column in group_by if column not in CacheProjection.COLUMNS]
+    if unknown:
+        error_and_exit('cannot group by: {} (available columns: {})'.format(', '.join(unknown), ', '.join(CacheProjection.COLUMNS)))
+
+    # same filters as search (see build_search_conditions()), evaluated locally
+    first = lambda seq: seq[0]
+    filters = []
+    if '-p' in ui:
+        filters.append(('project', [ui.get('-p')],))
+    if '-P' in ui:
+        filters.append(('priority', list(map(first, ui.get('-P'))),))
+    if '-a' in ui:
+        filters.append(('assignee', [ui.get('-a')],))
+    if '--reporter' in ui:
+        filters.append(('reporter', [ui.get('-r')],))
+    if '-s' in ui:
+        filters.append(('status', list(map(first, ui.get('-s'))),))
+    lower = (expand_issue_name(ui.get('-L'), ui.get('-p')) if '--key-lower' in ui else None)
+    upper = (expand_issue_name(ui.get('-U'), ui.get('-p')) if '--key-upper' in ui else None)
+    for bound in (lower, upper):
+        # bounds are compared by project and number
+        project, _, number = (bound or '').rpartition('-')
+        if bound is not None and not (project and number.isdigit()):
+            error_and_exit('invalid issue key: {}'.format(bound))
+
+    projection = CacheProjection().load()
+    refreshed = projection.refresh()
+    if '--verbose' in ui:
+        print('{}: {} cached issue(s), {} read again'.format(colorise(COLOR_NOTE, 'note'), len(projection), refreshed))
+    groups = projection.group(group_by, projection.select(filters, lower=lower, upper=upper))
+
+    header = group_by + ['count']
+    rows = [[(value or '(none)') for value in values] + [str(count)] for values, count in groups]
+    widths = [max([len(row[i]) for row in rows] + [len(header[i])]) for i in range(len(header))]
+    with TRACE.span('display.stats'):
+        renderer.line(' | '.join(column.ljust(width) for column, width in zip(header, widths)))
+        renderer.line('-+-'.join('-' * width for width in widths))
+        for row in rows:
+            renderer.line(' | '.join([value.ljust(width) for value, width in zip(row[:-1], widths)] + [row[-1].rjust(widths[-1])]))
+        renderer.line('{}: {} issue(s) in {} group(s)'.format(colorise(COLOR_NOTE, 'note'), sum(count for _, count in groups), len(groups)))
+        renderer.flush()
 
 
 def get_current_git_branch():
@@ -1103,8 +3933,8 @@ def commandSlug(ui):
     issue_name = expand_issue_name(ui.operands()[0])
     store_last_active_issue_marker(issue_name)
 
-    cached = Cache(issue_name)
-    issue_message = cached.get('fields', 'summary')
+    cached = Cache(issue_name, lazy=True)
+    issue_message = cached.peek('fields', 'summary')
     if not issue_message:
         print('{}: message for issue {} not available, fetching'.format(colorise(COLOR_WARNING, 'warning'), colorise_repr(COLOR_ISSUE_KEY, issue_name)))
         issue_message = fetch_summary(issue_name)
@@ -1178,6 +4008,82 @@ def commandSlug(ui):
         print(issue_slug)
 
 
+def get_slug_formats():
+    """Returns list of configured slug formats (including the default one).
+    """
+    default_slug_format = 'issue/{issue_key}/{slug}'
+    formats = [each for each in settings.get('slug', {}).get('format', {}).values() if not each.startswith('@')]
+    return formats + ([default_slug_format] if default_slug_format not in formats else [])
+
+def get_issue_name_from_branch(branch_name):
+    """Returns key of the issue a branch was created for (see "slug" command), or None if
+    the branch name does not match any slug format that includes issue key.
+    """
+    for slug_format in get_slug_formats():
+        if '{issue_key}' not in slug_format:
+            continue
+        pattern = ''.join(
+            {'{issue_key}': '(?P<issue_key>[a-z][a-z0-9_]*-[0-9]+)', '{slug}': '[^/]*'}.get(part, re.escape(part))
+            for part in re.split('({issue_key}|{slug})', slug_format)
+        )
+        try:
+            match = re.fullmatch(pattern, branch_name, re.IGNORECASE)
+        except re.error:
+            continue
+        if match is not None:
+            return match.group('issue_key').upper()
+    return None
+
+# Marks hooks installed by Jiraline (other hooks are never overwritten nor removed).
+HOOK_MARKER = '# installed by jiraline'
+
+def get_git_hook_path(hook_name):
+    p = subprocess.Popen(('git', 'rev-parse', '--git-path', 'hooks'), stdout=subprocess.PIPE)
+    output, _ = p.communicate()
+    if p.wait() != 0:
+        print('error: Git error')
+        exit(1)
+    return os.path.join(output.decode('utf-8').strip(), hook_name)
+
+def is_jiraline_hook(path):
+    with open(path) as ifstream:
+        return HOOK_MARKER in ifstream.read()
+
+def commandHook(ui):
+    ui = ui.down()
+    hook_path = get_git_hook_path('post-checkout')
+    if str(ui) == 'install':
+        if os.path.exists(hook_path) and not is_jiraline_hook(hook_path) and '--force' not in ui:
+            error_and_exit('{} already exists (use --force to replace it)'.format(hook_path))
+        # the hook returns immediately, Jiraline runs in background so checkout is not slowed down
+        write_file_atomically(hook_path, '\n'.join([
+            '#!/bin/sh',
+            HOOK_MARKER,
+            '({} hook post-checkout "$@" </dev/null >/dev/null 2>&1 &)'.format(' '.join(shlex.quote(each) for each in (sys.executable, os.path.abspath(__file__)))),
+            '',
+        ]))
+        os.chmod(hook_path, 0o755)
+        if '--verbose' in ui:
+            print('{}: installed {}'.format(colorise(COLOR_NOTE, 'note'), hook_path))
+    elif str(ui) == 'uninstall':
+        if os.path.exists(hook_path) and is_jiraline_hook(hook_path):
+            os.unlink(hook_path)
+        elif os.path.exists(hook_path):
+            error_and_exit('{} was not installed by Jiraline'.format(hook_path))
+    elif str(ui) == 'post-checkout':
+        _, _, branch_checkout = ui.operands()
+        if branch_checkout != '1':
+            return
+        issue_name = get_issue_name_from_branch(get_current_git_branch())
+        if issue_name is None:
+            return
+        store_last_active_issue_marker(issue_name)
+        fetch_issues([issue_name], jobs=1, report=(lambda issue_name, error: None))
+    else:
+        installed = (os.path.exists(hook_path) and is_jiraline_hook(hook_path))
+        print('post-checkout: {}'.format(colorise('green', 'installed') if installed else colorise('light_red', 'not installed')))
+
+
 def commandEstimate(ui):
     ui = ui.down()
     issue_name = expand_issue_name(ui.operands()[0])
@@ -1191,7 +4097,9 @@ def commandEstimate(ui):
         "adjustEstimate":"new",
         "newEstimate":estimation_time
     }
-    r = connection.post('/rest/api/2/issue/{}/worklog'.format(issue_name),params=request_params,json=request_content)
+    r = submit_write(issue_name, 'estimate', 'post', '/rest/api/2/issue/{}/worklog'.format(issue_name), params=request_params, json=request_content)
+    if r is None:
+        return
     if r.status_code == 400:
         print('error: the input is invalid (e.g. missing required fields, invalid values, and so forth).')
         exit(1)
@@ -1204,28 +4112,75 @@ def commandEstimate(ui):
 
 
 def commandPin(ui):
-    jiraline_config_directory = os.path.expanduser(os.path.join('~', '.config', 'jiraline'))
-    if not os.path.isdir(jiraline_config_directory):
-        os.makedirs(jiraline_config_directory, exist_ok=True)
-
-    pins_path = os.path.join(jiraline_config_directory, 'pinned.json')
-    pins = {}
-    if os.path.isfile(pins_path):
-        with open(pins_path) as ifstream:
-            pins = json.loads(ifstream.read())
-
-    if '--un' in ui:
-        issue_name = expand_issue_name(ui.get('--un'))
-        del pins[issue_name]
-    elif ui.operands():
-        pins[expand_issue_name(ui.operands()[0])] = (ui.get('-m') or '').strip()
-    else:
+    if '--un' not in ui and not ui.operands():
+        pins = load_pins()
         for k in sorted(pins.keys()):
             note = pins[k]
             print('{}{}'.format(colorise(COLOR_ISSUE_KEY, k), ((': ' + note) if note else '')))
+        return
+
+    with modified_pins() as pins:
+        if '--un' in ui:
+            issue_name = expand_issue_name(ui.get('--un'))
+            del pins[issue_name]
+        else:
+            pins[expand_issue_name(ui.operands()[0])] = (ui.get('-m') or '').strip()
 
-    with open(pins_path, 'w') as ofstream:
-        ofstream.write(json.dumps(pins))
+
+def commandCache(ui):
+    ui = ui.down()
+    max_bytes, max_entries = get_cache_budget()
+    if str(ui) == 'gc':
+        if '--max-bytes' in ui:
+            max_bytes = parse_size(ui.get('--max-bytes'))
+        if '--max-entries' in ui:
+            max_entries = ui.get('--max-entries')
+        if max_bytes is None and max_entries is None:
+            print('{}: no cache budget set'.format(colorise(COLOR_ERROR, 'error')))
+            print('{}: set "cache.max_bytes" or "cache.max_entries" in config, or use --max-bytes and --max-entries'.format(colorise(COLOR_NOTE, 'note')))
+            exit(1)
+        evicted = collect_cache_garbage(max_bytes, max_entries, dry_run=('--dry-run' in ui))
+        if '--verbose' in ui or '--dry-run' in ui:
+            for issue_key, size in evicted:
+                print('{} {}'.format(('would evict' if '--dry-run' in ui else 'evicted'), colorise(COLOR_ISSUE_KEY, issue_key)))
+        print('{}: {} {} entries ({})'.format(colorise(COLOR_NOTE, 'note'), ('would evict' if '--dry-run' in ui else 'evicted'), len(evicted), format_size(sum(size for _, size in evicted))))
+    elif str(ui) == 'clear':
+        pins = (load_pins() if '--keep-pinned' in ui else {})
+        removed = 0
+        for issue_key, path, _ in list(Cache.entries()):
+            if issue_key in pins:
+                continue
+            os.unlink(path)
+            removed += 1
+        for entry_cache in ISSUE_ENTRY_CACHES:
+            for issue_key, path, _ in list(entry_cache.entries()):
+                if issue_key not in pins:
+                    os.unlink(path)
+        # indexes (issue trees, links) are rebuilt from fetched issues
+        shutil.rmtree(os.path.join(Cache.dir(), 'index'), ignore_errors=True)
+        if pins:
+            # attachments of pinned issues are kept, and so is content they share with other issues
+            store = AttachmentStore()
+            store.remove(set(store.issues()) - set(pins))
+        else:
+            shutil.rmtree(AttachmentStore.dir(), ignore_errors=True)
+        if '--verbose' in ui:
+            print('{}: removed {} entries'.format(colorise(COLOR_NOTE, 'note'), removed))
+    else:
+        pins = load_pins()
+        entries = list(Cache.entries())
+        attachment_sizes = dict(each for stored in AttachmentStore().issues().values() for each in stored)
+        total_bytes = sum(st.st_size for _, _, st in entries) + sum(st.st_size for entry_cache in ISSUE_ENTRY_CACHES for _, _, st in entry_cache.entries()) + sum(attachment_sizes.values())
+        print('entries:  {} ({} pinned)'.format(len(entries), len([each for each in entries if each[0] in pins])))
+        print('size:     {} (attachments: {})'.format(format_size(total_bytes), format_size(sum(attachment_sizes.values()))))
+        print('budget:   {}, {}'.format(
+            ('{} entries'.format(max_entries) if max_entries is not None else 'unlimited entries'),
+            (format_size(max_bytes) if max_bytes is not None else 'unlimited size'),
+        ))
+        if entries:
+            access_times = sorted(st.st_atime for _, _, st in entries)
+            print('accessed: {} .. {}'.format(*(datetime.datetime.fromtimestamp(each).strftime('%Y-%m-%d %H:%M:%S') for each in (access_times[0], access_times[-1]))))
+        print('path:     {}'.format(Cache.dir()))
 
 
 def colorise_percentage(s, percentage):
@@ -1252,60 +4207,214 @@ def colorise_percentage(s, percentage):
 
 def commandFetch(ui):
     ui = ui.down()
-    total_isues_to_fetch = len(ui.operands())
-    for i, issue_name in enumerate(ui.operands()):
-        issue_name = expand_issue_name(issue_name)
-        if '--lazy' in ui and Cache(issue_name, lazy=True).is_cached():
-            continue
-        try:
-            if '--verbose' in ui or total_isues_to_fetch > 1:
-                percent_complete = round(((i+1)/total_isues_to_fetch*100), 2)
-                print('fetching {} ({}/{} ~{}%)'.format(colorise(COLOR_ISSUE_KEY, issue_name), i+1, total_isues_to_fetch, colorise_percentage(percent_complete, percent_complete)))
-            fetch_issue(issue_name, fatal=False)
-        except IssueException:
+    issue_names = [expand_issue_name(issue_name) for issue_name in ui.operands()]
+    if '--lazy' in ui:
+        issue_names = [issue_name for issue_name in issue_names if not Cache(issue_name, lazy=True).is_cached()]
+    total_isues_to_fetch = len(issue_names)
+    fetched = 0
+    def report(issue_name, error):
+        nonlocal fetched
+        fetched += 1
+        if error is not None:
             print('{}: failed to fetch issue {}'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ISSUE_KEY, issue_name)))
+        elif '--verbose' in ui or total_isues_to_fetch > 1:
+            percent_complete = round((fetched/total_isues_to_fetch*100), 2)
+            print('fetched {} ({}/{} ~{}%)'.format(colorise(COLOR_ISSUE_KEY, issue_name), fetched, total_isues_to_fetch, colorise_percentage(percent_complete, percent_complete)))
+    if issue_names:
+        fetch_issues(issue_names, jobs=get_jobs(ui, 8), report=report)
+
+# Issues touched this long ago count half as much as issues touched now when ranking them for warming.
+WARM_HALF_LIFE = 3 * 24 * 3600
+
+def rank_issues_for_warming(now=None):
+    """Returns list of (issue key, score) tuples, most likely to be needed first.
+    Every event in the shortlog journal adds to the score of its issue, with weight halving
+    every WARM_HALF_LIFE seconds, so both frequently and recently touched issues rank high.
+    Pinned issues get a bonus equal to being touched right now.
+    """
+    now = (now or timestamp())
+    scores = collections.Counter()
+    with open(ensure_shortlog_journal()) as ifstream:
+        for line in ifstream:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get('issue') and event.get('event') != 'fetch':
+                scores[event['issue']] += 0.5 ** (max(0, now - event.get('timestamp', now)) / WARM_HALF_LIFE)
+    for issue_name in load_pins():
+        scores[issue_name] += 1
+    return sorted(scores.items(), key=lambda each: (-each[1], issue_key_sort_key(each[0])))
+
+def spawn_detached(argv):
+    """Runs Jiraline with given arguments in a new session, without waiting for it and
+    without attaching it to the terminal.
+    """
+    subprocess.Popen([sys.executable, os.path.abspath(__file__)] + list(argv),
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True, close_fds=True)
+
+def commandWarm(ui):
+    ui = ui.down()
+    count = (ui.get('--count') if '--count' in ui else 10)
+    jobs = get_jobs(ui, 8)
+    max_age = (ui.get('--max-age') if '--max-age' in ui else 600)
+    ranked = rank_issues_for_warming()[:count]
+
+    if '--list' in ui:
+        for issue_name, score in ranked:
+            print('{} {:.2f}'.format(colorise(COLOR_ISSUE_KEY, issue_name), score))
+        return
+    if '--background' in ui:
+        spawn_detached(['warm', '--count', str(count), '--jobs', str(jobs), '--max-age', str(max_age)])
+        return
+
+    try:
+        with file_lock(os.path.join(Cache.dir(), 'warm'), blocking=False):
+            # issues fetched recently enough are not refreshed
+            fresh_since = time.time() - max_age
+            issue_names = []
+            for issue_name, _ in ranked:
+                try:
+                    if os.stat(Cache(issue_name, lazy=True).path()).st_mtime >= fresh_since:
+                        continue
+                except FileNotFoundError:
+                    pass
+                issue_names.append(issue_name)
+            failed = []
+            def report(issue_name, error):
+                if error is not None:
+                    failed.append(issue_name)
+                elif '--verbose' in ui:
+                    print('refreshed {}'.format(colorise(COLOR_ISSUE_KEY, issue_name)))
+            if issue_names:
+                fetch_issues(issue_names, jobs=jobs, report=report)
+    except BlockingIOError:
+        if '--verbose' in ui:
+            print('{}: cache is already being warmed'.format(colorise(COLOR_NOTE, 'note')))
+        return
+    for issue_name in failed:
+        print('{}: failed to refresh issue {}'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ISSUE_KEY, issue_name)))
+    if '--verbose' in ui:
+        print('{}: refreshed {} of {} issue(s)'.format(colorise(COLOR_NOTE, 'note'), (len(issue_names) - len(failed)), len(ranked)))
+
+
+def push_issue_writes(outbox, entries, retries):
+    """Replays writes for a single issue in order.
+    Stops at the first write that could not be delivered so that later writes are not
+    applied out of order; rejected writes (4xx responses) do not stop the replay.
+    Returns (sent, rejected, pending) lists.
+    """
+    sent, rejected = [], []
+    for i, entry in enumerate(entries):
+        r = outbox.replay(entry, retries=retries)
+        if r is None or r.status_code >= 500 or r.status_code == 429:
+            return (sent, rejected, entries[i:])
+        if 200 <= r.status_code < 300:
+            sent.append(entry)
+        else:
+            rejected.append((entry, r))
+    return (sent, rejected, [])
+
+def commandPush(ui):
+    ui = ui.down()
+    retries = (ui.get('--retries') if '--retries' in ui else 3)
+    jobs = get_jobs(ui, 8)
+    outbox = Outbox()
+    entries = outbox.entries()
+    if '--list' in ui:
+        for entry in entries:
+            print('{} [{}] {} {} {}'.format(
+                colorise(COLOR_ISSUE_KEY, entry['issue']),
+                colorise('cyan', datetime.datetime.utcfromtimestamp(entry['timestamp']).strftime('%Y-%m-%d %H:%M:%S')),
+                entry['action'],
+                entry['method'].upper(),
+                entry['url'],
+            ))
+        return
+    if not entries:
+        if '--verbose' in ui:
+            print('{}: nothing to push'.format(colorise(COLOR_NOTE, 'note')))
+        return
+
+    by_issue = collections.OrderedDict()
+    for entry in entries:
+        by_issue.setdefault(entry['issue'], []).append(entry)
+
+    for instance in sorted(set(entry.get('instance') for entry in entries), key=str):
+        try:
+            client = outbox.client(instance)
+        except KeyError:
+            error_and_exit('unknown instance in outbox: {}'.format(instance))
+        if CASSETTE is None or not CASSETTE.replaying():
+            # ask for credentials before spawning workers
+            client._auth()
+    done_ids, sent_count, rejected_count, failed = [], 0, 0, False
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = dict((executor.submit(push_issue_writes, outbox, issue_entries, retries), issue_name) for issue_name, issue_entries in by_issue.items())
+        for future in concurrent.futures.as_completed(futures):
+            issue_name = futures[future]
+            sent, rejected, pending = future.result()
+            done_ids.extend(each['id'] for each in sent)
+            sent_count += len(sent)
+            rejected_count += len(rejected)
+            for entry, r in rejected:
+                failed = True
+                outbox.reject(entry, r.status_code, r.text)
+                done_ids.append(entry['id'])
+                print('{}: {}: {} rejected: HTTP {}'.format(colorise(COLOR_ERROR, 'error'), colorise(COLOR_ISSUE_KEY, issue_name), entry['action'], r.status_code))
+            if pending:
+                failed = True
+                print('{}: {}: {} write(s) left in outbox'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ISSUE_KEY, issue_name), len(pending)))
+            if '--verbose' in ui and sent:
+                print('{}: pushed {} write(s)'.format(colorise(COLOR_ISSUE_KEY, issue_name), len(sent)))
+    remaining = outbox.remove(done_ids)
+    if '--verbose' in ui or failed:
+        print('{}: pushed {} write(s), {} rejected, {} left in outbox'.format(colorise(COLOR_NOTE, 'note'), sent_count, rejected_count, len(remaining)))
+    if failed:
+        exit(1)
 
 
 def display_shortlog(shortlog, head=None, tail=None):
+    with TRACE.span('display.shortlog'):
+        _display_shortlog(shortlog, head, tail)
+
+def _display_shortlog(shortlog, head, tail):
     if head is not None:
         shortlog = shortlog[:head]
     if tail is not None:
         shortlog = shortlog[tail:]
-    try:
-        for event in shortlog:
-            event_name = event['event']
-            event_description = event['parameters']
-            if event_name == 'show':
-                event_description = ''
-            elif event_name == 'slug':
-                event_description = 'sluggified to {}'.format(colorise_repr(COLOR_LABEL, event['parameters']['slug']))
-            elif event_name == 'transition':
-                event_description = 'to status {}'.format(colorise_repr(COLOR_STATUS, event['parameters']['to']))
-            elif event_name == 'comment':
-                comment_lines = event['parameters']['comment'].splitlines()
-                event_description = '{}'.format(comment_lines[0].strip())
-                if len(comment_lines) > 1:
-                    event_description += ' (...)'
-            elif event_name == 'label-add':
-                event_description = 'added labels {}'.format(', '.join(map(lambda l: colorise_repr(COLOR_LABEL, l), event['parameters']['labels'])))
-            elif event_name == 'open-issue':
-                event_description = 'opened issue: {}'.format(colorise(COLOR_NOTE, event_description.get('summary')))
-            else:
-                # if no special description formatting is provided, just display name of the event
-                event_description = '\b\b'
-            if event_description:
-                event_description = '{}'.format(event_description)
-            event_datetime = datetime.datetime.utcfromtimestamp(event.get('timestamp')).strftime('%Y-%m-%d %H:%M:%S')
-            print('{issue_key} [{event_datetime}] {event_name}: {event_description}'.format(
-                issue_key = colorise(COLOR_ISSUE_KEY, event['issue']),
-                event_datetime = colorise('cyan', event_datetime),
-                event_name = event_name,
-                event_description = event_description,
-            ))
-    except BrokenPipeError as e:
-        # just silence this
-        # this exception is thrown when shortlog is piped to head
-        pass
+    for event in shortlog:
+        event_name = event['event']
+        event_description = event['parameters']
+        if event_name == 'show':
+            event_description = ''
+        elif event_name == 'slug':
+            event_description = 'sluggified to {}'.format(colorise_repr(COLOR_LABEL, event['parameters']['slug']))
+        elif event_name == 'transition':
+            event_description = 'to status {}'.format(colorise_repr(COLOR_STATUS, event['parameters']['to']))
+        elif event_name == 'comment':
+            comment_lines = event['parameters']['comment'].splitlines()
+            event_description = '{}'.format(comment_lines[0].strip())
+            if len(comment_lines) > 1:
+                event_description += ' (...)'
+        elif event_name == 'label-add':
+            event_description = 'added labels {}'.format(', '.join(map(lambda l: colorise_repr(COLOR_LABEL, l), event['parameters']['labels'])))
+        elif event_name == 'open-issue':
+            event_description = 'opened issue: {}'.format(colorise(COLOR_NOTE, event_description.get('summary')))
+        else:
+            # if no special description formatting is provided, just display name of the event
+            event_description = '\b\b'
+        if event_description:
+            event_description = '{}'.format(event_description)
+        event_datetime = renderer.utc_datetime(event.get('timestamp'))
+        renderer.line('{issue_key} [{event_datetime}] {event_name}: {event_description}'.format(
+            issue_key = colorise(COLOR_ISSUE_KEY, event['issue']),
+            event_datetime = colorise('cyan', event_datetime),
+            event_name = event_name,
+            event_description = event_description,
+        ))
+    renderer.flush()
 
 def _bug_event_without_assigned_weight(event):
     print('{}: {}: event {} does not have a weight assigned'.format(colorise(COLOR_WARNING, 'warning'), colorise(COLOR_ERROR, 'bug'), colorise_repr(COLOR_LABEL, event['event'])))
@@ -1399,33 +4508,217 @@ def squash_shortlog(shortlog, aggressive=0):
         squashed_shortlog = squash_shortlog_aggressive_2(squashed_shortlog)
     return squashed_shortlog
 
+def format_duration(seconds):
+    """Formats duration using two largest units, e.g. "2d 3h" or "5m 12s".
+    """
+    seconds = int(seconds)
+    parts = []
+    for unit, size in (('d', 86400,), ('h', 3600,), ('m', 60,), ('s', 1,),):
+        if seconds >= size or (unit == 's' and not parts):
+            parts.append('{}{}'.format(seconds // size, unit))
+            seconds %= size
+    return ' '.join(parts[:2])
+
+class ShortlogReport:
+    """Activity statistics computed from the shortlog journal in a single pass.
+
+    State of the report is stored together with the journal offset it covers so that
+    following reports read only events appended since; the first bytes of the journal
+    are checksummed to detect that the journal was replaced.
+    """
+    VERSION = 1
+    CHECKSUM_LENGTH = 4096
+
+    def __init__(self):
+        self.offset = 0
+        self.checksum = None
+        self.issues = {}
+        self.days = {}
+        self.after_transition = {}
+
+    @staticmethod
+    def path():
+        return os.path.join(Cache.dir(), 'index', 'shortlog-report.json')
+
+    def load(self):
+        if not os.path.isfile(ShortlogReport.path()):
+            return self
+        with open(ShortlogReport.path()) as ifstream:
+            state = json.loads(ifstream.read())
+        if state.get('version') != ShortlogReport.VERSION:
+            return self
+        self.offset = state['offset']
+        self.checksum = state['checksum']
+        self.issues = state['issues']
+        self.days = dict((int(day), dict(data, issues=set(data['issues'])),) for day, data in state['days'].items())
+        self.after_transition = state['after_transition']
+        return self
+
+    def store(self):
+        os.makedirs(os.path.dirname(ShortlogReport.path()), exist_ok=True)
+        state = {
+            'version': ShortlogReport.VERSION,
+            'offset': self.offset,
+            'checksum': self.checksum,
+            'issues': self.issues,
+            'days': dict((day, dict(data, issues=sorted(data['issues'])),) for day, data in self.days.items()),
+            'after_transition': self.after_transition,
+        }
+        write_file_atomically(ShortlogReport.path(), json.dumps(state))
+        return self
+
+    def _checksum(self, ifstream, length):
+        ifstream.seek(0)
+        return zlib.crc32(ifstream.read(length))
+
+    def add(self, event):
+        issue_key = event.get('issue')
+        moment = event.get('timestamp')
+        kind = event.get('event')
+        if issue_key is None or moment is None:
+            return
+        issue = self.issues.get(issue_key)
+        if issue is None:
+            issue = self.issues[issue_key] = {
+                'events': 0,
+                'first': moment,
+                'last': moment,
+                'kinds': {},
+                'transitions': 0,
+                'last_transition': None,
+                'last_to': None,
+                'gap_total': 0,
+                'gap_max': 0,
+            }
+        issue['events'] += 1
+        issue['first'] = min(issue['first'], moment)
+        issue['last'] = max(issue['last'], moment)
+        issue['kinds'][kind] = issue['kinds'].get(kind, 0) + 1
+        if kind == 'transition':
+            if issue['last_transition'] is not None:
+                gap = max(0, moment - issue['last_transition'])
+                issue['gap_total'] += gap
+                issue['gap_max'] = max(issue['gap_max'], gap)
+                after = self.after_transition.setdefault(str(issue['last_to']), {'count': 0, 'total': 0})
+                after['count'] += 1
+                after['total'] += gap
+            issue['transitions'] += 1
+            issue['last_transition'] = moment
+            issue['last_to'] = (event.get('parameters') or {}).get('to')
+
+        day = int(moment // 86400)
+        activity = self.days.get(day)
+        if activity is None:
+            activity = self.days[day] = {'first': moment, 'last': moment, 'events': 0, 'issues': set()}
+        activity['first'] = min(activity['first'], moment)
+        activity['last'] = max(activity['last'], moment)
+        activity['events'] += 1
+        activity['issues'].add(issue_key)
+
+    def update(self, journal_path):
+        """Reads events appended to the journal since the last update; returns number of events read.
+        """
+        read = 0
+        with TRACE.span('shortlog.report'), open(journal_path, 'rb') as ifstream:
+            size = os.fstat(ifstream.fileno()).st_size
+            if self.offset > size or (self.offset and self._checksum(ifstream, min(self.offset, ShortlogReport.CHECKSUM_LENGTH)) != self.checksum):
+                self.__init__()
+            ifstream.seek(self.offset)
+            for line in ifstream:
+                if not line.endswith(b'\n'):
+                    # event that is being written right now
+                    break
+                self.offset += len(line)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self.add(event)
+                read += 1
+            self.checksum = self._checksum(ifstream, min(self.offset, ShortlogReport.CHECKSUM_LENGTH))
+        return read
+
+    def display(self, top=10, days=14):
+        date = lambda moment: renderer.utc_datetime(moment)[:16]
+        renderer.line(colorise(COLOR_SHOW_SECTION, 'Most touched issues:'))
+        most_touched = sorted(self.issues.items(), key=lambda each: (-each[1]['events'], each[0]))[:top]
+        for issue_key, issue in most_touched:
+            renderer.line('{} {:>6} events, {} .. {} ({}): {}'.format(
+                colorise(COLOR_ISSUE_KEY, '{:<12}'.format(issue_key)),
+                issue['events'],
+                colorise('cyan', date(issue['first'])),
+                colorise('cyan', date(issue['last'])),
+                format_duration(issue['last'] - issue['first']),
+                ', '.join('{} {}'.format(kind, count) for kind, count in sorted(issue['kinds'].items(), key=lambda each: -each[1])),
+            ))
+
+        renderer.line()
+        renderer.line(colorise(COLOR_SHOW_SECTION, 'Activity per day (UTC):'))
+        for day in sorted(self.days)[-days:]:
+            activity = self.days[day]
+            renderer.line('{} {} .. {} ({:>7}), {:>5} events, {:>3} issues'.format(
+                colorise('cyan', renderer.utc_datetime(day * 86400)[:10]),
+                renderer.utc_datetime(activity['first'])[11:],
+                renderer.utc_datetime(activity['last'])[11:],
+                format_duration(activity['last'] - activity['first']),
+                activity['events'],
+                len(activity['issues']),
+            ))
+
+        renderer.line()
+        renderer.line(colorise(COLOR_SHOW_SECTION, 'Time between transitions:'))
+        transitioned = [each for each in self.issues.items() if each[1]['transitions'] > 1]
+        for issue_key, issue in sorted(transitioned, key=lambda each: (-each[1]['gap_total'], each[0]))[:top]:
+            renderer.line('{} {:>3} transitions, mean {}, longest {}'.format(
+                colorise(COLOR_ISSUE_KEY, '{:<12}'.format(issue_key)),
+                issue['transitions'],
+                format_duration(issue['gap_total'] / (issue['transitions'] - 1)),
+                format_duration(issue['gap_max']),
+            ))
+        for to, after in sorted(self.after_transition.items(), key=lambda each: -each[1]['count']):
+            renderer.line('after transition to {}: {} times, mean {} until next transition'.format(
+                colorise_repr(COLOR_STATUS, to),
+                after['count'],
+                format_duration(after['total'] / after['count']),
+            ))
+        renderer.flush()
+
 def commandShortlog(ui):
     ui = ui.down()
     if '--colorise' in ui:
-        global FORCE_COLOURS
-        FORCE_COLOURS = True
-    shortlog = read_shortlog()
-    shortlog.reverse()
-    if str(ui) == 'squash':
-        initial_size = len(shortlog)
-        if initial_size < 2:
-            print('{}: shortlog too short to shorten'.format(colorise(COLOR_WARNING, 'warning')))
-            return
-        squashed_shortlog = squash_shortlog(shortlog, aggressive = ui.get('--aggressive'))
-        final_size = len(squashed_shortlog)
-        if final_size < initial_size:
-            print('{}: shortened shortlog from {} to {} entries'.format(colorise(COLOR_NOTE, 'note'), initial_size, final_size))
-        write_shortlog(squashed_shortlog)
+        renderer.force_colours()
+    if str(ui) == 'report':
+        report = (ShortlogReport() if '--rebuild' in ui else ShortlogReport().load())
+        read = report.update(ensure_shortlog_journal())
+        report.store()
         if '--verbose' in ui:
-            display_shortlog(squashed_shortlog)
-    else:
-        head = None
-        tail = None
-        if '--head' in ui:
-            head = ui.get('-H')
-        if '--tail' in ui:
-            tail = ui.get('-T')
-        display_shortlog(shortlog, head=head, tail=tail)
+            print('{}: read {} new event(s)'.format(colorise(COLOR_NOTE, 'note'), read))
+        report.display(top=(ui.get('--top') if '--top' in ui else 10), days=(ui.get('--days') if '--days' in ui else 14))
+        return
+    # squashing rewrites the shortlog, events must not be appended in the meantime
+    with (file_lock(get_shortlog_lock_path()) if str(ui) == 'squash' else contextlib.nullcontext()):
+        shortlog = read_shortlog()
+        shortlog.reverse()
+        if str(ui) == 'squash':
+            initial_size = len(shortlog)
+            if initial_size < 2:
+                print('{}: shortlog too short to shorten'.format(colorise(COLOR_WARNING, 'warning')))
+                return
+            squashed_shortlog = squash_shortlog(shortlog, aggressive = ui.get('--aggressive'))
+            final_size = len(squashed_shortlog)
+            if final_size < initial_size:
+                print('{}: shortened shortlog from {} to {} entries'.format(colorise(COLOR_NOTE, 'note'), initial_size, final_size))
+            write_shortlog(squashed_shortlog)
+            if '--verbose' in ui:
+                display_shortlog(squashed_shortlog)
+        else:
+            head = None
+            tail = None
+            if '--head' in ui:
+                head = ui.get('-H')
+            if '--tail' in ui:
+                tail = ui.get('-T')
+            display_shortlog(shortlog, head=head, tail=tail)
 
 
 def commandOpen(ui):
@@ -1512,10 +4805,7 @@ def commandOpen(ui):
             },
         }
 
-        r = requests.post('https://{}.atlassian.net/rest/api/2/issue'.format(settings.get('domain')),
-            json={'fields': fields,},
-            auth=settings.credentials()
-        )
+        r = connection.post('/rest/api/2/issue', json={'fields': fields,})
         if r.status_code == 400:
             exit(1)
         else:
@@ -1526,12 +4816,14 @@ def commandOpen(ui):
                 print(r.text)
             add_shortlog_event_open_issue(data.get('key'), summary)
     elif str(ui) == 'what':
-        r = requests.get('https://{}.atlassian.net/rest/api/2/issue/createmeta'.format(settings.get('domain')), auth=settings.credentials())
-        text = r.text
+        r = connection.get('/rest/api/2/issue/createmeta', stream=True)
         if '--pretty' in ui:
-            print(json.dumps(json.loads(text), indent=2))
+            print_json_stream(JSONArrayStream.from_response(r, 'projects'))
         else:
-            print(text)
+            for chunk in r.iter_content(chunk_size=JSONArrayStream.CHUNK_SIZE):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.write(b'\n')
+            r.close()
 
 
 def commandMerge(ui):
@@ -1540,8 +4832,8 @@ def commandMerge(ui):
     current_branch = get_current_git_branch()
     issue_name = expand_issue_name(ui.operands()[0])
 
-    cached = Cache(issue_name)
-    issue_message = cached.get('fields', 'summary')
+    cached = Cache(issue_name, lazy=True)
+    issue_message = cached.peek('fields', 'summary')
     if not issue_message:
         print('{}: message for issue {} not available, fetching'.format(colorise(COLOR_WARNING, 'warning'), colorise_repr(COLOR_ISSUE_KEY, issue_name)))
         issue_message = fetch_summary(issue_name)
@@ -1600,24 +4892,151 @@ def dispatch(ui, *commands, overrides = {}, default_command=''):
         return
 
     if ui_command in overrides:
-        overrides[ui_command](ui)
+        with TRACE.span('command', command=ui_command):
+            overrides[ui_command](ui)
     else:
         ui_command = ('command' + ''.join([(s[0].upper() + s[1:]) for s in ui_command.split('-')]))
         for cmd in commands:
             if cmd.__name__ == ui_command:
-                cmd(ui)
+                with TRACE.span('command', command=ui_command):
+                    cmd(ui)
                 break
 
-dispatch(ui,        # first: pass the UI object to dispatch
-    commandComment,    # second: pass command handling functions
-    commandAssign,
-    commandIssue,
-    commandSearch,
-    commandSlug,
-    commandEstimate,
-    commandPin,
-    commandFetch,
-    commandShortlog,
-    commandOpen,
-    commandMerge,
-)
+def parse_command_line(argv):
+    """Parses command line arguments; displays help screens and version, and exits
+    when requested or when the command line is invalid.
+    Returns UI object of the command line (below the program level).
+    """
+    filename_ui = os.path.expanduser('~/.local/share/jiraline/ui.json')
+
+    with TRACE.span('cli.model'):
+        model = {}
+        with open(filename_ui, 'r') as ifstream: model = json.loads(ifstream.read())
+        args = list(clap.formatter.Formatter(argv).format())
+        command = clap.builder.Builder(model).insertHelpCommand().build().get()
+
+    with TRACE.span('cli.parse'):
+        parser = clap.parser.Parser(command).feed(args)
+        checker = clap.checker.RedChecker(parser)
+
+        try:
+            fail = True
+            checker.check()
+            fail = False
+        except clap.errors.UnrecognizedOptionError as e:
+            print('unrecognized option found: {0}'.format(e))
+        except clap.errors.UIDesignError as e:
+            print('misdesigned interface: {0}'.format(e))
+        except clap.errors.MissingArgumentError as e:
+            print('missing argument for option: {0}'.format(e))
+            fail = True
+        except clap.errors.ConflictingOptionsError as e:
+            print('conflicting options found: {0}'.format(e))
+            fail = True
+        except clap.errors.RequiredOptionNotFoundError as e:
+            fail = True
+            print('required option not found: {0}'.format(e))
+        except clap.errors.InvalidOperandRangeError as e:
+            print('invalid number of operands: {0}'.format(e))
+            fail = True
+        except clap.errors.UIDesignError as e:
+            print('UI has design error: {0}'.format(e))
+            fail = True
+        except clap.errors.AmbiguousCommandError as e:
+            name, candidates = str(e).split(': ')
+            print("ambiguous shortened command name: '{0}', candidates are: {1}".format(name, candidates))
+            print("note: if this is a false positive use '--' operand separator")
+            fail = True
+        except Exception as e:
+            print('error: unhandled exception: {0}: {1}'.format(str(type(e))[8:-2], e))
+            fail = True
+        finally:
+            if fail: exit(1)
+            ui = parser.parse().ui().finalise()
+
+    if clap.helper.HelpRunner(ui=ui, program=sys.argv[0]).adjust(options=['-h', '--help']).run().displayed(): exit(0)
+    if '--version' in ui:
+        print(('jiraline version {}' if '--verbose' in ui else '{}').format(__version__))
+        exit(0)
+
+    return ui.down()
+
+
+def main(argv=None):
+    """Entry point of the command line interface.
+    """
+    global QUEUE_WRITES, CASSETTE
+    argv = (sys.argv[1:] if argv is None else argv)
+
+    # Tracing must be switched on before the command line is parsed to include the parsing
+    # itself in the trace, so the --profile option is looked up in raw arguments.
+    if os.environ.get('JIRALINE_TRACE') or '--profile' in argv:
+        TRACE.enable()
+        atexit.register(lambda: TRACE.report(
+            stream=(sys.stderr if '--profile' in argv else None),
+            trace_path=os.environ.get('JIRALINE_TRACE'),
+        ))
+
+    ui = parse_command_line(argv)
+    try:
+        settings.load()
+    except SettingsError as e:
+        error_and_exit(e)
+    settings.ask = ask_for_credential
+    instance = (ui.get('--instance') if '--instance' in ui else (os.environ.get('JIRALINE_INSTANCE') or settings.get('default_instance')))
+    if instance:
+        if instance not in settings.instances():
+            error_and_exit('unknown instance: {}'.format(instance))
+        settings.select_instance(instance)
+        # processes started by this one (e.g. warm --background) use the same instance
+        os.environ['JIRALINE_INSTANCE'] = instance
+    QUEUE_WRITES = (('--queue' in ui) or bool(settings.get('queue_writes', False)))
+    if '--record' in ui and '--replay' in ui:
+        error_and_exit('--record and --replay cannot be used together')
+    if '--record' in ui:
+        CASSETTE = Cassette(ui.get('--record'))
+        atexit.register(CASSETTE.store)
+    elif '--replay' in ui:
+        CASSETTE = Cassette(ui.get('--replay'), replay=True)
+        if not os.path.isfile(os.path.join(ui.get('--replay'), 'requests.jlc')):
+            error_and_exit('no recorded requests in {}'.format(ui.get('--replay')))
+
+    try:
+        dispatch(ui,        # first: pass the UI object to dispatch
+            commandComment,    # second: pass command handling functions
+            commandAssign,
+            commandIssue,
+            commandSearch,
+            commandSlug,
+            commandEstimate,
+            commandPin,
+            commandFetch,
+            commandShortlog,
+            commandOpen,
+            commandMerge,
+            commandPush,
+            commandCache,
+            commandWatch,
+            commandExport,
+            commandStats,
+            commandHistory,
+            commandWarm,
+            commandHook,
+            commandTree,
+            commandDeps,
+            commandAttachments,
+        )
+        renderer.flush()
+    except BrokenPipeError:
+        # Output was piped to a program that exited early (e.g. head).
+        # Point standard output to /dev/null so flushing it on exit does not fail again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        exit(0)
+    except requests.exceptions.ConnectionError as e:
+        # also raised by --replay for requests that were not recorded
+        renderer.flush()
+        error_and_exit('cannot connect to Jira: {}'.format(e))
+
+
+if __name__ == '__main__':
+    main()